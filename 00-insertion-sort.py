@@ -3,10 +3,10 @@
 ## The insertion sort:
 #
 # Accepts an array of objects 'data' {d1,d2,...dn} and returns a permutation of
-# the input sequence such that {d'1<=d'2<=...<=d'n}. The 'compare_func' is a
-# lambda function which compares two elements from within the data set and
-# returns 1, 0 or -1 depending on whether the value of the first key is greater,
-# equal, or lesser than that of the second key.
+# the input sequence such that {d'1<=d'2<=...<=d'n}. The optional 'key' is a
+# function which computes the key to compare for each element, and if
+# 'reverse' is true then the elements are sorted in descending order. See
+# lib.sort_with_key() for how these are implemented.
 #
 # The insertion sort is an efficient algorithm for sorting a small number of
 # elements. Insertion sort works by maintaining an ordered and an unordered
@@ -40,19 +40,76 @@
 #
 ## Code:
 #
+from bisect import bisect_right
+
 import lib
 
-def insertion_sort(data):
+def insertion_sort(data, key=None, reverse=False):
+    if key or reverse:
+        return lib.sort_with_key(insertion_sort, data, key, reverse)
+
     for j in range(1, len(data)):
-        key = data[j]
+        item = data[j]
         # Insert data[j] into sorted sequence data[0..j-1].
         i = j - 1
-        while i >= 0 and data[i] > key:
+        while i >= 0 and data[i] > item:
             data[i + 1] = data[i]
             i = i - 1
-            data[i + 1] = key
+        data[i + 1] = item
+
+    return data
+
+## Binary insertion sort:
+#
+# A variant of insertion sort which finds the position at which to
+# insert each key using a binary search of the sorted subarray, rather
+# than by comparing against each key in turn. This reduces the number
+# of comparisons to O(n log n), although the number of moves is still
+# O(n^2). Rather than shifting the larger keys one at a time, they are
+# moved up together with a single slice assignment, which is much
+# faster than a loop in Python.
+#
+# The keys data[lo:start] must already be sorted, and the keys
+# data[start:hi] are inserted into them. This allows the sort to be
+# used to extend an existing sorted run, as in timsort. The position
+# found is after any keys equal to the key being inserted, so the sort
+# is stable.
+#
+# If a key function or reverse is given, only data[lo:hi] is sorted,
+# as a whole, so 'start' has no effect.
+def binary_insertion_sort(data, lo=0, hi=None, start=None, key=None,
+                          reverse=False):
+    if hi is None:
+        hi = len(data)
+
+    if key or reverse:
+        data[lo:hi] = lib.sort_with_key(binary_insertion_sort, data[lo:hi],
+                                        key, reverse)
+        return data
+
+    if start is None:
+        start = lo + 1
+
+    for j in xrange(max(start, lo + 1), hi):
+        item = data[j]
+        i = bisect_right(data, item, lo, j)
+        if i != j:
+            data[i + 1:j + 1] = data[i:j]
+            data[i] = item
 
     return data
 
 if __name__ == "__main__":
+    # Only the bounds are sorted, with or without a key function:
+    data = [9, 8, 7, 6, 5, 4, 3]
+    assert binary_insertion_sort(list(data), 2, 5) == [9, 8, 5, 6, 7, 4, 3]
+    assert (binary_insertion_sort(list(data), 2, 5, key=lambda x: -x) ==
+            data)
+    assert (binary_insertion_sort(list(data), 2, 5, reverse=True) ==
+            data)
+    assert (binary_insertion_sort(list(data), 2, 5, key=lambda x: x % 3) ==
+            [9, 8, 6, 7, 5, 4, 3])
+
     lib.test_array_sort(insertion_sort)
+    lib.test_array_sort(binary_insertion_sort)
+    lib.test_key_sort(insertion_sort, sizes=[10, 100, 1000])
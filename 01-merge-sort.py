@@ -3,7 +3,8 @@
 ## The merge sort:
 #
 # Accepts an array of objects 'data' {d1,d2,...dn} and returns a permutation of
-# the input sequence such that {d'1<=d'2<=...<=d'n}.
+# the input sequence such that {d'1<=d'2<=...<=d'n}. The optional 'key' and
+# 'reverse' arguments are as for Python's sorted() (see lib.sort_with_key()).
 #
 # The merge sort is a divide and conquer algorithm. It works by
 # dividing the unsorted array into n arrays, each containing 1
@@ -28,6 +29,11 @@
 ## Disadvantages:
 #
 # Has an increased memory footprint over the in place O(1) heapsort.
+# The naive merge_sort() implementation below allocates new lists at
+#  every level of recursion, and its merge removes elements from the
+#  front of a list, which is O(n) per element. See
+#  merge_sort_top_down() and merge_sort_bottom_up() for
+#  implementations which avoid this.
 #
 ## References:
 #
@@ -39,7 +45,9 @@
 #
 import lib
 
-def merge_sort(data):
+def merge_sort(data, key=None, reverse=False):
+    if key or reverse:
+        return lib.sort_with_key(merge_sort, data, key, reverse)
 
     # Receives two lists as arguments, and returns a sorted list
     # of both.
@@ -76,5 +84,97 @@ def merge_sort(data):
 
     return merge(left, right)
 
-if __name__ == "__main__": 
+## Index-based implementations:
+#
+# Rather than slicing the input and building new lists, the following
+# implementations merge by index between the input array and a single
+# scratch buffer of the same size, which is allocated once per
+# sort. Instead of copying the merged output back into the input after
+# each merge, the roles of the two arrays are swapped at each level, so
+# every element is moved exactly once per level. Both variants are
+# stable and require O(n) additional memory.
+
+# Merge the sorted ranges src[lo:mid] and src[mid:hi] into
+# dst[lo:hi]. When two elements are equal, the element from the left
+# range is taken first, so the merge is stable.
+def merge_ranges(src, dst, lo, mid, hi):
+    i = lo
+    j = mid
+    k = lo
+
+    # If the two ranges are already in order (e.g. for presorted
+    # input), then they can be copied without comparing every element:
+    if i < mid and j < hi and not src[mid] < src[mid - 1]:
+        dst[lo:hi] = src[lo:hi]
+        return
+
+    while i < mid and j < hi:
+        if src[j] < src[i]:
+            dst[k] = src[j]
+            j += 1
+        else:
+            dst[k] = src[i]
+            i += 1
+        k += 1
+
+    # Copy the remainder of whichever range is not exhausted:
+    if i < mid:
+        dst[k:hi] = src[i:mid]
+    else:
+        dst[k:hi] = src[j:hi]
+
+# Top-down merge sort. The recursion alternates between the two
+# arrays: to sort a range into dst, each half is first sorted into src
+# (using dst as the scratch space), and then the halves are merged
+# back into dst. This requires both arrays to hold the same elements
+# on entry. The recursion depth is O(log n).
+def merge_sort_top_down(data, key=None, reverse=False):
+    if key or reverse:
+        return lib.sort_with_key(merge_sort_top_down, data, key, reverse)
+
+    def sort(src, dst, lo, hi):
+        if hi - lo < 2:
+            return
+
+        mid = (lo + hi) // 2
+        sort(dst, src, lo, mid)
+        sort(dst, src, mid, hi)
+        merge_ranges(src, dst, lo, mid, hi)
+
+    sort(data[:], data, 0, len(data))
+    return data
+
+# Bottom-up (iterative) merge sort. The array is treated as n sorted
+# runs of width 1, and each pass merges adjacent pairs of runs from
+# one array into the other, doubling the run width, until a single
+# run remains. There is no recursion.
+def merge_sort_bottom_up(data, key=None, reverse=False):
+    if key or reverse:
+        return lib.sort_with_key(merge_sort_bottom_up, data, key, reverse)
+
+    n = len(data)
+    src = data
+    dst = [None] * n
+    width = 1
+
+    while width < n:
+        for lo in xrange(0, n, 2 * width):
+            mid = min(lo + width, n)
+            hi = min(lo + 2 * width, n)
+            merge_ranges(src, dst, lo, mid, hi)
+
+        src, dst = dst, src
+        width *= 2
+
+    # After an odd number of passes the sorted output is in the
+    # scratch buffer:
+    if src is not data:
+        data[:] = src
+
+    return data
+
+if __name__ == "__main__":
     lib.test_array_sort(merge_sort)
+    lib.test_array_sort(merge_sort_top_down)
+    lib.test_array_sort(merge_sort_bottom_up)
+    lib.test_key_sort(merge_sort_bottom_up)
@@ -3,7 +3,8 @@
 ## Heapsort:
 #
 # Accepts an array of objects 'data' {d1,d2,...dn} and returns a permutation of
-# the input sequence such that {d'1<=d'2<=...<=d'n}.
+# the input sequence such that {d'1<=d'2<=...<=d'n}. The optional 'key' and
+# 'reverse' arguments are as for Python's sorted() (see lib.sort_with_key()).
 #
 # A (binary) heap is an array that can be viewed as a nearly complete
 # binary tree, where each node of the tree corresponds to an element
@@ -45,7 +46,9 @@
 #
 import lib
 
-def heap_sort(data):
+def heap_sort(data, key=None, reverse=False):
+    if key or reverse:
+        return lib.sort_with_key(heap_sort, data, key, reverse)
 
     # Input a heap array and an index into that array. It lets the
     # value at heap[i] "float down" in the max-heap so that the
@@ -53,27 +56,29 @@ def heap_sort(data):
     def max_heapify(heap, heap_size, i):
 
         # Helper functions to get the relative nodes of a specific
-        # index.
+        # index. The textbook uses 1-based arrays, where the children
+        # of i are at 2i and 2i+1. Python arrays are 0-based, so the
+        # indices are offset by one.
         #
         # Note that these can be implemented in single instructions by
         # shifting the bits:
         #
-        #   PARENT(i): return i >> 1
-        #   LEFT(i):   return i << 1
-        #   RIGHT(i):  return (i << 1) + 1
+        #   PARENT(i): return (i - 1) >> 1
+        #   LEFT(i):   return (i << 1) + 1
+        #   RIGHT(i):  return (i << 1) + 2
         #
         # Note also that the parent_index function is not needed for
         # the heap_sort implementation, it is included here for
         # completeness.
         #
         def parent_index(i):
-            return i / 2
+            return (i - 1) / 2
 
         def left_index(i):
-            return 2 * i
+            return 2 * i + 1
 
         def right_index(i):
-            return 2 * i + 1
+            return 2 * i + 2
 
         left = left_index(i)
         right = right_index(i)
@@ -107,5 +112,139 @@ def heap_sort(data):
 
     return data
 
+## Bottom-up heapsort:
+#
+# heap_sort() above follows the textbook closely. bottom_up_heap_sort()
+# is a faster version of the same algorithm, with three changes:
+#
+#   1. The sift-down is iterative, so there is no function call per
+#      level, and rather than swapping at each level, the sifted
+#      element is held aside and written once into its final place.
+#
+#   2. The element which is sifted down from the root during the
+#      second step was just taken from the bottom of the heap, so it
+#      almost always belongs near the bottom again. Floyd's
+#      optimisation exploits this: the "hole" at the root is first
+#      moved all the way down to a leaf, promoting the larger child at
+#      each level without comparing it against the sifted element, and
+#      then the element is sifted up from the leaf to its position,
+#      which is usually only a level or two. This roughly halves the
+#      number of comparisons.
+#
+#   3. The heap may be d-ary rather than binary, so that the children
+#      of index i are at di+1 to di+d. A wider heap is shallower, so
+#      there are fewer levels to move through, and the children of a
+#      node are adjacent in memory. Each level requires d-1 comparisons
+#      to find the largest child.
+#
+# The initial heap is built in O(n) time in the same way as
+# build_max_heap(), by sifting down every internal node starting from
+# the last.
+
+# Sift the element at heap[i] down through a d-ary max-heap of
+# heap_size elements, using Floyd's "sift to leaf then up" strategy.
+def sift_down_bottom_up(heap, heap_size, i, d=2):
+    item = heap[i]
+    start = i
+
+    # Move the hole at i down to a leaf, promoting the largest child
+    # at each level:
+    child = d * i + 1
+    while child < heap_size:
+        largest = child
+        for sibling in xrange(child + 1, min(child + d, heap_size)):
+            if heap[sibling] > heap[largest]:
+                largest = sibling
+
+        heap[i] = heap[largest]
+        i = largest
+        child = d * i + 1
+
+    # Sift the element back up from the leaf to its position:
+    while i > start:
+        parent = (i - 1) // d
+        if not heap[parent] < item:
+            break
+        heap[i] = heap[parent]
+        i = parent
+
+    heap[i] = item
+
+def bottom_up_heap_sort(data, d=2, key=None, reverse=False):
+    if key or reverse:
+        return lib.sort_with_key(lambda data: bottom_up_heap_sort(data, d),
+                                 data, key, reverse)
+
+    n = len(data)
+
+    # The first step: build the entire array into a max heap. The last
+    # internal node is the parent of the last element.
+    for i in xrange((n - 2) // d, -1, -1):
+        sift_down_bottom_up(data, n, i, d)
+
+    # The second step: repeatedly swap the largest element to the end
+    # of the heap, and restore the heap property for the rest.
+    for i in xrange(n - 1, 0, -1):
+        data[0], data[i] = data[i], data[0]
+        sift_down_bottom_up(data, i, 0, d)
+
+    return data
+
+## Min-heap operations:
+#
+# Unlike the helpers within heap_sort(), these are available to other
+# algorithms which need a priority queue (e.g. a k-way merge). They use
+# 0-based indices, so the children of index i are at 2i+1 and 2i+2.
+
+# Input a heap array and an index into that array. It lets the value
+# at heap[i] "float down" in the min-heap so that the subtree rooted at
+# index i obeys the min-heap property. Rather than swapping at each
+# level, the value is held aside while smaller children are moved up,
+# and then written once into its final position.
+def min_heapify(heap, heap_size, i):
+    item = heap[i]
+
+    while True:
+        child = 2 * i + 1
+        if child >= heap_size:
+            break
+
+        right = child + 1
+        if right < heap_size and heap[right] < heap[child]:
+            child = right
+
+        if not heap[child] < item:
+            break
+
+        heap[i] = heap[child]
+        i = child
+
+    heap[i] = item
+
+# Input a heap array and an index into that array. It lets the value
+# at heap[i] "float up" in the min-heap until its parent is not greater
+# than it, moving each larger parent down in the same way as
+# min_heapify().
+def min_heap_sift_up(heap, i):
+    item = heap[i]
+
+    while i > 0:
+        parent = (i - 1) >> 1
+        if not item < heap[parent]:
+            break
+        heap[i] = heap[parent]
+        i = parent
+
+    heap[i] = item
+
+# Input an array and build it into a min heap.
+def build_min_heap(heap):
+    for i in range(len(heap) // 2 - 1, -1, -1):
+        min_heapify(heap, len(heap), i)
+
 if __name__ == "__main__":
     lib.test_array_sort(heap_sort)
+    for d in (2, 4, 8):
+        lib.test_array_sort(lambda data: bottom_up_heap_sort(data, d),
+                            name="bottom_up_heap_sort(d=%d)" % d)
+    lib.test_key_sort(heap_sort)
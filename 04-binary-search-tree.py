@@ -13,11 +13,19 @@
 #   left subtree of x, then y.key <= x.key. If y is a node in the
 #   right subtree of x, then y.key >= x.key.
 #
-# An inorder tree walk allows us to recursively print out all the keys
-# in a binary search tree by printing the root of a subtree between
-# printing the left and right subtree values. A preorder tree walk
-# prints the root before the values in either subtree, and a postorder
-# tree walk prints the root after the values in its subtrees.
+# An inorder tree walk generates all the keys in a binary search tree
+# in sorted order, by visiting the root of a subtree between visiting
+# the left and right subtrees. A preorder tree walk visits the root
+# before either subtree, and a postorder tree walk visits the root
+# after its subtrees.
+#
+# The methods of Node are recursive, so a tree built from ordered keys
+# exceeds Python's recursion limit after a few thousand keys. The
+# iterative functions which follow them avoid this, and the
+# BinarySearchTree class wraps them in a container which keeps track of
+# the root, so that it can be replaced by an insertion or deletion.
+# The tree walks are lazy generators which follow the parent pointers
+# rather than using a stack, so they need only O(1) extra memory.
 #
 ## Operations:
 #
@@ -41,6 +49,8 @@
 #
 ## Code:
 #
+import lib
+
 class Node:
     def __init__(self, key):
         self.left = None
@@ -124,34 +134,21 @@ class Node:
             y.left.p = y
 
     def inorder_tree_walk(self):
-        if self.left:
-            self.left.inorder_tree_walk()
-
-        print self.key
-
-        if self.right:
-            self.right.inorder_tree_walk()
+        return inorder_tree_walk(self)
 
     def preorder_tree_walk(self):
-        print self.key
-
-        if self.left:
-            print self.left.preorder_tree_walk()
-
-        if self.right:
-            print self.right.preorder_tree_walk()
+        return preorder_tree_walk(self)
 
     def postorder_tree_walk(self):
-        if self.left:
-            print self.left.preorder_tree_walk()
-
-        if self.right:
-            print self.right.preorder_tree_walk()
-
-        print self.key
+        return postorder_tree_walk(self)
 
 ## Iterative implementations of tree functions:
+#
+# The functions which can change the root of the tree return the new
+# root, since they cannot assign to the caller's variable.
 
+# Insert the node n into the tree, and return the root of the tree. If
+# the tree is empty (None), n becomes the root.
 def tree_insert(tree, n):
     y = None
     x = tree
@@ -168,6 +165,7 @@ def tree_insert(tree, n):
         y.left = n
     else:
         y.right = n
+    return tree
 
 # An iterative tree search, achieved by unrolling the recursion in
 # Node.search() into a while loop. Again, if the key is key is not
@@ -202,6 +200,17 @@ def tree_successor(node):
         parent = parent.p
     return parent
 
+def tree_predecessor(node):
+    if node.left:
+        return tree_maximum(node.left)
+    parent = node.p
+    while parent and node == parent.left:
+        node = parent
+        parent = parent.p
+    return parent
+
+# Replace the subtree rooted at u with the subtree rooted at v, and
+# return the root of the tree.
 def tree_transplant(tree, u, v):
     if not u.p:
         # If u is the tree root:
@@ -213,21 +222,314 @@ def tree_transplant(tree, u, v):
 
     if v:
         v.p = u.p
+    return tree
 
+# Delete the node z from the tree, and return the root of the tree.
 def tree_delete(tree, z):
     if not z.left:
-        tree_transplant(tree, z, z.right)
+        tree = tree_transplant(tree, z, z.right)
     elif not z.right:
-        tree_transplant(tree, z, z.left)
+        tree = tree_transplant(tree, z, z.left)
     else:
         y = tree_minimum(z.right)
         if y.p != z:
-            tree_transplant(tree, y, y.right)
+            tree = tree_transplant(tree, y, y.right)
             y.right = z.right
-            y.ripht.p = y
-        tree_transplant(tree, z, y)
+            y.right.p = y
+        tree = tree_transplant(tree, z, y)
         y.left = z.left
         y.left.p = y
+    return tree
+
+## Tree walks:
+#
+# Each walk moves from node to node along the child and parent
+# pointers, remembering only the current node and whether it was
+# reached from its parent, its left child or its right child. A node
+# is visited when it is first reached for a preorder walk, when it is
+# returned to from its left subtree for an inorder walk, and when it
+# is returned to from its right subtree for a postorder walk. Each
+# edge is followed twice, so a complete walk is O(n), using O(1) extra
+# memory. The tree must not be modified during a walk.
+
+PREORDER, INORDER, POSTORDER = range(3)
+
+# Generate the nodes of the subtree rooted at 'node' in the given
+# order.
+def tree_walk(node, order=INORDER):
+    if not node:
+        return
+
+    root = node
+    from_parent = True
+    from_left = False
+
+    while True:
+        if from_parent:
+            if order == PREORDER:
+                yield node
+            if node.left:
+                node = node.left
+                continue
+            from_left = True
+
+        if from_left:
+            if order == INORDER:
+                yield node
+            if node.right:
+                node = node.right
+                from_parent = True
+                continue
+
+        if order == POSTORDER:
+            yield node
+        if node is root:
+            return
+
+        from_parent = False
+        from_left = node is node.p.left
+        node = node.p
+
+def inorder_tree_walk(node):
+    for x in tree_walk(node, INORDER):
+        yield x.key
+
+def preorder_tree_walk(node):
+    for x in tree_walk(node, PREORDER):
+        yield x.key
+
+def postorder_tree_walk(node):
+    for x in tree_walk(node, POSTORDER):
+        yield x.key
+
+## Bulk loading:
+#
+# Inserting n keys one at a time is O(n log n) at best, and O(n^2) if
+# they are in order. A tree can instead be built directly from keys
+# which are already sorted, in O(n): the middle key becomes the root,
+# and the keys before and after it become its left and right subtrees.
+# The keys are consumed in order, so the left subtree is built before
+# its parent's node is created. Every path from the root to a leaf has
+# one of two lengths, so the tree is perfectly balanced.
+
+# Build a balanced tree from an iterable of keys in sorted order, and
+# return its root. If 'n' is given, it is the number of keys, and the
+# keys may be a lazy iterator. Raises ValueError if the keys are not
+# sorted.
+def tree_build(keys, n=None, node_class=Node):
+    if n is None:
+        keys = list(keys)
+        n = len(keys)
+    keys = iter(keys)
+    last = []
+
+    def build(n):
+        if not n:
+            return None
+
+        left = build((n - 1) // 2)
+        key = next(keys)
+        if last and key < last[0]:
+            raise ValueError("tree_build() keys are not sorted")
+        last[:] = [key]
+
+        node = node_class(key)
+        node.left = left
+        if left:
+            left.p = node
+        node.right = build(n - 1 - (n - 1) // 2)
+        if node.right:
+            node.right.p = node
+        return node
+
+    return build(n)
+
+# Generate the keys of two sorted iterables, in sorted order. Keys
+# which are equal are generated from 'a' first.
+def merge_sorted(a, b):
+    a = iter(a)
+    b = iter(b)
+    end = object()
+    x = next(a, end)
+    y = next(b, end)
+    while x is not end and y is not end:
+        if y < x:
+            yield y
+            y = next(b, end)
+        else:
+            yield x
+            x = next(a, end)
+
+    if x is not end:
+        yield x
+        for x in a:
+            yield x
+    if y is not end:
+        yield y
+        for y in b:
+            yield y
+
+# A node which stores its attributes in fixed slots rather than in a
+# per-instance dictionary, which uses much less memory. It has none of
+# the recursive methods of Node, and is intended for use with the
+# BinarySearchTree container, e.g. BinarySearchTree(keys, SlotsNode).
+class SlotsNode(object):
+    __slots__ = ("left", "right", "p", "key")
+
+    def __init__(self, key):
+        self.left = None
+        self.right = None
+        self.p = None
+        self.key = key
+
+## Container:
+#
+# A binary search tree which holds a reference to its root node, and
+# the number of nodes. All of the operations are iterative. Any node
+# class with left, right, p and key attributes may be used.
+class BinarySearchTree:
+    def __init__(self, keys=(), node_class=Node):
+        self.root = None
+        self.size = 0
+        self.node_class = node_class
+        for key in keys:
+            self.insert(node_class(key))
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return inorder_tree_walk(self.root)
+
+    # Return the node with the given key, or None if there is no such
+    # node.
+    def search(self, key):
+        x = self.root
+        while x and key != x.key:
+            if key < x.key:
+                x = x.left
+            else:
+                x = x.right
+        return x
+
+    # Return the node with the smallest key in the subtree rooted at
+    # x, or in the whole tree if x is not given.
+    def minimum(self, x=None):
+        x = x or self.root
+        while x and x.left:
+            x = x.left
+        return x
+
+    # Return the node with the largest key in the subtree rooted at x,
+    # or in the whole tree if x is not given.
+    def maximum(self, x=None):
+        x = x or self.root
+        while x and x.right:
+            x = x.right
+        return x
+
+    # Return the node with the smallest key greater than x's, or None
+    # if x has the largest key.
+    def successor(self, x):
+        if x.right:
+            return self.minimum(x.right)
+        y = x.p
+        while y and x is y.right:
+            x = y
+            y = y.p
+        return y
+
+    # Return the node with the largest key smaller than x's, or None if
+    # x has the smallest key.
+    def predecessor(self, x):
+        if x.left:
+            return self.maximum(x.left)
+        y = x.p
+        while y and x is y.left:
+            x = y
+            y = y.p
+        return y
+
+    # Insert the node z, and return it.
+    def insert(self, z):
+        y = None
+        x = self.root
+        while x:
+            y = x
+            if z.key < x.key:
+                x = x.left
+            else:
+                x = x.right
+
+        z.p = y
+        z.left = None
+        z.right = None
+        if not y:
+            self.root = z
+        elif z.key < y.key:
+            y.left = z
+        else:
+            y.right = z
+
+        self.size += 1
+        return z
+
+    # Replace the subtree rooted at u with the subtree rooted at v.
+    def _transplant(self, u, v):
+        if not u.p:
+            self.root = v
+        elif u is u.p.left:
+            u.p.left = v
+        else:
+            u.p.right = v
+
+        if v:
+            v.p = u.p
+
+    # Remove the node z from the tree.
+    def delete(self, z):
+        if not z.left:
+            self._transplant(z, z.right)
+        elif not z.right:
+            self._transplant(z, z.left)
+        else:
+            y = self.minimum(z.right)
+            if y.p is not z:
+                self._transplant(y, y.right)
+                y.right = z.right
+                y.right.p = y
+            self._transplant(z, y)
+            y.left = z.left
+            y.left.p = y
+
+        z.left = None
+        z.right = None
+        z.p = None
+        self.size -= 1
+
+    # Replace the contents of the tree with a balanced tree of the
+    # keys of a sorted iterable, in O(n). 'n' is as for tree_build().
+    def load_sorted(self, keys, n=None):
+        if n is None:
+            keys = list(keys)
+            n = len(keys)
+        self.root = tree_build(keys, n, self.node_class)
+        self.size = n
+
+    # Add the keys of another tree to this one, in O(n + m), by merging
+    # the keys of both trees in order and rebuilding a balanced tree.
+    def merge(self, other):
+        self.load_sorted(merge_sorted(iter(self), iter(other)),
+                         len(self) + len(other))
+
+    def inorder(self):
+        return inorder_tree_walk(self.root)
+
+    def preorder(self):
+        return preorder_tree_walk(self.root)
+
+    def postorder(self):
+        return postorder_tree_walk(self.root)
 
 if __name__ == "__main__":
     tree = Node(3)
@@ -240,35 +542,100 @@ if __name__ == "__main__":
     tree_insert(tree, Node(12))
     tree_insert(tree, Node(6))
 
-    print "Inorder tree walk:"
-    print tree.inorder_tree_walk()
-
-    print "\nPreorder tree walk:"
-    tree.preorder_tree_walk()
-
-    print "\nPostorder tree walk:"
-    tree.postorder_tree_walk()
+    print "Inorder tree walk:", list(tree.inorder_tree_walk())
+    print "Preorder tree walk:", list(tree.preorder_tree_walk())
+    print "Postorder tree walk:", list(tree.postorder_tree_walk())
 
     print "\nSearch:", tree.search(6).key, tree.search(7).key
     print "Search:", tree_search(tree, 6).key, tree_search(tree, 7).key
     print "Minimum:", tree.minimum().key, tree_minimum(tree).key
     print "Maximum:", tree.maximum().key, tree_maximum(tree).key
     print "Successor:", tree_successor(tree).key, tree.successor().key
+    print "Predecessor:", tree_predecessor(tree).key
     node = tree.search(6)
     print "Successor:", tree_successor(node).key, node.successor().key
 
-    print "\nDelete 2:"
-    tree_delete(tree, tree.search(2))
-    tree.inorder_tree_walk()
+    print "\nDelete 2:",
+    tree = tree_delete(tree, tree.search(2))
+    print list(tree.inorder_tree_walk())
 
-    print "\nDelete 9:"
+    print "Delete 9:",
     tree.delete(tree.search(9))
-    tree.inorder_tree_walk()
+    print list(tree.inorder_tree_walk())
 
-    print "\nDelete 12:"
+    print "Delete 12:",
     tree.delete(tree.search(12))
-    tree.inorder_tree_walk()
-
-    print "\nDelete 1:"
-    tree_delete(tree, tree)
-    tree.inorder_tree_walk()
+    print list(tree.inorder_tree_walk())
+
+    print "Delete 1:",
+    tree = tree_delete(tree, tree_search(tree, 1))
+    print list(tree.inorder_tree_walk())
+
+    print "Delete the root:",
+    tree = tree_delete(tree, tree)
+    print list(tree.inorder_tree_walk())
+
+    # A tree of ordered keys is a linked list, but the container and
+    # the walks can handle it without recursion:
+    n = 2000
+    tree = BinarySearchTree(xrange(n))
+    assert len(tree) == n
+    assert list(tree) == range(n)
+    assert list(tree.preorder()) == range(n)
+    assert list(tree.postorder()) == range(n - 1, -1, -1)
+    assert tree.minimum().key == 0
+    assert tree.maximum().key == n - 1
+    tree.delete(tree.root)
+    assert tree.root.key == 1 and tree.root.p is None
+
+    # Check the walks against a recursive definition:
+    def walk(node, order):
+        if not node:
+            return []
+        keys = [[node.key], walk(node.left, order), walk(node.right, order)]
+        if order == INORDER:
+            keys[0], keys[1] = keys[1], keys[0]
+        elif order == POSTORDER:
+            keys.append(keys.pop(0))
+        return sum(keys, [])
+
+    data = lib.get_random_int_array(1000)
+    tree = BinarySearchTree(data)
+    for order in (PREORDER, INORDER, POSTORDER):
+        assert [x.key for x in tree_walk(tree.root, order)] == \
+            walk(tree.root, order)
+    nodes = list(tree_walk(tree.root, PREORDER))
+    for node in nodes[::2]:
+        tree.delete(node)
+    assert list(tree) == sorted(node.key for node in nodes[1::2])
+    assert len(tree) == len(nodes[1::2])
+
+    # Bulk loading sorted keys gives a balanced tree, even though
+    # inserting them one at a time would give a linked list:
+    n = 2 ** 16 - 1
+    tree = BinarySearchTree()
+    tree.load_sorted(xrange(n), n)
+    assert list(tree) == range(n)
+    assert len(tree) == n
+    for x in tree_walk(tree.root):
+        if not x.left and not x.right:
+            depth = 0
+            while x.p:
+                depth += 1
+                x = x.p
+            assert depth == 15
+    tree.delete(tree.search(n // 2))
+    assert list(tree) == range(n // 2) + range(n // 2 + 1, n)
+    try:
+        tree_build([2, 1])
+        assert False
+    except ValueError:
+        pass
+
+    # Merging keeps duplicate keys, like insertion:
+    a = BinarySearchTree(data[:500])
+    b = BinarySearchTree(data[500:] + data[:10])
+    a.merge(b)
+    assert list(a) == sorted(data + data[:10])
+    assert len(a) == len(data) + 10
+    assert list(merge_sorted([], [1, 2])) == [1, 2]
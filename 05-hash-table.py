@@ -6,6 +6,47 @@
 # function to generate an index into the array of buckets, from which
 # the correct value can be found.
 #
+# HashTable resolves collisions by chaining: each bucket is a list of
+# the entries whose keys hash to it. OpenAddressingHashTable instead
+# stores every entry in the array itself, in three parallel arrays of
+# keys, values and hashes. An entry is stored in the first free slot
+# at or after the index given by its hash, wrapping around at the end
+# of the array ("linear probing"), and a lookup probes the same
+# sequence of slots until it finds the key or an empty slot. A deleted
+# entry leaves a "tombstone" marker behind, so that lookups continue
+# past it, and the tombstone is reused by a later insertion.
+#
+# Both tables accept a hash function, which maps a key to an integer.
+# The default is Python's built-in hash(). The alternatives which
+# follow are a 64-bit integer mixer (SplitMix64), which spreads nearby
+# integers across the whole range of hashes, and two hashes of byte
+# strings: FNV-1a, which is simple and fast for short keys, and XXH64,
+# which processes 32 bytes at a time. The ASCII sum hash which
+# HashTable originally used is kept for comparison: anagrams and many
+# nearby integers have the same sum, and the sums of short strings
+# fall into a narrow range. hash_distribution() measures how evenly a
+# hash function spreads a set of keys over the slots of a table.
+#
+# ResizingHashTable is a chained table which doubles its number of
+# buckets when the number of entries per bucket would exceed its
+# maximum load factor. Moving every entry at once makes the insertion
+# which triggers the resize O(n), so it can instead resize
+# incrementally, as Redis does: the old and new bucket arrays coexist,
+# and each set() and get() moves the entries of a bounded number of
+# old buckets into the new array. New entries are added to the new
+# array, and lookups check both arrays, until every old bucket has
+# been moved. The stored hashes of the entries are used to move them.
+#
+# The capacity of the open addressing table is always a power of two,
+# so the index of a hash is found with a bitwise AND rather than a
+# division. When the fraction of slots which are in use (including
+# tombstones) would exceed the maximum load factor, the table is
+# resized: doubled if it holds many entries, or rebuilt at the same
+# capacity to clear the tombstones otherwise. The table is halved when
+# deletions leave it mostly empty. The hash of each key is stored, so
+# resizing never needs to hash the keys again, and most probes of
+# other keys are rejected by comparing hashes rather than keys.
+#
 ## Performance:
 #
 # Worst case performance:       O(n)
@@ -16,25 +57,177 @@
 ## Advantages:
 #
 # Turns O(n) lookup into O(1).
+# Open addressing allocates no objects per entry, and the probes of a
+#  lookup are to adjacent slots.
 #
 ## Disadvantages:
 #
 # Performance depends largely on the quality of the hash function and
 #  the number of buckets available. Will degrade from O(1) to O(n).
+# An open addressing table must be kept partly empty, and resizing it
+#  takes O(n) time.
 #
 ## References:
 #
+# Introduction to Algorithms, section 11.4, page 269.
 # https://sites.google.com/site/usfcomputerscience/hash-tables-imp
 # http://en.wikipedia.org/wiki/Hash_table
+# http://en.wikipedia.org/wiki/Linear_probing
+# http://www.isthe.com/chongo/tech/comp/fnv/
+# https://github.com/Cyan4973/xxHash/blob/dev/doc/xxhash_spec.md
 #
 ## Code:
 #
+import argparse
+from array import array
+import gc
+import random
+import struct
+
 import lib
 
 class KeyValue:
-    def __init__(self, key, value):
+    def __init__(self, key, value, hash=None):
         self.key = key
         self.value = value
+        self.hash = hash
+
+## Hash functions:
+#
+# Each hash function accepts a key, and returns an integer which fits
+# into a C long, like hash(), so that it can be stored in an array.
+
+# Convert an unsigned 64-bit integer to a signed one.
+def to_signed(x):
+    return x - 2 ** 64 if x >= 2 ** 63 else x
+
+def ascii_sum_hash(key):
+    total = 0
+    for c in str(key):
+        total = total + ord(c)
+    return total
+
+# Integers are mixed by value, and any other key by its hash().
+def splitmix_hash(key):
+    return to_signed(lib.element_hash(key))
+
+# Return a key as a byte string, for the byte string hashes.
+def key_bytes(key):
+    if isinstance(key, str):
+        return key
+    if isinstance(key, unicode):
+        return key.encode("utf-8")
+    return str(key)
+
+FNV_OFFSET_BASIS = 0xCBF29CE484222325
+FNV_PRIME = 0x100000001B3
+
+def fnv1a_hash(key):
+    h = FNV_OFFSET_BASIS
+    for c in bytearray(key_bytes(key)):
+        h = ((h ^ c) * FNV_PRIME) & lib.MASK_64
+    return to_signed(h)
+
+XXH_PRIME_1 = 0x9E3779B185EBCA87
+XXH_PRIME_2 = 0xC2B2AE3D27D4EB4F
+XXH_PRIME_3 = 0x165667B19E3779F9
+XXH_PRIME_4 = 0x85EBCA77C2B2AE63
+XXH_PRIME_5 = 0x27D4EB2F165667C5
+
+def rotate_left(x, r):
+    return ((x << r) | (x >> (64 - r))) & lib.MASK_64
+
+def xxh_round(acc, lane):
+    acc = (acc + lane * XXH_PRIME_2) & lib.MASK_64
+    return (rotate_left(acc, 31) * XXH_PRIME_1) & lib.MASK_64
+
+def xxh_merge(h, acc):
+    h ^= xxh_round(0, acc)
+    return (h * XXH_PRIME_1 + XXH_PRIME_4) & lib.MASK_64
+
+# XXH64. Inputs of 32 bytes or more are consumed as four interleaved
+# streams of 8 byte lanes, and the remainder 8, 4 and 1 bytes at a
+# time.
+def xxhash(key, seed=0):
+    data = key_bytes(key)
+    n = len(data)
+    mask = lib.MASK_64
+    i = 0
+
+    if n >= 32:
+        v1 = (seed + XXH_PRIME_1 + XXH_PRIME_2) & mask
+        v2 = (seed + XXH_PRIME_2) & mask
+        v3 = seed
+        v4 = (seed - XXH_PRIME_1) & mask
+        while i + 32 <= n:
+            lane1, lane2, lane3, lane4 = struct.unpack_from("<4Q", data, i)
+            v1 = xxh_round(v1, lane1)
+            v2 = xxh_round(v2, lane2)
+            v3 = xxh_round(v3, lane3)
+            v4 = xxh_round(v4, lane4)
+            i += 32
+        h = (rotate_left(v1, 1) + rotate_left(v2, 7) +
+             rotate_left(v3, 12) + rotate_left(v4, 18)) & mask
+        for v in (v1, v2, v3, v4):
+            h = xxh_merge(h, v)
+    else:
+        h = (seed + XXH_PRIME_5) & mask
+
+    h = (h + n) & mask
+    while i + 8 <= n:
+        h ^= xxh_round(0, struct.unpack_from("<Q", data, i)[0])
+        h = (rotate_left(h, 27) * XXH_PRIME_1 + XXH_PRIME_4) & mask
+        i += 8
+    if i + 4 <= n:
+        h ^= (struct.unpack_from("<I", data, i)[0] * XXH_PRIME_1) & mask
+        h = (rotate_left(h, 23) * XXH_PRIME_2 + XXH_PRIME_3) & mask
+        i += 4
+    while i < n:
+        h ^= (ord(data[i]) * XXH_PRIME_5) & mask
+        h = (rotate_left(h, 11) * XXH_PRIME_1) & mask
+        i += 1
+
+    h ^= h >> 33
+    h = (h * XXH_PRIME_2) & mask
+    h ^= h >> 29
+    h = (h * XXH_PRIME_3) & mask
+    h ^= h >> 32
+    return to_signed(h)
+
+HASH_FUNCTIONS = (
+    ("builtin", hash),
+    ("splitmix", splitmix_hash),
+    ("fnv1a", fnv1a_hash),
+    ("xxhash", xxhash),
+    ("ascii_sum", ascii_sum_hash)
+)
+
+# Return a dictionary of statistics of the distribution of keys over
+# a table of 'slots' slots, which must be a power of two, using the
+# low bits of their hashes as the slot index (as both tables do when
+# their size is a power of two):
+#
+#   collisions    the fraction of keys which share a slot with an
+#                 earlier key.
+#   max_bucket    the largest number of keys in one slot.
+#   chi_squared   the chi-squared statistic of the slot counts, divided
+#                 by the number of slots. This is close to 1 for a
+#                 uniformly random hash, and larger for a worse one.
+def hash_distribution(hash_function, keys, slots):
+    mask = slots - 1
+    counts = [0] * slots
+    for key in keys:
+        counts[hash_function(key) & mask] += 1
+
+    n = len(keys)
+    expected = n / float(slots)
+    occupied = sum(1 for count in counts if count)
+    return {
+        "collisions": (n - occupied) / float(n),
+        "max_bucket": max(counts),
+        "chi_squared": sum((count - expected) ** 2 for count in counts) /
+                       expected / slots
+    }
 
 # An example of a very naive implementation. This just adds key value
 # pairs into a list. Retrieval of elements involves just brute forcing
@@ -52,33 +245,501 @@ class BadHashTable:
             if entry and entry.key == key:
                 return entry.value
 
-# A proper hash table. The (primitive) hash function just casts the
-# key to a string, then sums up the ASCII values of all the
-# characters. This implementation offers collision avoidance by using
-# list buckets.
+# A proper hash table. This implementation offers collision avoidance
+# by using list buckets. Each bucket must be a separate list:
+# [list()] * size would create one list, shared by every bucket. The
+# hash of each key is stored in its entry, so that entries with a
+# different hash are skipped without comparing the keys.
 class HashTable:
-    def __init__(self, size=20):
-        self.list = [list()] * size
+    def __init__(self, size=20, hash_function=hash):
+        self.list = [list() for i in xrange(size)]
+        self.hash_function = hash_function
 
     def hash(self, key):
-        total = 0
-        for c in str(key):
-            total = total + ord(c)
-        return total % len(self.list)
+        return self.hash_function(key) % len(self.list)
 
     def set(self, key, value):
-        index = self.hash(key)
-        entry = KeyValue(key, value)
-        self.list[index].append(entry)
+        h = self.hash_function(key)
+        entry = KeyValue(key, value, h)
+        self.list[h % len(self.list)].append(entry)
 
     def get(self, key):
-        index = self.hash(key)
-        for entry in self.list[index]:
-            if entry.key == key:
+        h = self.hash_function(key)
+        for entry in self.list[h % len(self.list)]:
+            if entry.hash == h and entry.key == key:
                 return entry.value
 
+    # Remove the most recently set entry for a key. Raises KeyError if
+    # there is no such key.
+    def delete(self, key):
+        h = self.hash_function(key)
+        bucket = self.list[h % len(self.list)]
+        for i in xrange(len(bucket) - 1, -1, -1):
+            entry = bucket[i]
+            if entry.hash == h and entry.key == key:
+                del bucket[i]
+                return
+        raise KeyError(key)
+
+# A chained hash table which resizes itself. If 'rehash_step' is None,
+# every entry is moved to the new buckets as soon as the table is
+# resized. Otherwise, each set() and get() moves the entries of up to
+# 'rehash_step' buckets (and skips up to 10 times as many empty ones),
+# until the resize is complete. Buckets are created when an entry is
+# first added to them, so allocating the new buckets is fast.
+class ResizingHashTable(HashTable):
+    def __init__(self, size=20, hash_function=hash, max_load_factor=1.0,
+                 rehash_step=None):
+        if max_load_factor <= 0:
+            raise ValueError("max_load_factor must be positive")
+        if rehash_step is not None and rehash_step < 1:
+            raise ValueError("rehash_step must be at least 1")
+        self.list = [None] * size
+        self.hash_function = hash_function
+        self.max_load_factor = max_load_factor
+        self.rehash_step = rehash_step
+        self.count = 0
+        # While resizing, the new buckets, and the index of the next
+        # old bucket to be moved:
+        self.new_list = None
+        self.rehash_index = 0
+
+    def __len__(self):
+        return self.count
+
+    def _start_resize(self):
+        self.new_list = [None] * (2 * len(self.list))
+        self.rehash_index = 0
+        if self.rehash_step is None:
+            self._rehash(len(self.list))
+
+    # Move the entries of up to n old buckets into the new buckets,
+    # visiting at most 10n empty buckets, and finish the resize if no
+    # old buckets remain.
+    def _rehash(self, n):
+        old = self.list
+        new = self.new_list
+        size = len(new)
+        empty_visits = 10 * n
+        i = self.rehash_index
+
+        while n and i < len(old):
+            bucket = old[i]
+            if bucket:
+                for entry in bucket:
+                    index = entry.hash % size
+                    if new[index] is None:
+                        new[index] = [entry]
+                    else:
+                        new[index].append(entry)
+                old[i] = None
+                n -= 1
+            else:
+                empty_visits -= 1
+                if not empty_visits:
+                    i += 1
+                    break
+            i += 1
+
+        self.rehash_index = i
+        if i == len(old):
+            self.list = new
+            self.new_list = None
+
+    # Return the entry for a key, or None.
+    def _find(self, key, h):
+        for buckets in (self.list, self.new_list):
+            if buckets is None:
+                break
+            bucket = buckets[h % len(buckets)]
+            if bucket:
+                for entry in bucket:
+                    if entry.hash == h and entry.key == key:
+                        return entry
+        return None
+
+    def set(self, key, value):
+        if self.new_list is not None:
+            self._rehash(self.rehash_step)
+
+        h = self.hash_function(key)
+        entry = self._find(key, h)
+        if entry:
+            entry.value = value
+            return
+
+        buckets = self.list if self.new_list is None else self.new_list
+        index = h % len(buckets)
+        if buckets[index] is None:
+            buckets[index] = [KeyValue(key, value, h)]
+        else:
+            buckets[index].append(KeyValue(key, value, h))
+        self.count += 1
+
+        if (self.new_list is None and
+            self.count > self.max_load_factor * len(self.list)):
+            self._start_resize()
+
+    def get(self, key):
+        if self.new_list is not None:
+            self._rehash(self.rehash_step)
+
+        entry = self._find(key, self.hash_function(key))
+        if entry:
+            return entry.value
+
+    def delete(self, key):
+        if self.new_list is not None:
+            self._rehash(self.rehash_step)
+
+        h = self.hash_function(key)
+        for buckets in (self.list, self.new_list):
+            if buckets is None:
+                break
+            bucket = buckets[h % len(buckets)]
+            if bucket:
+                for i, entry in enumerate(bucket):
+                    if entry.hash == h and entry.key == key:
+                        del bucket[i]
+                        self.count -= 1
+                        return
+        raise KeyError(key)
+
+# Time inserting keys into an initially small ResizingHashTable, and
+# report the 99th percentile and maximum latency of a single set(),
+# with the stop-the-world and incremental resizing modes.
+def test_set_latency(options):
+    sizes = options.sizes or [10 ** 4, 10 ** 5, 10 ** 6]
+    report = lib.BenchmarkReport("set_latency", options)
+    clock = lib.clock
+
+    def fill(args):
+        keys, rehash_step = args
+        table = ResizingHashTable(8, rehash_step=rehash_step)
+        latencies = []
+        # Pauses for cyclic garbage collection, which are proportional
+        # to the number of objects, would hide the latency of resizing:
+        gc.disable()
+        try:
+            for i, key in enumerate(keys):
+                t0 = clock()
+                table.set(key, i)
+                latencies.append(clock() - t0)
+        finally:
+            gc.enable()
+        assert all(table.get(key) == i for i, key in enumerate(keys))
+        return latencies
+
+    for test_size in sizes:
+        keys = get_keys("random", test_size, options.seed)
+        for mode, rehash_step in (("stop_the_world", None),
+                                  ("incremental", 1)):
+            times, latencies = lib.benchmark(
+                fill, lambda: (keys, rehash_step),
+                options.repeat, options.warmup)
+            latencies.sort()
+            measures = {
+                "p99": lib.percentile(latencies, 99),
+                "max": latencies[-1],
+                "ops_per_second": test_size / sum(latencies)
+            }
+            report.add(times, unit="entries", size=test_size, mode=mode,
+                       measures=measures)
+
+    report.finish()
+
+# Markers for the slots of an open addressing table which have never
+# held an entry, and which held an entry that has been deleted.
+EMPTY = object()
+DELETED = object()
+
+MIN_CAPACITY = 8
+
+# An open addressing hash table using linear probing. 'size' is the
+# initial number of slots, which is rounded up to a power of two.
+class OpenAddressingHashTable:
+    def __init__(self, size=MIN_CAPACITY, max_load_factor=0.5,
+                 hash_function=hash):
+        if not 0 < max_load_factor < 1:
+            raise ValueError("max_load_factor must be between 0 and 1")
+        self.max_load_factor = max_load_factor
+        self.hash_function = hash_function
+        capacity = MIN_CAPACITY
+        while capacity < size:
+            capacity *= 2
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.keys = [EMPTY] * capacity
+        self.values = [None] * capacity
+        self.hashes = array("l", [0]) * capacity
+        self.mask = capacity - 1
+        # The number of entries, and of entries and tombstones:
+        self.used = 0
+        self.filled = 0
+
+    def __len__(self):
+        return self.used
+
+    def __contains__(self, key):
+        return self._find(key) >= 0
+
+    def __iter__(self):
+        for key in self.keys:
+            if key is not EMPTY and key is not DELETED:
+                yield key
+
+    # Return the index of the slot holding the key, or -1.
+    def _find(self, key):
+        h = self.hash_function(key)
+        keys = self.keys
+        hashes = self.hashes
+        mask = self.mask
+        i = h & mask
+        while True:
+            k = keys[i]
+            if k is EMPTY:
+                return -1
+            if hashes[i] == h and k is not DELETED and (k is key or
+                                                        k == key):
+                return i
+            i = (i + 1) & mask
+
+    # Move every entry into new arrays of the given capacity, using the
+    # stored hashes, which leaves the tombstones behind.
+    def _resize(self, capacity):
+        keys = self.keys
+        values = self.values
+        hashes = self.hashes
+        used = self.used
+        self._allocate(capacity)
+
+        new_keys = self.keys
+        new_values = self.values
+        new_hashes = self.hashes
+        mask = self.mask
+        for i, key in enumerate(keys):
+            if key is EMPTY or key is DELETED:
+                continue
+            h = hashes[i]
+            j = h & mask
+            while new_keys[j] is not EMPTY:
+                j = (j + 1) & mask
+            new_keys[j] = key
+            new_values[j] = values[i]
+            new_hashes[j] = h
+
+        self.used = used
+        self.filled = used
+
+    def set(self, key, value):
+        h = self.hash_function(key)
+        keys = self.keys
+        hashes = self.hashes
+        mask = self.mask
+        i = h & mask
+        tombstone = -1
+        while True:
+            k = keys[i]
+            if k is EMPTY:
+                break
+            if k is DELETED:
+                if tombstone < 0:
+                    tombstone = i
+            elif hashes[i] == h and (k is key or k == key):
+                self.values[i] = value
+                return
+            i = (i + 1) & mask
+
+        if tombstone >= 0:
+            i = tombstone
+        elif self.filled + 1 > self.max_load_factor * len(keys):
+            # Double the capacity if at least half of the load is
+            # entries, otherwise just clear out the tombstones:
+            capacity = len(keys)
+            if self.used + 1 > self.max_load_factor * capacity / 2:
+                capacity *= 2
+            self._resize(capacity)
+            return self.set(key, value)
+        else:
+            self.filled += 1
+
+        keys[i] = key
+        self.values[i] = value
+        hashes[i] = h
+        self.used += 1
+
+    def get(self, key):
+        i = self._find(key)
+        if i >= 0:
+            return self.values[i]
+
+    # Remove the entry for a key. Raises KeyError if there is no such
+    # key.
+    def delete(self, key):
+        i = self._find(key)
+        if i < 0:
+            raise KeyError(key)
+
+        # A tombstone is only needed if a probe sequence could continue
+        # past this slot:
+        if self.keys[(i + 1) & self.mask] is EMPTY:
+            self.keys[i] = EMPTY
+            self.filled -= 1
+        else:
+            self.keys[i] = DELETED
+        self.values[i] = None
+        self.used -= 1
+
+        capacity = len(self.keys)
+        if (capacity > MIN_CAPACITY and
+            self.used < self.max_load_factor * capacity / 8):
+            self._resize(capacity // 2)
+
+# Return a list of n keys of the given kind:
+#
+#   sequential    the integers 0 to n - 1.
+#   random        random integers.
+#   strings       strings of the form "key<i>".
+#   anagrams      random permutations of the same 12 letters.
+def get_keys(kind, n, seed=0):
+    rng = random.Random(seed)
+    if kind == "sequential":
+        return range(n)
+    elif kind == "random":
+        return [rng.getrandbits(63) for i in xrange(n)]
+    elif kind == "strings":
+        return ["key%d" % i for i in xrange(n)]
+    elif kind == "anagrams":
+        letters = list("abcdefghijkl")
+        keys = set()
+        while len(keys) < n:
+            rng.shuffle(letters)
+            keys.add("".join(letters))
+        return sorted(keys)
+    raise ValueError("unknown kind of key '%s'" % kind)
+
+KEY_KINDS = ("sequential", "random", "strings", "anagrams")
+
+# Time each hash function over each kind of key, and report the
+# distribution of the keys over a table with twice as many slots as
+# keys.
+def test_hash_functions(options):
+    sizes = options.sizes or [10 ** 3, 10 ** 4, 10 ** 5]
+    report = lib.BenchmarkReport("hash_functions", options)
+
+    for test_size in sizes:
+        slots = 2
+        while slots < 2 * test_size:
+            slots *= 2
+
+        for kind in KEY_KINDS:
+            keys = get_keys(kind, test_size, options.seed)
+            for name, hash_function in HASH_FUNCTIONS:
+                times, hashes = lib.benchmark(
+                    lambda keys: map(hash_function, keys), lambda: keys,
+                    options.repeat, options.warmup)
+                measures = hash_distribution(hash_function, keys, slots)
+                measures["ops_per_second"] = (
+                    test_size / lib.get_stats(times)["median"])
+                report.add(times, unit="keys", size=test_size, keys=kind,
+                           hash_function=name, measures=measures)
+
+    report.finish()
+
 if __name__ == "__main__":
-    print "Good Hash Table:"
-    lib.test_hash_table(HashTable)
-    print "\nBad Hash Table:"
-    lib.test_hash_table(BadHashTable)
+    # Check the byte string hashes against reference values:
+    assert fnv1a_hash("") == to_signed(0xCBF29CE484222325)
+    assert fnv1a_hash("a") == to_signed(0xAF63DC4C8601EC8C)
+    for data, expected in (("", 0xEF46DB3751D8E999),
+                           ("a", 0xD24EC4F1A98C6E5B),
+                           ("abc", 0x44BC2CF5AD770999),
+                           ("x" * 31, 0x60DD0D01083B99F0),
+                           ("0123456789" * 7, 0x4916A0F3F0E1C781)):
+        assert xxhash(data) == to_signed(expected)
+
+    # Every hash function works with both tables:
+    for name, hash_function in HASH_FUNCTIONS:
+        keys = get_keys("strings", 1000) + range(1000)
+        for table in (HashTable(100, hash_function),
+                      OpenAddressingHashTable(hash_function=hash_function)):
+            for i, key in enumerate(keys):
+                table.set(key, i)
+            assert all(table.get(key) == i for i, key in enumerate(keys))
+
+    # Check the open addressing table against a dictionary, with keys
+    # from a small range so that they are frequently deleted and
+    # reinserted:
+    rng = random.Random(0)
+    table = OpenAddressingHashTable()
+    expected = {}
+    for i in xrange(20000):
+        key = rng.randrange(1000)
+        if key in expected and rng.random() < 0.5:
+            table.delete(key)
+            del expected[key]
+        else:
+            table.set(key, i)
+            expected[key] = i
+        assert len(table) == len(expected)
+    assert sorted(table) == sorted(expected)
+    assert all(table.get(key) == value for key, value in expected.items())
+    assert table.get(-1) is None and -1 not in table
+    assert table.filled < len(table.keys) * table.max_load_factor
+
+    # The table shrinks as entries are deleted:
+    capacity = len(table.keys)
+    for key in expected:
+        table.delete(key)
+    assert len(table.keys) < capacity and len(table) == 0
+    try:
+        table.delete(0)
+        assert False
+    except KeyError:
+        pass
+
+    # Check both resizing modes, including lookups and replacements in
+    # the middle of a resize:
+    for rehash_step in (None, 1, 4):
+        table = ResizingHashTable(4, rehash_step=rehash_step)
+        keys = get_keys("strings", 5000) + range(5000)
+        for i, key in enumerate(keys):
+            table.set(key, i)
+            if i % 7 == 0:
+                assert table.get(keys[i // 2]) == i // 2
+                table.set(keys[i // 2], i // 2)
+        assert len(table) == len(keys)
+        assert all(table.get(key) == i for i, key in enumerate(keys))
+        assert table.get(-1) is None
+        while table.new_list is not None:
+            table.get(0)
+        assert len(table.list) >= len(keys)
+        assert sum(len(bucket) for bucket in table.list if bucket) == \
+            len(keys)
+        for key in keys[::2]:
+            table.delete(key)
+        assert len(table) == len(keys[1::2])
+        assert table.get(keys[0]) is None and table.get(keys[1]) == 1
+
+    # Each bucket of the chained table is a separate list:
+    table = HashTable(10)
+    table.set(1, "a")
+    assert sum(len(bucket) for bucket in table.list) == 1
+    table.set(11, "b")
+    table.delete(1)
+    assert table.get(1) is None and table.get(11) == "b"
+    try:
+        table.delete(1)
+        assert False
+    except KeyError:
+        pass
+
+    options = lib.get_benchmark_options()
+    lib.test_hash_table(OpenAddressingHashTable,
+                        options.sizes or [10 ** (i + 1) for i in range(7)],
+                        options)
+    lib.test_hash_table(HashTable, options=options)
+    test_hash_functions(options)
+    test_set_latency(options)
+    # Lookups in BadHashTable are O(n), so only small sizes are timed:
+    lib.test_hash_table(BadHashTable, sizes=[10, 100, 1000])
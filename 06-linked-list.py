@@ -116,18 +116,33 @@ class SinglyLinkedList:
             x = x.next
         return s
 
+# The list keeps a pointer to its last element as well as its first,
+# so that elements can be removed from either end in O(1).
 class DoublyLinkedList:
 
     def __init__(self):
         self.head = None
+        self.tail = None
 
     def insert(self, x):
         x.next = self.head
         x.prev = None
         if self.head:
             self.head.prev = x
+        else:
+            self.tail = x
         self.head = x
 
+    # Insert the element y immediately after the element x.
+    def insert_after(self, x, y):
+        y.prev = x
+        y.next = x.next
+        if x.next:
+            x.next.prev = y
+        else:
+            self.tail = y
+        x.next = y
+
     def delete(self, x):
         if x.prev:
             x.prev.next = x.next
@@ -136,6 +151,8 @@ class DoublyLinkedList:
 
         if x.next:
             x.next.prev = x.prev
+        else:
+            self.tail = x.prev
 
     def get(self, index):
         i = 0
@@ -188,9 +205,17 @@ class DoublyLinkedList:
         return s
 
 if __name__ == "__main__":
+    l = DoublyLinkedList()
+    a, b, c = Element(1), Element(2), Element(3)
+    l.insert(a)
+    l.insert_after(a, c)
+    l.insert_after(a, b)
+    assert str(l) == "1 2 3 " and l.tail is c
+    l.delete(c)
+    assert l.tail is b
+    l.delete(a)
+    l.delete(b)
+    assert l.head is None and l.tail is None
 
-    print "UNSORTED SINGLY LINKED LIST:"
     lib.test_linked_list(SinglyLinkedList(), Element)
-
-    print "UNSORTED DOUBLY LINKED LIST:"
     lib.test_linked_list(DoublyLinkedList(), Element)
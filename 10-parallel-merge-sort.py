@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+#
+## Parallel merge sort:
+#
+# Accepts an array of integers 'data' {d1,d2,...dn} and returns a
+# permutation of the input sequence such that {d'1<=d'2<=...<=d'n},
+# using a pool of worker processes.
+#
+# The input is copied once into a buffer in shared memory, which the
+# worker processes inherit when the pool is created, so the data is
+# never pickled and sent between processes. The sort then proceeds in
+# two parallel phases:
+#
+#   1. The buffer is split into p equal chunks, one per worker, and
+#      each worker sorts its chunk in place using a single-process
+#      merge sort. This produces p sorted runs.
+#
+#   2. The runs are merged with a parallel k-way merge. A set of p-1
+#      splitter values is chosen by sampling the sorted runs, which
+#      divides the range of values into p partitions. Binary searching
+#      each run for the splitters gives the slice of every run that
+#      falls within each partition, and since the partitions are
+#      ordered, the output position of each partition is known in
+#      advance. Each worker then merges the slices of its partition
+#      from every run, using a heap, directly into its region of a
+#      second shared buffer.
+#
+## Performance:
+#
+# Worst case performance:       O((n/p) log n + p^2 log n)
+# Best case performance:        O((n/p) log n + p^2 log n)
+# Average case performance:     O((n/p) log n + p^2 log n)
+# Memory usage:                 O(n)
+#
+## Advantages:
+#
+# Both the sort and the merge are split across all of the processors,
+#  so there is no single-process O(n) merge at the end.
+# Processes sidestep the Global Interpreter Lock, which prevents
+#  threads from executing Python code in parallel.
+#
+## Disadvantages:
+#
+# Only sorts integers which fit in a C long, since the data is stored
+#  in a typed shared memory buffer.
+# Starting the worker processes and copying data in and out of shared
+#  memory has a fixed cost, so small inputs are faster to sort in a
+#  single process.
+# Partitions are only balanced if the splitters divide the values
+#  evenly. Inputs with many copies of the same value may place most of
+#  the work in a single partition.
+#
+## References:
+#
+# Introduction to Algorithms, section 27.3, page 797.
+# http://en.wikipedia.org/wiki/Merge_sort#Parallel_merge_sort
+# http://en.wikipedia.org/wiki/Samplesort
+#
+## Code:
+#
+import argparse
+import heapq
+from bisect import bisect_left
+from multiprocessing import Pool, cpu_count
+from multiprocessing.sharedctypes import RawArray
+
+import lib
+
+merge_sort = lib.import_algorithm("01-merge-sort")
+
+# The shared memory buffers of the current sort. These are set in the
+# parent process before the worker pool is created, so that the
+# workers inherit them rather than receiving a pickled copy.
+shared = {}
+
+# Allocate shared buffers for sorting up to n elements, and start a
+# pool of worker processes which inherits them. The pool can be passed
+# to any number of parallel_merge_sort() calls of at most n elements,
+# so that the cost of starting the workers is only paid once.
+def start_pool(workers, n):
+    shared["src"] = RawArray("l", n)
+    shared["dst"] = RawArray("l", n)
+    return Pool(workers)
+
+# Stop a pool started by start_pool(), and free its buffers.
+def stop_pool(pool):
+    pool.close()
+    pool.join()
+    shared.clear()
+
+# Sort the elements buffer[lo:hi] in place.
+def sort_chunk(bounds):
+    lo, hi = bounds
+    src = shared["src"]
+    src[lo:hi] = merge_sort.merge_sort_bottom_up(src[lo:hi])
+
+# Merge a list of sorted slices of the source buffer into the
+# destination buffer, starting at the given offset.
+def merge_partition(args):
+    slices, offset = args
+    src = shared["src"]
+    dst = shared["dst"]
+    merged = list(heapq.merge(*[src[lo:hi] for lo, hi in slices]))
+    dst[offset:offset + len(merged)] = merged
+
+# Input a list of sorted runs, given as (lo, hi) bounds into the
+# source buffer, and return the arguments for merge_partition() for
+# each of the p partitions of the output.
+def get_partitions(src, runs, p):
+    # Sample p values evenly from each run, and choose p-1 evenly
+    # spaced splitters from the sorted samples:
+    samples = []
+    for lo, hi in runs:
+        step = max((hi - lo) // p, 1)
+        samples += src[lo:hi:step]
+    samples.sort()
+    splitters = [samples[i * len(samples) // p] for i in range(1, p)]
+
+    # Partition j holds all of the values in the range
+    # [splitters[j - 1], splitters[j]). Using bisect_left() for both
+    # bounds assigns every element to exactly one partition.
+    starts = list(lo for lo, hi in runs)
+    partitions = []
+    offset = 0
+    for splitter in splitters + [None]:
+        slices = []
+        for i, (lo, hi) in enumerate(runs):
+            if splitter is None:
+                end = hi
+            else:
+                end = bisect_left(src, splitter, starts[i], hi)
+            if end > starts[i]:
+                slices.append((starts[i], end))
+            starts[i] = end
+
+        partitions.append((slices, offset))
+        offset += sum(hi - lo for lo, hi in slices)
+
+    return partitions
+
+# Sort data using 'workers' processes. If a pool from start_pool() is
+# given, the data is copied into its buffers and sorted by its
+# workers, otherwise a pool is started and stopped for this call.
+def parallel_merge_sort(data, workers=None, pool=None):
+    workers = min(workers or cpu_count(), max(len(data), 1))
+    n = len(data)
+
+    if pool is None:
+        own_pool = True
+        shared["src"] = RawArray("l", data)
+        shared["dst"] = RawArray("l", n)
+        if workers > 1:
+            pool = Pool(workers)
+    else:
+        own_pool = False
+        if len(shared["src"]) < n:
+            raise ValueError("data is larger than the pool's buffers")
+        shared["src"][:n] = data
+
+    # Split the input into one chunk per worker:
+    runs = [(i * n // workers, (i + 1) * n // workers)
+            for i in range(workers)]
+
+    try:
+        if workers == 1:
+            sort_chunk(runs[0])
+            data[:] = shared["src"][:n]
+        else:
+            pool.map(sort_chunk, runs)
+            pool.map(merge_partition,
+                     get_partitions(shared["src"], runs, workers))
+            data[:] = shared["dst"][:n]
+    finally:
+        if own_pool:
+            if pool is not None:
+                pool.close()
+                pool.join()
+            shared.clear()
+
+    return data
+
+# Time the parallel merge sort using between 1 and max_workers worker
+# processes, and report the speedup over the single-process merge
+# sorts. The worker pool is started outside of the timed region.
+def test_parallel_speedup(max_workers, options):
+    sizes = options.sizes or [10 ** 5, 10 ** 6]
+    report = lib.BenchmarkReport("parallel_merge_sort", options)
+
+    for test_size in sizes:
+        data = lib.get_int_array(test_size, "random", options.seed)
+        original_hash = lib.multiset_hash(data)
+
+        baselines = {}
+        for sort_algorithm in (merge_sort.merge_sort,
+                               merge_sort.merge_sort_bottom_up):
+            times, _ = lib.benchmark(sort_algorithm, lambda: list(data),
+                                     options.repeat, options.warmup)
+            name = sort_algorithm.__name__
+            baselines[name] = lib.get_stats(times)["median"]
+            report.add(times, size=test_size, workers=0, baseline=name)
+
+        for workers in range(1, max_workers + 1):
+            pool = start_pool(workers, test_size)
+            try:
+                times, sorted_data = lib.benchmark(
+                    lambda data: parallel_merge_sort(data, workers, pool),
+                    lambda: list(data), options.repeat, options.warmup)
+            finally:
+                stop_pool(pool)
+
+            # Confirm that the sort worked, and neither lost nor
+            # duplicated any elements:
+            assert lib.array_is_sorted(sorted_data, original_hash)
+
+            median = lib.get_stats(times)["median"]
+            for name, baseline in sorted(baselines.items()):
+                report.add(times, size=test_size, workers=workers,
+                           baseline=name,
+                           measures={"speedup": baseline / median})
+
+    report.finish()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel merge sort")
+    parser.add_argument("--workers", type=int, default=cpu_count(),
+                        help="maximum number of worker processes "
+                        "(default: number of CPUs)")
+    options = lib.get_benchmark_options(parser=parser)
+
+    test_parallel_speedup(options.workers, options)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+#
+## External merge sort:
+#
+# Accepts a binary file of integers {d1,d2,...dn} and writes a
+# permutation of the input sequence to a new file such that
+# {d'1<=d'2<=...<=d'n}, without ever holding more than a bounded
+# number of integers in memory.
+#
+# An external sort is used when the data to be sorted does not fit
+# into main memory. It works in two phases:
+#
+#   1. The input file is read in chunks which are small enough to fit
+#      into memory. Each chunk is sorted using an in-memory merge sort
+#      and written out to a temporary "run" file.
+#
+#   2. The sorted runs are merged using a k-way merge. A min-heap
+#      holds the next unmerged element from each run, so each output
+#      element costs O(log k). Runs are read and the output is written
+#      through fixed-size buffers. If there are more runs than the
+#      merge fan-in, then groups of runs are merged into longer runs
+#      in multiple passes, until a single run remains.
+#
+# The integers are stored in the native byte order, using the
+# 'array' module typecode given (by default 'l', a C long).
+#
+## Performance:
+#
+# Worst case performance:       O(n log n)
+# Best case performance:        O(n log n)
+# Average case performance:     O(n log n)
+# Memory usage:                 O(c + kb), for a chunk size c, fan-in k
+#                               and buffer size b.
+# Passes over the data:         1 + ceil(log_k(n / c))
+#
+## Advantages:
+#
+# Can sort datasets which are much larger than main memory.
+# All disk access is sequential.
+#
+## Disadvantages:
+#
+# Every pass reads and writes the entire dataset, so performance is
+#  usually bound by disk throughput.
+# Requires enough free disk space for a second copy of the data.
+#
+## References:
+#
+# The Art of Computer Programming, Volume 3, section 5.4, page 248.
+# http://en.wikipedia.org/wiki/External_sorting
+#
+## Code:
+#
+import argparse
+import heapq
+import os
+import shutil
+import tempfile
+from array import array
+from itertools import chain, islice
+from multiprocessing import Pipe, Process
+
+import lib
+
+merge_sort = lib.import_algorithm("01-merge-sort")
+
+# Yield the contents of a binary file as a sequence of arrays of at
+# most 'block_size' integers.
+def read_blocks(infile, typecode, block_size):
+    while True:
+        block = array(typecode)
+        try:
+            block.fromfile(infile, block_size)
+        except EOFError:
+            # The final block is short. Whatever was available has
+            # been read into the array.
+            pass
+
+        if not block:
+            return
+        yield block
+
+        if len(block) < block_size:
+            return
+
+# Write a sequence of integers to a binary file, 'buffer_size'
+# integers at a time.
+def write_buffered(values, outfile, typecode, buffer_size):
+    values = iter(values)
+    while True:
+        block = array(typecode, islice(values, buffer_size))
+        if not block:
+            return
+        block.tofile(outfile)
+
+# The first phase: read the input file in chunks, sort each chunk in
+# memory, and write it to a run file in 'tmpdir'. Returns the list of
+# run file paths.
+def make_runs(infile, tmpdir, typecode, chunk_size):
+    runs = []
+
+    for chunk in read_blocks(infile, typecode, chunk_size):
+        path = os.path.join(tmpdir, "run-%d" % len(runs))
+        data = merge_sort.merge_sort_bottom_up(chunk.tolist())
+        with open(path, "wb") as outfile:
+            array(typecode, data).tofile(outfile)
+        runs.append(path)
+
+    return runs
+
+# The second phase: merge a list of sorted run files into the output
+# file through a heap.
+def merge_runs(paths, outfile, typecode, buffer_size):
+    infiles = [open(path, "rb") for path in paths]
+    try:
+        runs = [chain.from_iterable(read_blocks(infile, typecode,
+                                                buffer_size))
+                for infile in infiles]
+        write_buffered(heapq.merge(*runs), outfile, typecode, buffer_size)
+    finally:
+        for infile in infiles:
+            infile.close()
+
+# Sort the binary integer file at 'input_path', writing the result to
+# 'output_path'. At most 'chunk_size' integers are sorted in memory at
+# a time, and at most 'fan_in' runs are merged at a time, each with a
+# read buffer of 'buffer_size' integers.
+def external_merge_sort(input_path, output_path, chunk_size=2 ** 20,
+                        fan_in=64, buffer_size=2 ** 14, typecode="l",
+                        tmpdir=None):
+    if fan_in < 2:
+        raise ValueError("merge fan-in must be at least 2")
+
+    workdir = tempfile.mkdtemp(prefix="external-merge-sort-", dir=tmpdir)
+    try:
+        with open(input_path, "rb") as infile:
+            runs = make_runs(infile, workdir, typecode, chunk_size)
+
+        # Merge groups of runs into longer runs until no more than
+        # fan_in runs remain:
+        generation = 0
+        while len(runs) > fan_in:
+            merged = []
+            for i in range(0, len(runs), fan_in):
+                path = os.path.join(workdir, "merge-%d-%d"
+                                    % (generation, len(merged)))
+                with open(path, "wb") as outfile:
+                    merge_runs(runs[i:i + fan_in], outfile, typecode,
+                               buffer_size)
+                for run in runs[i:i + fan_in]:
+                    os.remove(run)
+                merged.append(path)
+            runs = merged
+            generation += 1
+
+        with open(output_path, "wb") as outfile:
+            merge_runs(runs, outfile, typecode, buffer_size)
+    finally:
+        shutil.rmtree(workdir)
+
+# Write 'length' random integers to a binary file, generating at most
+# 'block_size' integers at a time.
+def write_random_file(path, length, typecode="l", seed=0,
+                      block_size=2 ** 20):
+    with open(path, "wb") as outfile:
+        for i in range(0, length, block_size):
+            size = min(block_size, length - i)
+            block = lib.get_uniform_ints(size, 10 * length, seed + i)
+            array(typecode, block).tofile(outfile)
+
+# Run a function in a child process, so that its peak memory usage
+# can be measured independently of the benchmark process. Returns the
+# peak resident set size of the child in MB. Raises RuntimeError if
+# the function fails in the child.
+def run_in_child(func, *args):
+    def child(connection):
+        func(*args)
+        connection.send(lib.get_peak_rss())
+        connection.close()
+
+    parent_connection, child_connection = Pipe()
+    process = Process(target=child, args=(child_connection,))
+    process.start()
+    # Close the parent's copy of the child's end, so that the pipe
+    # reaches EOF if the child exits without sending a result:
+    child_connection.close()
+    try:
+        peak_rss = parent_connection.recv()
+    except EOFError:
+        peak_rss = None
+    finally:
+        parent_connection.close()
+        process.join()
+
+    if process.exitcode:
+        raise RuntimeError("child process exited with code %d" %
+                           process.exitcode)
+    if peak_rss is None:
+        raise RuntimeError("child process exited without a result")
+    return peak_rss
+
+# Time the external sort over a range of file sizes, and report the
+# throughput in MB/s and peak memory usage.
+def test_external_sort(options):
+    sizes = options.sizes or [10 ** 5, 10 ** 6, 10 ** 7]
+    report = lib.BenchmarkReport("external_merge_sort", options)
+    itemsize = array(options.typecode).itemsize
+    workdir = tempfile.mkdtemp(prefix="external-merge-sort-",
+                               dir=options.tmpdir)
+
+    def sort(paths):
+        return run_in_child(external_merge_sort, paths[0], paths[1],
+                            options.chunk_size, options.fan_in,
+                            options.buffer_size, options.typecode,
+                            options.tmpdir)
+
+    try:
+        for test_size in sizes:
+            input_path = os.path.join(workdir, "input")
+            output_path = os.path.join(workdir, "output")
+            write_random_file(input_path, test_size, options.typecode,
+                              options.seed)
+
+            times, peak_rss = lib.benchmark(
+                sort, lambda: (input_path, output_path),
+                options.repeat, options.warmup)
+
+            # Confirm that the sort worked
+            assert os.path.getsize(output_path) == test_size * itemsize
+            assert lib.file_is_sorted(
+                output_path, options.typecode,
+                lib.file_multiset_hash(input_path, options.typecode))
+
+            megabytes = test_size * itemsize / float(2 ** 20)
+            median = lib.get_stats(times)["median"]
+            report.add(times, size=test_size, chunk_size=options.chunk_size,
+                       fan_in=options.fan_in,
+                       measures={"throughput": megabytes / median,
+                                 "peak_rss": peak_rss})
+    finally:
+        shutil.rmtree(workdir)
+
+    report.finish()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="External merge sort")
+    parser.add_argument("--sort", nargs=2, metavar=("INPUT", "OUTPUT"),
+                        help="sort a binary integer file instead of "
+                        "running the benchmark")
+    parser.add_argument("--chunk-size", type=int, default=2 ** 20,
+                        help="integers to sort in memory at a time "
+                        "(default: 2^20)")
+    parser.add_argument("--fan-in", type=int, default=64,
+                        help="maximum number of runs to merge at a time "
+                        "(default: 64)")
+    parser.add_argument("--buffer-size", type=int, default=2 ** 14,
+                        help="integers to buffer per run when merging "
+                        "(default: 2^14)")
+    parser.add_argument("--typecode", default="l",
+                        help="array typecode of the integers (default: l)")
+    parser.add_argument("--tmpdir", default=None,
+                        help="directory for temporary run files")
+    options = lib.get_benchmark_options(parser=parser)
+
+    if options.sort:
+        external_merge_sort(options.sort[0], options.sort[1],
+                            options.chunk_size, options.fan_in,
+                            options.buffer_size, options.typecode,
+                            options.tmpdir)
+    else:
+        test_external_sort(options)
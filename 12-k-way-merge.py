@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+#
+## K-way merge:
+#
+# Accepts any number of sorted iterables and lazily yields every
+# element from all of them in sorted order.
+#
+# A k-way merge generalises the two-way merge step of merge sort. A
+# min-heap holds one entry for each input which has not yet been
+# exhausted, containing the next element of that input. The smallest
+# element is always at the root of the heap, so it is yielded, and the
+# root entry is replaced with the following element from the same
+# input and allowed to float down to restore the heap property. When
+# an input is exhausted its entry is removed from the heap, and once
+# only one input remains, the rest of it is yielded directly.
+#
+# Only one element from each input is held at any time, so the inputs
+# may be generators, files, or any other stream which is too large to
+# hold in memory. Each heap entry is ordered by the element's key and
+# then by the position of its input in the argument list, so elements
+# with equal keys are yielded in the order of their inputs, and the
+# merge is stable.
+#
+## Performance:
+#
+# Worst case performance:       O(n log k)
+# Best case performance:        O(n log k)
+# Average case performance:     O(n log k)
+# Memory usage:                 O(k)
+#
+## Advantages:
+#
+# Lazy - output is produced one element at a time, and inputs are
+#  consumed only as needed.
+# Inputs are not modified, unlike the merge() in merge_sort().
+#
+## Disadvantages:
+#
+# The inputs must already be sorted. Unsorted inputs produce unsorted
+#  output, without an error.
+#
+## References:
+#
+# Introduction to Algorithms, exercise 6.5-9, page 166.
+# http://en.wikipedia.org/wiki/K-way_merge_algorithm
+#
+## Code:
+#
+import heapq
+
+import lib
+
+heapsort = lib.import_algorithm("02-heapsort")
+
+# Yield the elements of all of the sorted iterables, in sorted
+# order. If a 'key' function is given, elements are compared by their
+# keys, and each key is computed only once.
+def k_way_merge(*iterables, **kwargs):
+    key = kwargs.pop("key", None)
+    if kwargs:
+        raise TypeError("unexpected keyword argument '%s'"
+                        % list(kwargs)[0])
+
+    # Each heap entry is a list of [key, input index, element, next],
+    # where next() returns the following element of the input. Since the
+    # input indices are unique, elements are never compared directly.
+    heap = []
+    for index, iterable in enumerate(iterables):
+        iterator = iter(iterable)
+        for value in iterator:
+            heap.append([key(value) if key else value, index, value,
+                         iterator.next])
+            break
+
+    heapsort.build_min_heap(heap)
+
+    while len(heap) > 1:
+        entry = heap[0]
+        yield entry[2]
+
+        try:
+            value = entry[3]()
+            entry[0] = key(value) if key else value
+            entry[2] = value
+        except StopIteration:
+            # The input is exhausted, so replace the root with the last
+            # entry in the heap:
+            heap[0] = heap[-1]
+            heap.pop()
+
+        heapsort.min_heapify(heap, len(heap), 0)
+
+    # Only one input remains, so the rest of it can be yielded without
+    # any comparisons:
+    if heap:
+        yield heap[0][2]
+        advance = heap[0][3]
+        while True:
+            try:
+                value = advance()
+            except StopIteration:
+                return
+            yield value
+
+# Time merging k sorted inputs of a total size n, and compare against
+# the standard library's heapq.merge(), and against concatenating and
+# sorting the inputs.
+def test_k_way_merge(options):
+    sizes = options.sizes or [10 ** 4, 10 ** 5, 10 ** 6]
+    report = lib.BenchmarkReport("k_way_merge", options)
+
+    merges = (
+        ("k_way_merge", lambda runs: list(k_way_merge(*runs))),
+        ("heapq.merge", lambda runs: list(heapq.merge(*runs))),
+        ("sorted", lambda runs: sorted(sum(runs, [])))
+    )
+
+    for test_size in sizes:
+        data = lib.get_int_array(test_size, "random", options.seed)
+
+        for k in (2, 16, 256):
+            runs = [sorted(data[i::k]) for i in range(k)]
+
+            for name, merge in merges:
+                times, merged = lib.benchmark(merge, lambda: runs,
+                                              options.repeat, options.warmup)
+
+                # Confirm that the merge worked
+                assert merged == sorted(data)
+
+                report.add(times, size=test_size, k=k, merge=name)
+
+    report.finish()
+
+if __name__ == "__main__":
+    # Check that the merge is stable, and supports key functions:
+    a = [(1, "a"), (2, "a"), (2, "a"), (5, "a")]
+    b = [(0, "b"), (2, "b"), (6, "b")]
+    c = [(2, "c")]
+    merged = list(k_way_merge(a, b, c, key=lambda x: x[0]))
+    assert merged == sorted(a + b + c, key=lambda x: x[0])
+    assert list(k_way_merge([3, 2, 1], [2], key=lambda x: -x)) == [3, 2, 2, 1]
+    assert list(k_way_merge()) == []
+    assert list(k_way_merge([], [1], [])) == [1]
+
+    # Check that the inputs are not materialised:
+    evens = (2 * i for i in xrange(10 ** 12))
+    odds = (2 * i + 1 for i in xrange(10 ** 12))
+    merged = k_way_merge(evens, odds)
+    assert [merged.next() for i in range(10)] == range(10)
+
+    test_k_way_merge(lib.get_benchmark_options())
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+#
+## Priority queues:
+#
+# A priority queue is a data structure for maintaining a set of
+# elements, each with an associated value called a priority (or
+# key). A min-priority queue supports the following operations:
+#
+#   INSERT(S, x, k)        Insert the element x with priority k.
+#   MINIMUM(S)             Return the element with the smallest key.
+#   EXTRACT-MIN(S)         Remove and return the element with the
+#                          smallest key.
+#   DECREASE-KEY(S, x, k)  Decrease the priority of x to k.
+#   DELETE(S, x)           Remove the element x.
+#
+# A max-priority queue provides the same operations for the largest
+# key. This implementation uses the binary min-heap operations from
+# heapsort, with the smallest key at the root. A max-priority queue
+# uses entries which compare in reverse order of priority, so that
+# the largest key is at the root of the same min-heap.
+#
+# The heap stores Entry objects rather than bare priorities. Each entry
+# records its current index within the heap array. The heap is a list
+# whose item assignment also updates the index of the assigned entry,
+# so the index is kept up to date by the unmodified heapsort
+# operations, which move entries only by assigning them. The entry
+# returned by push() acts as a handle which can later be passed to
+# update() or remove(), so these operations can find their element in
+# O(1) rather than searching the heap for it.
+#
+## Performance:
+#
+# INSERT:                       O(log n)
+# MINIMUM:                      O(1)
+# EXTRACT-MIN:                  O(log n)
+# DECREASE-KEY:                 O(log n)
+# DELETE:                       O(log n)
+# Building from n elements:     O(n)
+# Memory usage:                 O(n)
+#
+## Advantages:
+#
+# Changing the priority of, or removing, an arbitrary element is
+#  O(log n), without leaving invalidated entries in the heap (as is
+#  the usual workaround with the heapq module).
+#
+## Disadvantages:
+#
+# Every move within the heap also updates the moved entry's index, and
+#  every comparison calls the entries' __lt__() method, so plain push
+#  and pop are several times slower than heapq.
+# Not stable - elements with equal priorities are not necessarily
+#  returned in the order in which they were inserted.
+#
+## References:
+#
+# Introduction to Algorithms, section 6.5, page 162.
+# http://en.wikipedia.org/wiki/Priority_queue
+#
+## Code:
+#
+import random
+
+import lib
+
+heapsort = lib.import_algorithm("02-heapsort")
+
+# An element of a priority queue. 'index' is the entry's position in
+# the heap array, or None once it has been removed from the queue.
+# Entries are ordered by priority.
+class Entry:
+    def __init__(self, priority, item, index=None):
+        self.priority = priority
+        self.item = item
+        self.index = index
+
+    def __lt__(self, other):
+        return self.priority < other.priority
+
+    def __repr__(self):
+        return "Entry(%r, %r)" % (self.priority, self.item)
+
+# An entry of a max-priority queue, which is ordered by decreasing
+# priority.
+class MaxEntry(Entry):
+    def __lt__(self, other):
+        return other.priority < self.priority
+
+# A heap array of entries, which updates the index of each entry that
+# is assigned into it.
+class EntryHeap(list):
+    def __setitem__(self, i, entry):
+        list.__setitem__(self, i, entry)
+        entry.index = i
+
+class PriorityQueue:
+
+    # Create a queue from an optional sequence of (priority, item)
+    # pairs. The heap is built in O(n), by build_min_heap(). If
+    # 'max_heap' is true, then the entry with the largest priority is
+    # at the front of the queue, otherwise the smallest.
+    def __init__(self, entries=(), max_heap=False):
+        self.max_heap = max_heap
+        self.entry_class = MaxEntry if max_heap else Entry
+
+        self.heap = EntryHeap(self.entry_class(priority, item, index)
+                              for index, (priority, item)
+                              in enumerate(entries))
+        heapsort.build_min_heap(self.heap)
+
+    def __len__(self):
+        return len(self.heap)
+
+    # Move the entry at index i up or down the heap, to wherever it
+    # belongs.
+    def _sift(self, i):
+        entry = self.heap[i]
+        heapsort.min_heap_sift_up(self.heap, i)
+        heapsort.min_heapify(self.heap, len(self.heap), entry.index)
+
+    # Raise an error if the entry is not in this queue.
+    def _check(self, entry):
+        index = entry.index
+        if (index is None or index >= len(self.heap) or
+            self.heap[index] is not entry):
+            raise ValueError("%r is not in the priority queue" % entry)
+
+    # Insert an item with the given priority, and return its entry.
+    def push(self, priority, item=None):
+        entry = self.entry_class(priority, item, len(self.heap))
+        self.heap.append(entry)
+        heapsort.min_heap_sift_up(self.heap, entry.index)
+        return entry
+
+    # Return the entry at the front of the queue, without removing it.
+    def peek(self):
+        if not self.heap:
+            raise IndexError("peek from an empty priority queue")
+        return self.heap[0]
+
+    # Remove and return the entry at the front of the queue.
+    def pop(self):
+        if not self.heap:
+            raise IndexError("pop from an empty priority queue")
+        return self.remove(self.heap[0])
+
+    # Remove an entry from anywhere in the queue, and return it. The
+    # last entry in the heap is moved into its place, and then sifted
+    # up or down as required.
+    def remove(self, entry):
+        self._check(entry)
+        i = entry.index
+        last = self.heap.pop()
+
+        if last is not entry:
+            self.heap[i] = last
+            self._sift(i)
+
+        entry.index = None
+        return entry
+
+    # Change the priority of an entry in the queue.
+    def update(self, entry, priority):
+        self._check(entry)
+        entry.priority = priority
+        self._sift(entry.index)
+
+    # Decrease the priority of an entry. The new priority must not be
+    # greater than the current priority.
+    def decrease_key(self, entry, priority):
+        if priority > entry.priority:
+            raise ValueError("new priority is greater than current priority")
+        self.update(entry, priority)
+
+    # Increase the priority of an entry. The new priority must not be
+    # less than the current priority.
+    def increase_key(self, entry, priority):
+        if priority < entry.priority:
+            raise ValueError("new priority is less than current priority")
+        self.update(entry, priority)
+
+# Build a queue of n entries, then time a sequence of n operations
+# for each workload and report the operations per second. The "mixed"
+# workload is 40% push, 30% pop, 20% update of a random entry and 10%
+# removal of a random entry.
+def test_priority_queue(options):
+    sizes = options.sizes or [10 ** 4, 10 ** 5, 10 ** 6]
+    report = lib.BenchmarkReport("priority_queue", options)
+
+    def build(priorities):
+        return PriorityQueue((p, None) for p in priorities)
+
+    def push(args):
+        queue, priorities = args
+        for p in priorities:
+            queue.push(p)
+        return queue
+
+    def pop(args):
+        queue, priorities = args
+        for p in priorities:
+            queue.pop()
+        return queue
+
+    def mixed(args):
+        queue, operations = args
+        handles = list(queue.heap)
+        for operation, p, r in operations:
+            if operation == "push" or not handles:
+                handles.append(queue.push(p))
+            elif operation == "pop":
+                queue.pop()
+            else:
+                # Pick a random live entry, discarding popped ones:
+                i = int(r * len(handles))
+                entry = handles[i]
+                handles[i] = handles[-1]
+                handles.pop()
+                if entry.index is None:
+                    continue
+                if operation == "update":
+                    queue.update(entry, p)
+                    handles.append(entry)
+                else:
+                    queue.remove(entry)
+        return queue
+
+    for test_size in sizes:
+        priorities = lib.get_int_array(test_size, "random", options.seed)
+        rng = random.Random(options.seed)
+        operations = [(rng.choice(["push"] * 4 + ["pop"] * 3 +
+                                  ["update"] * 2 + ["remove"]),
+                       p, rng.random())
+                      for p in priorities]
+
+        workloads = (
+            ("heapify", build, lambda: priorities),
+            ("push", push, lambda: (PriorityQueue(), priorities)),
+            ("pop", pop, lambda: (build(priorities), priorities)),
+            ("mixed", mixed, lambda: (build(priorities), operations))
+        )
+
+        for name, workload, make_input in workloads:
+            times, queue = lib.benchmark(workload, make_input,
+                                         options.repeat, options.warmup)
+
+            # Confirm that the heap property holds
+            heap = queue.heap
+            for i in range(1, len(heap)):
+                assert heap[(i - 1) >> 1].priority <= heap[i].priority
+                assert heap[i].index == i
+
+            median = lib.get_stats(times)["median"]
+            report.add(times, unit="entries", size=test_size, workload=name,
+                       measures={"ops_per_second": test_size / median})
+
+    report.finish()
+
+if __name__ == "__main__":
+    data = lib.get_random_int_array(1000)
+
+    # Check that both kinds of queue return entries in priority order:
+    queue = PriorityQueue((p, None) for p in data)
+    assert [queue.pop().priority for p in data] == sorted(data)
+    queue = PriorityQueue(max_heap=True)
+    for p in data:
+        queue.push(p)
+    assert queue.peek().priority == max(data)
+    assert [queue.pop().priority for p in data] == sorted(data, reverse=True)
+
+    # Check that updating and removing arbitrary entries works:
+    queue = PriorityQueue()
+    entries = [queue.push(p, i) for i, p in enumerate(data)]
+    for entry in entries[::3]:
+        queue.remove(entry)
+    for entry in entries[1::3]:
+        queue.decrease_key(entry, entry.priority - 1000)
+    for entry in entries[2::3]:
+        queue.increase_key(entry, entry.priority + 1000)
+    expected = sorted([p - 1000 for p in data[1::3]] +
+                      [p + 1000 for p in data[2::3]])
+    assert [queue.pop().priority for p in expected] == expected
+
+    test_priority_queue(lib.get_benchmark_options())
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+#
+## Selection:
+#
+# The selection problem is to find the i'th smallest element of a
+# set of n elements, the "i'th order statistic". A closely related
+# problem is to find the k largest elements (the "top k"). Both can be
+# solved by sorting the whole array in O(n log n), but neither
+# requires the rest of the array to be ordered, so both can be solved
+# faster:
+#
+#   top_k(data, k) keeps a min-heap of the k largest elements seen so
+#   far. Each element is compared against the root of the heap, the
+#   smallest of the current top k, and if it is larger it replaces the
+#   root. Only k elements are held at a time, so the input may be any
+#   iterable, including a stream which is too large to fit into
+#   memory. StreamingTopK provides the same algorithm for elements
+#   which arrive one at a time.
+#
+#   nth_element(data, n) uses quickselect: the array is partitioned
+#   around a pivot as in quicksort, but only the side containing index
+#   n is recursed into. With a good pivot this is O(n), but a bad
+#   sequence of pivots makes it O(n^2). Introselect guards against
+#   this by checking the progress of the partitions: every two
+#   partitions must at least halve the size of the range, and if they
+#   do not, it switches to the "median of medians" pivot, which
+#   guarantees that each partition discards at least 30% of the
+#   elements. The sizes of the ranges partitioned before the switch
+#   form a geometric series, so the worst case is O(n). Partitions are
+#   three-way, so runs of elements equal to the pivot are never
+#   partitioned again.
+#
+## Performance:
+#
+#                   top_k               nth_element
+# Worst case:       O(n log k)          O(n)
+# Best case:        O(n)                O(n)
+# Average case:     O(n log k)          O(n)
+# Memory usage:     O(k)                O(1), in-place
+#
+## Advantages:
+#
+# Much faster than a full sort when only a few elements are needed.
+# top_k() is online - it can process its input as it receives it.
+#
+## Disadvantages:
+#
+# nth_element() reorders the input array.
+# The median of medians pivot has a large constant factor, so it is
+#  only used as a fallback.
+#
+## References:
+#
+# Introduction to Algorithms, chapter 9, page 213.
+# David R. Musser, "Introspective Sorting and Selection Algorithms",
+#  Software: Practice and Experience, 1997.
+# http://en.wikipedia.org/wiki/Introselect
+#
+## Code:
+#
+from itertools import islice
+
+import lib
+
+heapsort = lib.import_algorithm("02-heapsort")
+
+# Return a list of the k largest elements of an iterable, in
+# descending order.
+def top_k(iterable, k):
+    if k <= 0:
+        return []
+
+    iterator = iter(iterable)
+    heap = list(islice(iterator, k))
+    heapsort.build_min_heap(heap)
+
+    # Replace the smallest of the top k whenever a larger element is
+    # found:
+    for x in iterator:
+        if heap[0] < x:
+            heap[0] = x
+            heapsort.min_heapify(heap, k, 0)
+
+    # Sort the heap in descending order. Since it is a min-heap, this
+    # repeatedly moves the smallest element to the end.
+    for i in xrange(len(heap) - 1, 0, -1):
+        heap[0], heap[i] = heap[i], heap[0]
+        heapsort.min_heapify(heap, i, 0)
+
+    return heap
+
+# Maintains the k largest elements of a stream of elements which are
+# added one at a time.
+class StreamingTopK:
+    def __init__(self, k):
+        self.k = k
+        self.heap = []
+
+    def add(self, x):
+        heap = self.heap
+        if len(heap) < self.k:
+            heap.append(x)
+            if len(heap) == self.k:
+                heapsort.build_min_heap(heap)
+        elif self.k and heap[0] < x:
+            heap[0] = x
+            heapsort.min_heapify(heap, self.k, 0)
+
+    # Return the k largest elements added so far, in descending order.
+    def result(self):
+        return sorted(self.heap, reverse=True)
+
+# Partition data[lo..hi] (inclusive) into three ranges: elements less
+# than the pivot, elements equal to the pivot, and elements greater
+# than the pivot. Returns the bounds (lt, gt) of the middle range.
+def partition(data, lo, hi, pivot):
+    lt = lo
+    i = lo
+    gt = hi
+
+    while i <= gt:
+        x = data[i]
+        if x < pivot:
+            data[lt], data[i] = x, data[lt]
+            lt += 1
+            i += 1
+        elif pivot < x:
+            data[i], data[gt] = data[gt], x
+            gt -= 1
+        else:
+            i += 1
+
+    return lt, gt
+
+# Return the "median of medians" of data[lo..hi]: the median of the
+# medians of each group of 5 elements. At least 3/10 of the elements
+# are less than or equal to it, and at least 3/10 are greater than or
+# equal to it.
+def median_of_medians(data, lo, hi):
+    medians = []
+    for i in xrange(lo, hi + 1, 5):
+        group = sorted(data[i:min(i + 5, hi + 1)])
+        medians.append(group[(len(group) - 1) // 2])
+
+    middle = (len(medians) - 1) // 2
+    introselect(medians, 0, len(medians) - 1, middle, quick=False)
+    return medians[middle]
+
+# Rearrange data[lo..hi] so that data[n] is the element which would
+# be there if the range was sorted. While 'quick' is true, partitions
+# use the median of the elements at the quartiles of the range as the
+# pivot. If two of those partitions fail to halve the size of the
+# range, the median of medians is used for the rest. Sampling the
+# quartiles rather than the ends of the range avoids consistently bad
+# pivots for the partially ordered ranges which partitioning sorted
+# input leaves.
+def introselect(data, lo, hi, n, quick=True):
+    size = hi - lo + 1
+    steps = 0
+    while lo < hi:
+        if quick:
+            quarter = (hi - lo) // 4
+            a = data[lo + quarter]
+            b = data[(lo + hi) // 2]
+            c = data[hi - quarter]
+            if a < b:
+                pivot = b if b < c else (c if a < c else a)
+            else:
+                pivot = a if a < c else (c if b < c else b)
+        else:
+            pivot = median_of_medians(data, lo, hi)
+
+        lt, gt = partition(data, lo, hi, pivot)
+
+        if n < lt:
+            hi = lt - 1
+        elif n > gt:
+            lo = gt + 1
+        else:
+            return
+
+        if quick:
+            steps += 1
+            if steps == 2:
+                if hi - lo + 1 > size // 2:
+                    quick = False
+                size = hi - lo + 1
+                steps = 0
+
+# Rearrange data in-place so that data[n] is the element which would
+# be there if the array was sorted, with every element before it less
+# than or equal to it, and every element after it greater than or
+# equal to it. Returns data[n].
+def nth_element(data, n):
+    if not 0 <= n < len(data):
+        raise IndexError("nth_element index out of range")
+
+    introselect(data, 0, len(data) - 1, n)
+    return data[n]
+
+# Rearrange data in-place so that the first k elements are the k
+# smallest, in sorted order. The order of the rest is undefined.
+def partial_sort(data, k):
+    k = min(k, len(data))
+    if k > 0:
+        nth_element(data, k - 1)
+        data[:k] = heapsort.bottom_up_heap_sort(data[:k], 4)
+    return data
+
+# Time finding the k largest elements using each of the selection
+# algorithms, and by sorting the whole array.
+def test_selection(options):
+    sizes = options.sizes or [10 ** 4, 10 ** 5, 10 ** 6]
+    report = lib.BenchmarkReport("selection", options)
+    insertion_sort = lib.import_algorithm("00-insertion-sort")
+    merge_sort = lib.import_algorithm("01-merge-sort")
+
+    # Each of the following accepts a tuple of (data, k), and returns
+    # the k largest elements of data in descending order.
+    def select_top_k(args):
+        data, k = args
+        return top_k(data, k)
+
+    def select_streaming_top_k(args):
+        data, k = args
+        stream = StreamingTopK(k)
+        for x in data:
+            stream.add(x)
+        return stream.result()
+
+    def select_nth_element(args):
+        data, k = args
+        n = len(data) - k
+        nth_element(data, n)
+        return sorted(data[n:], reverse=True)
+
+    def select_by_sorting(sort_algorithm):
+        def select(args):
+            data, k = args
+            return sort_algorithm(data)[:-k - 1:-1]
+        return select
+
+    for test_size in sizes:
+        algorithms = [
+            ("top_k", select_top_k),
+            ("streaming_top_k", select_streaming_top_k),
+            ("nth_element", select_nth_element),
+            ("heap_sort", select_by_sorting(heapsort.heap_sort)),
+            ("merge_sort", select_by_sorting(merge_sort.merge_sort))
+        ]
+        # The quadratic insertion sort is too slow for large inputs:
+        if test_size <= 10 ** 4:
+            algorithms.append(
+                ("insertion_sort",
+                 select_by_sorting(insertion_sort.insertion_sort)))
+
+        for k in (1, 10, 100):
+            if k > test_size:
+                continue
+
+            for distribution in options.distributions:
+                data = lib.get_int_array(test_size, distribution,
+                                         options.seed)
+                expected = sorted(data, reverse=True)[:k]
+
+                for name, algorithm in algorithms:
+                    times, result = lib.benchmark(
+                        algorithm, lambda: (list(data), k),
+                        options.repeat, options.warmup)
+
+                    # Confirm that the selection worked
+                    assert result == expected
+
+                    report.add(times, size=test_size, k=k,
+                               distribution=distribution, algorithm=name)
+
+    report.finish()
+
+if __name__ == "__main__":
+    data = lib.get_random_int_array(1000)
+    expected = sorted(data)
+
+    assert top_k(data, 10) == expected[:-11:-1]
+    assert top_k(data, 2000) == expected[::-1]
+    assert top_k(data, 0) == []
+
+    stream = StreamingTopK(5)
+    for x in data:
+        stream.add(x)
+    assert stream.result() == expected[:-6:-1]
+
+    for n in (0, 1, 499, 998, 999):
+        assert nth_element(list(data), n) == expected[n]
+
+    # Check that the median of medians fallback works on its own:
+    for n in (0, 1, 499, 998, 999):
+        copy = list(data)
+        introselect(copy, 0, len(copy) - 1, n, quick=False)
+        assert copy[n] == expected[n]
+        assert max(copy[:n] or [0]) <= copy[n] <= min(copy[n:])
+
+    assert partial_sort(list(data), 10)[:10] == expected[:10]
+
+    test_selection(lib.get_benchmark_options())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+#
+## Timsort:
+#
+# Accepts an array of objects 'data' {d1,d2,...dn} and returns a
+# permutation of the input sequence such that {d'1<=d'2<=...<=d'n}.
+# The optional 'key' and 'reverse' arguments are as for Python's
+# sorted() (see lib.sort_with_key()).
+#
+# Timsort is a hybrid of merge sort and insertion sort, which is
+# designed to take advantage of the order which already exists in
+# real-world data. Rather than dividing the input into fixed halves,
+# it scans the array from left to right looking for "natural runs":
+# sequences which are already ascending, or strictly descending (which
+# are reversed in place). Short runs are extended to a minimum length
+# of between 32 and 64 elements using binary insertion sort, which is
+# fast for small arrays.
+#
+# Each run is pushed onto a stack, and adjacent runs are merged
+# whenever the lengths of the runs at the top of the stack would break
+# the following invariants, where A, B and C are the lengths of the top
+# three runs:
+#
+#   A > B + C
+#   B > C
+#
+# This keeps the merges balanced, and the stack short. When merging
+# two runs, any elements at the start of the left run which are
+# smaller than the first element of the right run are already in
+# place, as are any elements at the end of the right run which are
+# larger than the last element of the left run, so these are skipped.
+#
+# If one run consistently "wins" during a merge, the merge switches to
+# galloping mode: rather than comparing elements one at a time, it
+# searches the winning run for the position of the next element of the
+# other run (first by exponentially increasing steps, then with a
+# binary search), and moves every element before that position in
+# bulk. The threshold for entering galloping mode adapts to the data.
+#
+## Performance:
+#
+# Worst case performance:       O(n log n)
+# Best case performance:        O(n)
+# Average case performance:     O(n log n)
+# Memory usage:                 O(n)
+#
+## Advantages:
+#
+# Nearly linear time on input which is already sorted, reversed, or
+#  made up of a few long runs.
+# Stable - does not change the relative order of elements with equal
+#  keys.
+# Python's list.sort() and Java's Arrays.sort() for objects use
+#  timsort.
+#
+## Disadvantages:
+#
+# Much more complex than a plain merge sort.
+# No faster than merge sort on random data.
+#
+## References:
+#
+# Tim Peters, "listsort.txt", in the CPython source distribution.
+# http://en.wikipedia.org/wiki/Timsort
+# http://envisage-project.eu/proving-android-java-and-python-sorting-algorithm-is-broken-and-how-to-fix-it/
+#
+## Code:
+#
+from bisect import bisect_left, bisect_right
+
+import lib
+
+insertion_sort = lib.import_algorithm("00-insertion-sort")
+merge_sort = lib.import_algorithm("01-merge-sort")
+
+# The initial number of consecutive wins by one run before a merge
+# switches to galloping mode.
+MIN_GALLOP = 7
+
+# Return the minimum run length for an array of length n. This is n
+# for short arrays, otherwise a number between 32 and 64 chosen so
+# that n / min_run is a power of two, or slightly less than one, which
+# keeps the final merges balanced.
+def compute_min_run(n):
+    r = 0
+    while n >= 64:
+        r |= n & 1
+        n >>= 1
+    return n + r
+
+# Return the length of the natural run starting at data[lo], up to
+# data[hi - 1]. If the run is strictly descending, it is reversed in
+# place. Descending runs must be strict so that reversing them does not
+# change the order of equal elements.
+def count_run(data, lo, hi):
+    run_hi = lo + 1
+    if run_hi == hi:
+        return 1
+
+    if data[run_hi] < data[lo]:
+        while run_hi < hi and data[run_hi] < data[run_hi - 1]:
+            run_hi += 1
+        data[lo:run_hi] = data[lo:run_hi][::-1]
+    else:
+        while run_hi < hi and not data[run_hi] < data[run_hi - 1]:
+            run_hi += 1
+
+    return run_hi - lo
+
+# Return the index of the first element of the sorted range a[lo:hi]
+# which is greater than or equal to key. The search starts at lo,
+# probing at exponentially increasing distances, and then binary
+# searches the last step, so it is O(log d), for a result d elements
+# from lo.
+def gallop_left(key, a, lo, hi):
+    last = 0
+    offset = 1
+    while lo + offset - 1 < hi and a[lo + offset - 1] < key:
+        last = offset
+        offset *= 2
+    return bisect_left(a, key, lo + last, min(lo + offset - 1, hi))
+
+# As gallop_left(), but returns the index of the first element which is
+# greater than key.
+def gallop_right(key, a, lo, hi):
+    last = 0
+    offset = 1
+    while lo + offset - 1 < hi and not key < a[lo + offset - 1]:
+        last = offset
+        offset *= 2
+    return bisect_right(a, key, lo + last, min(lo + offset - 1, hi))
+
+# The state of a sort: the array being sorted, the stack of pending
+# runs, and the current galloping threshold.
+class MergeState:
+    def __init__(self, data):
+        self.data = data
+        self.runs = []
+        self.min_gallop = MIN_GALLOP
+
+    # Merge the adjacent sorted ranges data[lo:mid] and data[mid:hi].
+    def merge(self, lo, mid, hi):
+        data = self.data
+
+        # Skip the elements which are already in place:
+        lo = gallop_right(data[mid], data, lo, mid)
+        if lo == mid:
+            return
+        hi = gallop_left(data[mid - 1], data, mid, hi)
+
+        # Copy the left run aside, and merge it with the right run
+        # into data[lo:hi]. When the left run is exhausted, the rest of
+        # the right run is already in place.
+        left = data[lo:mid]
+        i = 0
+        left_hi = len(left)
+        j = mid
+        k = lo
+        min_gallop = self.min_gallop
+
+        while i < left_hi and j < hi:
+            # Compare elements one at a time, until one run wins
+            # min_gallop times in a row. Elements are taken from the
+            # left run when equal, so the merge is stable.
+            left_wins = 0
+            right_wins = 0
+            while i < left_hi and j < hi:
+                if data[j] < left[i]:
+                    data[k] = data[j]
+                    j += 1
+                    right_wins += 1
+                    left_wins = 0
+                else:
+                    data[k] = left[i]
+                    i += 1
+                    left_wins += 1
+                    right_wins = 0
+                k += 1
+
+                if left_wins >= min_gallop or right_wins >= min_gallop:
+                    break
+
+            # Gallop until both runs win fewer than MIN_GALLOP elements
+            # at a time. Each successful gallop makes it easier to enter
+            # galloping mode again, and each failure makes it harder.
+            while i < left_hi and j < hi:
+                end = gallop_right(data[j], left, i, left_hi)
+                count_left = end - i
+                data[k:k + count_left] = left[i:end]
+                k += count_left
+                i = end
+                if i == left_hi:
+                    break
+
+                end = gallop_left(left[i], data, j, hi)
+                count_right = end - j
+                data[k:k + count_right] = data[j:end]
+                k += count_right
+                j = end
+
+                if count_left < MIN_GALLOP and count_right < MIN_GALLOP:
+                    min_gallop += 1
+                    break
+                min_gallop = max(min_gallop - 1, 1)
+
+        data[k:k + left_hi - i] = left[i:]
+        self.min_gallop = min_gallop
+
+    # Merge the i'th and (i+1)'th runs on the stack.
+    def merge_at(self, i):
+        runs = self.runs
+        lo, mid_length = runs[i]
+        mid = lo + mid_length
+        hi = mid + runs[i + 1][1]
+
+        runs[i] = (lo, hi - lo)
+        del runs[i + 1]
+        self.merge(lo, mid, hi)
+
+    # Merge runs at the top of the stack until the invariants hold.
+    # This checks the top four runs rather than three, which fixes a
+    # bug in the original algorithm where the invariants could fail to
+    # hold deeper in the stack.
+    def merge_collapse(self):
+        runs = self.runs
+        while len(runs) > 1:
+            n = len(runs) - 2
+            if ((n > 0 and runs[n - 1][1] <= runs[n][1] + runs[n + 1][1]) or
+                (n > 1 and runs[n - 2][1] <= runs[n - 1][1] + runs[n][1])):
+                if runs[n - 1][1] < runs[n + 1][1]:
+                    n -= 1
+            elif runs[n][1] > runs[n + 1][1]:
+                break
+            self.merge_at(n)
+
+    # Merge all of the remaining runs on the stack.
+    def merge_force_collapse(self):
+        runs = self.runs
+        while len(runs) > 1:
+            n = len(runs) - 2
+            if n > 0 and runs[n - 1][1] < runs[n + 1][1]:
+                n -= 1
+            self.merge_at(n)
+
+def tim_sort(data, key=None, reverse=False):
+    if key or reverse:
+        return lib.sort_with_key(tim_sort, data, key, reverse)
+
+    n = len(data)
+    if n < 2:
+        return data
+
+    state = MergeState(data)
+    min_run = compute_min_run(n)
+    lo = 0
+
+    while lo < n:
+        length = count_run(data, lo, n)
+
+        # Extend short runs to min_run elements:
+        if length < min_run:
+            forced = min(min_run, n - lo)
+            insertion_sort.binary_insertion_sort(data, lo, lo + forced,
+                                                 lo + length)
+            length = forced
+
+        state.runs.append((lo, length))
+        state.merge_collapse()
+        lo += length
+
+    state.merge_force_collapse()
+    return data
+
+if __name__ == "__main__":
+    # Check that the sort is stable:
+    class Record:
+        def __init__(self, key, index):
+            self.key = key
+            self.index = index
+
+        def __lt__(self, other):
+            return self.key < other.key
+
+    for distribution in lib.DISTRIBUTIONS:
+        keys = lib.get_int_array(5000, distribution)
+        records = [Record(key, i) for i, key in enumerate(keys)]
+        assert ([(r.key, r.index) for r in tim_sort(records)] ==
+                sorted((key, i) for i, key in enumerate(keys)))
+
+    lib.test_array_sort(tim_sort)
+    lib.test_array_sort(merge_sort.merge_sort_bottom_up)
+    lib.test_key_sort(tim_sort)
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+#
+## Counting sort and radix sort:
+#
+# Accepts an array of integers 'data' {d1,d2,...dn} and returns a
+# permutation of the input sequence such that {d'1<=d'2<=...<=d'n}.
+#
+# Comparison sorts cannot do better than O(n log n), but if the keys
+# are integers then they can be sorted without comparing them at all.
+#
+# Counting sort works for integers in a small range of k values. It
+# counts the number of occurrences of each value (a histogram), and
+# then computes the prefix sums of the counts, which gives the first
+# output position for each value. Each element is then written
+# directly into the next position for its value. Since elements are
+# written in input order, counting sort is stable.
+#
+# LSD (least significant digit) radix sort breaks each key into digits
+# of b bits, and sorts the whole array by each digit in turn, starting
+# with the least significant, using a stable counting sort on the 2^b
+# possible digit values. Because each pass is stable, after the pass
+# for digit d the array is sorted by the lowest d digits. Only as many
+# passes as there are digits in the largest key are needed.
+#
+# Both sorts subtract the smallest key from every key before sorting,
+# so they support negative (signed) keys, and the number of radix sort
+# passes depends only on the range of the keys. Both also offer an
+# "argsort" variant, which returns the sorting permutation rather than
+# the sorted keys, so that records can be sorted by integer keys.
+#
+# When NumPy is available, the work is done in NumPy rather than in
+# Python loops. Counting sort computes its histogram with
+# numpy.bincount() and expands it with numpy.repeat(). The argsorts
+# and radix passes compute the histogram of the digits in the same
+# way, and its prefix sums with numpy.cumsum(), which gives the first
+# output position of each digit value. NumPy has no scatter which
+# ranks the elements within each bucket, so instead the elements of
+# each bucket are gathered, in input order, with
+# numpy.flatnonzero(digits == v), and written into the bucket's range
+# of the output. This is one vectorised pass over the digits for each
+# digit value which occurs, so a radix pass is O(n 2^b) elementwise
+# operations rather than O(n + 2^b), but each of them runs in C, and
+# with 8-bit digits a radix sort is within a factor of two of NumPy's
+# own merge sort. Radix passes in which every key has the same digit
+# are detected from the histogram and skipped.
+#
+# For the same reason, counting_argsort() with NumPy makes a single
+# counting pass only if the keys span at most 2^8 values, and
+# otherwise uses a radix sort with 8-bit digits, so that its cost
+# does not grow with the range of the keys.
+#
+## Performance:
+#
+#                   Counting sort       Radix sort
+# Worst case:       O(n + k)            O(n w / b)
+# Best case:        O(n + k)            O(n w / b)
+# Average case:     O(n + k)            O(n w / b)
+# Memory usage:     O(n + k)            O(n + 2^b)
+#
+# Where k is the range of the keys, w is the number of bits in the
+# range of the keys, and b is the number of bits per radix digit. With
+# NumPy, each radix pass is O(n 2^b) elementwise operations, as
+# described above.
+#
+## Advantages:
+#
+# Linear time for integer keys of a fixed width.
+# Stable.
+#
+## Disadvantages:
+#
+# Only sorts integers (or keys which can be mapped to integers).
+# Counting sort needs O(k) memory, so is only suitable for keys in a
+#  small range.
+# Not in-place.
+#
+## References:
+#
+# Introduction to Algorithms, section 8.2, page 194 (counting sort).
+# Introduction to Algorithms, section 8.3, page 197 (radix sort).
+# http://en.wikipedia.org/wiki/Radix_sort
+#
+## Code:
+#
+import copy
+import random
+from array import array
+from itertools import chain, repeat
+
+import lib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+heapsort = lib.import_algorithm("02-heapsort")
+insertion_sort = lib.import_algorithm("00-insertion-sort")
+merge_sort = lib.import_algorithm("01-merge-sort")
+
+# Write a sorted result back into the input array, which may be a
+# list, an array.array or a NumPy array, and return it.
+def store(data, result):
+    if numpy is not None and isinstance(result, numpy.ndarray):
+        if isinstance(data, numpy.ndarray):
+            data[:] = result
+            return data
+        result = result.tolist()
+
+    if isinstance(data, array):
+        data[:] = array(data.typecode, result)
+    else:
+        data[:] = result
+    return data
+
+# The widest supported radix digit. Wider digits would overflow the
+# 16-bit digit arrays used with NumPy, and need a histogram of more
+# than 2^16 counts per pass.
+MAX_DIGIT_BITS = 16
+
+def check_digit_bits(digit_bits):
+    if not 1 <= digit_bits <= MAX_DIGIT_BITS:
+        raise ValueError("digit_bits must be between 1 and %d" %
+                         MAX_DIGIT_BITS)
+
+# Return the keys of a NumPy array as unsigned 64-bit integers, offset
+# so that the smallest key is zero, and the largest offset key. The
+# subtraction wraps around, so this is correct for any signed or
+# unsigned 64-bit keys.
+def numpy_offset_keys(keys):
+    lo = keys.min(keepdims=True).astype(numpy.uint64)
+    offset = keys.astype(numpy.uint64) - lo
+    return offset, int(offset.max())
+
+def counting_sort(data):
+    if not len(data):
+        return data
+
+    if numpy is not None:
+        keys = numpy.asarray(data, dtype=numpy.int64)
+        lo = int(keys.min())
+        counts = numpy.bincount(keys - lo)
+        return store(data, numpy.repeat(numpy.arange(lo, lo + len(counts)),
+                                        counts))
+
+    lo = min(data)
+    counts = [0] * (max(data) - lo + 1)
+    for x in data:
+        counts[x - lo] += 1
+
+    return store(data, list(chain.from_iterable(
+        repeat(value + lo, count) for value, count in enumerate(counts)
+        if count)))
+
+# Return the permutation which stably sorts a NumPy array of digits,
+# given the histogram of the digits, as a NumPy array. The prefix sums
+# of the counts give the first output position of each digit value,
+# and the indices of the elements with each value are written there in
+# input order.
+def numpy_counting_argsort(digits, counts):
+    starts = numpy.cumsum(counts) - counts
+    permutation = numpy.empty(len(digits), dtype=numpy.intp)
+    for value in numpy.flatnonzero(counts):
+        start = starts[value]
+        permutation[start:start + counts[value]] = \
+            numpy.flatnonzero(digits == value)
+    return permutation
+
+# Return the permutation which sorts data, as a list, using a counting
+# sort.
+def counting_argsort(data):
+    n = len(data)
+    if not n:
+        return []
+
+    if numpy is not None:
+        keys, hi = numpy_offset_keys(numpy.asarray(data, dtype=numpy.int64))
+        if hi >= 2 ** 8:
+            return numpy_radix_argsort(keys).tolist()
+        keys = keys.astype(numpy.uint8)
+        return numpy_counting_argsort(keys, numpy.bincount(keys)).tolist()
+
+    lo = min(data)
+    counts = [0] * (max(data) - lo + 1)
+    for x in data:
+        counts[x - lo] += 1
+
+    # The prefix sums of the counts give the first output position of
+    # each key:
+    starts = counts
+    total = 0
+    for value, count in enumerate(counts):
+        starts[value] = total
+        total += count
+
+    permutation = [0] * n
+    for i, x in enumerate(data):
+        position = starts[x - lo]
+        permutation[position] = i
+        starts[x - lo] = position + 1
+
+    return permutation
+
+# Return the permutation which sorts a non-empty NumPy array of keys,
+# as a NumPy array, with a counting sort pass for each digit of the
+# keys. The keys are permuted along with the permutation, so that each
+# pass reads its digits in the current order.
+def numpy_radix_argsort(keys, digit_bits=8):
+    n = len(keys)
+    mask = numpy.uint64((1 << digit_bits) - 1)
+    keys, hi = numpy_offset_keys(keys)
+    dtype = numpy.uint8 if digit_bits <= 8 else numpy.uint16
+    permutation = numpy.arange(n)
+
+    for shift in xrange(0, hi.bit_length(), digit_bits):
+        digits = ((keys >> numpy.uint64(shift)) & mask).astype(dtype)
+        counts = numpy.bincount(digits)
+        if counts.max() == n:
+            continue
+        order = numpy_counting_argsort(digits, counts)
+        permutation = permutation[order]
+        keys = keys[order]
+
+    return permutation
+
+# Return the permutation which sorts data, as a list, using an LSD
+# radix sort with digits of 'digit_bits' bits. Raises ValueError if
+# digit_bits is not between 1 and MAX_DIGIT_BITS.
+def radix_argsort(data, digit_bits=8):
+    check_digit_bits(digit_bits)
+    n = len(data)
+    if not n:
+        return []
+
+    if numpy is not None:
+        return numpy_radix_argsort(numpy.asarray(data), digit_bits).tolist()
+
+    mask = (1 << digit_bits) - 1
+    lo = min(data)
+    keys = [x - lo for x in data]
+    permutation = range(n)
+
+    for shift in xrange(0, max(keys).bit_length(), digit_bits):
+        buckets = [[] for i in xrange(mask + 1)]
+        appends = [bucket.append for bucket in buckets]
+        for i in permutation:
+            appends[(keys[i] >> shift) & mask](i)
+        permutation = list(chain.from_iterable(buckets))
+
+    return permutation
+
+def radix_sort(data, digit_bits=8):
+    check_digit_bits(digit_bits)
+    n = len(data)
+    if not n:
+        return data
+
+    mask = (1 << digit_bits) - 1
+
+    if numpy is not None:
+        keys = numpy.asarray(data)
+        return store(data, keys[numpy_radix_argsort(keys, digit_bits)])
+
+    # Without NumPy, it is faster to distribute the keys themselves
+    # into buckets than to compute the permutation:
+    lo = min(data)
+    keys = [x - lo for x in data] if lo else list(data)
+
+    for shift in xrange(0, max(keys).bit_length(), digit_bits):
+        buckets = [[] for i in xrange(mask + 1)]
+        appends = [bucket.append for bucket in buckets]
+        for x in keys:
+            appends[(x >> shift) & mask](x)
+        keys = list(chain.from_iterable(buckets))
+
+    if lo:
+        keys = [x + lo for x in keys]
+    return store(data, keys)
+
+if __name__ == "__main__":
+    # Check signed 32 and 64 bit keys, and the argsort variants:
+    for bits in (32, 64):
+        rng = random.Random(bits)
+        data = [rng.randrange(-2 ** (bits - 1), 2 ** (bits - 1))
+                for i in xrange(1000)]
+        data += [-2 ** (bits - 1), 2 ** (bits - 1) - 1, 0, -1]
+        assert radix_sort(list(data)) == sorted(data)
+        assert radix_sort(array("l", data)).tolist() == sorted(data)
+        permutation = radix_argsort(data)
+        assert isinstance(permutation, list)
+        assert [data[i] for i in permutation] == sorted(data)
+        for digit_bits in (1, 5, 11, 16):
+            assert radix_sort(list(data), digit_bits) == sorted(data)
+            assert ([data[i] for i in radix_argsort(data, digit_bits)] ==
+                    sorted(data))
+
+    # Digits wider than MAX_DIGIT_BITS are rejected:
+    for digit_bits in (0, 17, 20, 24):
+        for sort in radix_sort, radix_argsort:
+            try:
+                sort(list(data), digit_bits)
+                assert False
+            except ValueError:
+                pass
+
+    data = lib.get_int_array(1000, "duplicates") + [-5, -1]
+    assert counting_sort(list(data)) == sorted(data)
+    assert (counting_argsort(data) ==
+            sorted(range(len(data)), key=lambda i: data[i]))
+
+    options = lib.get_benchmark_options()
+    sizes = options.sizes or [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+
+    # The integer sorts do arithmetic on their keys, so they cannot be
+    # run on the counted keys used by --count-ops, and they perform no
+    # comparisons anyway:
+    integer_options = copy.copy(options)
+    integer_options.count_ops = False
+    lib.test_array_sort(radix_sort, sizes, integer_options)
+    lib.test_array_sort(counting_sort, sizes, integer_options)
+
+    # The comparison sorts are only run on sizes which finish in a
+    # reasonable time:
+    for sort_algorithm, limit in ((merge_sort.merge_sort, 10 ** 6),
+                                  (heapsort.heap_sort, 10 ** 6),
+                                  (insertion_sort.insertion_sort, 10 ** 4)):
+        small_sizes = [size for size in sizes if size <= limit]
+        if small_sizes:
+            lib.test_array_sort(sort_algorithm, small_sizes, options)
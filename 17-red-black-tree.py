@@ -0,0 +1,424 @@
+#!/usr/bin/env python
+#
+## Red-black trees:
+#
+# A red-black tree is a binary search tree with one extra attribute
+# per node: its color, which is either red or black. By constraining
+# the node colors on any simple path from the root to a leaf,
+# red-black trees ensure that no such path is more than twice as long
+# as any other, so that the tree is approximately balanced. A binary
+# search tree is a red-black tree if it satisfies the following
+# red-black properties:
+#
+#   1. Every node is either red or black.
+#   2. The root is black.
+#   3. Every leaf (nil) is black.
+#   4. If a node is red, then both of its children are black.
+#   5. For each node, all simple paths from the node to descendant
+#      leaves contain the same number of black nodes.
+#
+# A red-black tree with n internal nodes has height at most
+# 2 log(n + 1), so SEARCH, MINIMUM, MAXIMUM, SUCCESSOR and PREDECESSOR
+# are O(log n). INSERT and DELETE are the same as for a plain binary
+# search tree, followed by a "fixup" which restores the red-black
+# properties by recoloring nodes and performing at most three
+# rotations. A rotation changes the structure of the tree locally,
+# while preserving the binary-search-tree property:
+#
+#         |                                   |
+#         y      <--- LEFT-ROTATE(x) ---      x
+#        / \                                 / \
+#       x   c    --- RIGHT-ROTATE(y) --->   a   y
+#      / \                                     / \
+#     a   b                                   b   c
+#
+# RedBlackTree extends the BinarySearchTree container of the plain
+# binary search tree, and its nodes have the same left, right, p and
+# key attributes as Node. Leaves are represented by None rather than
+# by a sentinel node.
+#
+## Operations:
+#
+# SEARCH, MINIMUM, MAXIMUM, PREDECESSOR, SUCCESSOR, INSERT, DELETE
+#
+## Performance:
+#
+# Worst case performance:       O(log n)
+# Best case performance:        O(log n)
+# Average case performance:     O(log n)
+# Memory usage:                 O(n)
+#
+## Advantages:
+#
+# Guaranteed O(log n) operations, regardless of the order in which the
+#  keys are inserted. A plain binary search tree built from sorted
+#  keys degenerates into a linked list.
+# Insertion and deletion perform at most a constant number of
+#  rotations.
+#
+## Disadvantages:
+#
+# Insertion and deletion are slower than for a plain binary search
+#  tree built from random keys, due to the cost of the fixups.
+# Much more complex than a plain binary search tree.
+#
+## References:
+#
+# Introduction to Algorithms, chapter 13, page 308.
+# http://en.wikipedia.org/wiki/Red%E2%80%93black_tree
+#
+## Code:
+#
+import argparse
+
+import lib
+
+bst = lib.import_algorithm("04-binary-search-tree")
+
+RED = 0
+BLACK = 1
+
+class RedBlackNode:
+    def __init__(self, key):
+        self.left = None
+        self.right = None
+        self.p = None
+        self.key = key
+        self.color = RED
+
+# The search, minimum, maximum, successor and predecessor operations
+# and the tree walks are those of the plain binary search tree.
+class RedBlackTree(bst.BinarySearchTree):
+    def __init__(self, keys=()):
+        bst.BinarySearchTree.__init__(self, keys, RedBlackNode)
+
+    def _left_rotate(self, x):
+        y = x.right
+        x.right = y.left
+        if y.left:
+            y.left.p = x
+        y.p = x.p
+        if not x.p:
+            self.root = y
+        elif x is x.p.left:
+            x.p.left = y
+        else:
+            x.p.right = y
+        y.left = x
+        x.p = y
+
+    def _right_rotate(self, y):
+        x = y.left
+        y.left = x.right
+        if x.right:
+            x.right.p = y
+        x.p = y.p
+        if not y.p:
+            self.root = x
+        elif y is y.p.right:
+            y.p.right = x
+        else:
+            y.p.left = x
+        x.right = y
+        y.p = x
+
+    # Insert the node z, as for a plain binary search tree, color it
+    # red, and then restore the red-black properties.
+    def insert(self, z):
+        bst.BinarySearchTree.insert(self, z)
+        z.color = RED
+        self._insert_fixup(z)
+        return z
+
+    # A tree built from sorted keys is perfectly balanced: every path
+    # from the root to a leaf has one of two lengths. Coloring the
+    # nodes on the lowest level red, and every other node black, gives
+    # every path the same number of black nodes.
+    def load_sorted(self, keys, n=None):
+        bst.BinarySearchTree.load_sorted(self, keys, n)
+        level = [self.root] if self.root else []
+        while level:
+            children = [child for x in level for child in (x.left, x.right)
+                        if child]
+            lowest = not children and level[0] is not self.root
+            for x in level:
+                x.color = RED if lowest else BLACK
+            level = children
+
+    # The only property which inserting a red node can violate is
+    # property 4, if its parent is also red. Each iteration either
+    # moves the violation two levels up the tree by recoloring, or
+    # fixes it with one or two rotations.
+    def _insert_fixup(self, z):
+        while z.p and z.p.color == RED:
+            p = z.p
+            g = p.p
+            if p is g.left:
+                y = g.right
+                if y and y.color == RED:
+                    p.color = BLACK
+                    y.color = BLACK
+                    g.color = RED
+                    z = g
+                else:
+                    if z is p.right:
+                        z = p
+                        self._left_rotate(z)
+                        p = z.p
+                    p.color = BLACK
+                    g.color = RED
+                    self._right_rotate(g)
+            else:
+                y = g.left
+                if y and y.color == RED:
+                    p.color = BLACK
+                    y.color = BLACK
+                    g.color = RED
+                    z = g
+                else:
+                    if z is p.left:
+                        z = p
+                        self._right_rotate(z)
+                        p = z.p
+                    p.color = BLACK
+                    g.color = RED
+                    self._left_rotate(g)
+
+        self.root.color = BLACK
+
+    # Remove the node z from the tree. If z has two children, it is
+    # replaced by its successor y. If the node removed from (or moved
+    # within) the tree was black, then the red-black properties are
+    # restored from the node x which took its place. Since x may be
+    # None, its parent is tracked separately.
+    def delete(self, z):
+        y = z
+        y_color = y.color
+        if not z.left:
+            x = z.right
+            x_parent = z.p
+            self._transplant(z, z.right)
+        elif not z.right:
+            x = z.left
+            x_parent = z.p
+            self._transplant(z, z.left)
+        else:
+            y = self.minimum(z.right)
+            y_color = y.color
+            x = y.right
+            if y.p is z:
+                x_parent = y
+            else:
+                x_parent = y.p
+                self._transplant(y, y.right)
+                y.right = z.right
+                y.right.p = y
+            self._transplant(z, y)
+            y.left = z.left
+            y.left.p = y
+            y.color = z.color
+
+        z.left = None
+        z.right = None
+        z.p = None
+        self.size -= 1
+
+        if y_color == BLACK:
+            self._delete_fixup(x, x_parent)
+
+    # Removing a black node leaves the paths through x one black node
+    # short. x is treated as having an "extra" black, which is moved up
+    # the tree until it reaches a red node (which is colored black),
+    # or the root, or it can be removed by rotations and recoloring.
+    def _delete_fixup(self, x, x_parent):
+        while x is not self.root and (not x or x.color == BLACK):
+            if x is x_parent.left:
+                w = x_parent.right
+                if w.color == RED:
+                    w.color = BLACK
+                    x_parent.color = RED
+                    self._left_rotate(x_parent)
+                    w = x_parent.right
+                if ((not w.left or w.left.color == BLACK) and
+                    (not w.right or w.right.color == BLACK)):
+                    w.color = RED
+                    x = x_parent
+                    x_parent = x.p
+                else:
+                    if not w.right or w.right.color == BLACK:
+                        w.left.color = BLACK
+                        w.color = RED
+                        self._right_rotate(w)
+                        w = x_parent.right
+                    w.color = x_parent.color
+                    x_parent.color = BLACK
+                    w.right.color = BLACK
+                    self._left_rotate(x_parent)
+                    x = self.root
+            else:
+                w = x_parent.left
+                if w.color == RED:
+                    w.color = BLACK
+                    x_parent.color = RED
+                    self._right_rotate(x_parent)
+                    w = x_parent.left
+                if ((not w.right or w.right.color == BLACK) and
+                    (not w.left or w.left.color == BLACK)):
+                    w.color = RED
+                    x = x_parent
+                    x_parent = x.p
+                else:
+                    if not w.left or w.left.color == BLACK:
+                        w.right.color = BLACK
+                        w.color = RED
+                        self._left_rotate(w)
+                        w = x_parent.left
+                    w.color = x_parent.color
+                    x_parent.color = BLACK
+                    w.left.color = BLACK
+                    self._right_rotate(x_parent)
+                    x = self.root
+
+        if x:
+            x.color = BLACK
+
+# Return the height of the tree rooted at node, i.e. the number of
+# nodes on the longest path from the root to a leaf. This works for
+# both plain binary search tree nodes and red-black nodes.
+def tree_height(node):
+    height = 0
+    level = [node] if node else []
+    while level:
+        height += 1
+        level = [child for x in level for child in (x.left, x.right)
+                 if child]
+    return height
+
+# Check that a red-black tree satisfies the binary-search-tree and
+# red-black properties, and return its black height.
+def check_red_black_tree(tree):
+    def check(x, lo, hi):
+        if not x:
+            return 1
+        assert lo is None or not x.key < lo
+        assert hi is None or not hi < x.key
+        assert not x.left or x.left.p is x
+        assert not x.right or x.right.p is x
+        if x.color == RED:
+            assert not x.left or x.left.color == BLACK
+            assert not x.right or x.right.color == BLACK
+        left = check(x.left, lo, x.key)
+        right = check(x.right, x.key, hi)
+        assert left == right
+        return left + (x.color == BLACK)
+
+    assert not tree.root or tree.root.color == BLACK
+    assert not tree.root or tree.root.p is None
+    return check(tree.root, None, None)
+
+# Time loading keys into a red-black tree and into a plain binary
+# search tree, and then searching for every key. Loading n ordered
+# keys into the plain tree is O(n^2), so for distributions other than
+# "random" it is only run on inputs of up to 'plain_limit' keys.
+def test_red_black_tree(options, plain_limit=10 ** 3):
+    sizes = options.sizes or [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+    report = lib.BenchmarkReport("red_black_tree", options)
+
+    def search(args):
+        tree, keys = args
+        for key in keys:
+            assert tree.search(key).key == key
+        return tree
+
+    trees = (
+        ("red_black", RedBlackTree),
+        ("plain", bst.BinarySearchTree)
+    )
+
+    def bulk_load(args):
+        tree_class, keys = args
+        tree = tree_class()
+        tree.load_sorted(keys)
+        return tree
+
+    for distribution in options.distributions:
+        for test_size in sizes:
+            keys = lib.get_int_array(test_size, distribution, options.seed)
+
+            for name, tree_class in trees:
+                if (name == "plain" and distribution != "random" and
+                    test_size > plain_limit):
+                    continue
+
+                times, tree = lib.benchmark(tree_class, lambda: keys,
+                                            options.repeat, options.warmup)
+                measures = {"height": tree_height(tree.root)}
+                report.add(times, unit="keys", size=test_size,
+                           distribution=distribution, tree=name,
+                           operation="insert", measures=measures)
+
+                times, tree = lib.benchmark(search, lambda: (tree, keys),
+                                            options.repeat, options.warmup)
+                report.add(times, unit="keys", size=test_size,
+                           distribution=distribution, tree=name,
+                           operation="search", measures=measures)
+
+            # Bulk loading is O(n) for every distribution, since the
+            # keys are sorted first:
+            sorted_keys = sorted(keys)
+            for name, tree_class in trees:
+                times, tree = lib.benchmark(
+                    bulk_load, lambda: (tree_class, sorted_keys),
+                    options.repeat, options.warmup)
+                measures = {"height": tree_height(tree.root)}
+                report.add(times, unit="keys", size=test_size,
+                           distribution=distribution, tree=name,
+                           operation="bulk_load", measures=measures)
+
+    report.finish()
+
+if __name__ == "__main__":
+    data = lib.get_random_int_array(1000)
+
+    # Check that the red-black properties hold after every insertion
+    # and deletion:
+    tree = RedBlackTree()
+    nodes = [tree.insert(RedBlackNode(key)) for key in data]
+    check_red_black_tree(tree)
+    assert list(tree) == sorted(data)
+    assert tree.minimum().key == min(data)
+    assert tree.maximum().key == max(data)
+    for node in nodes[::2]:
+        successor = tree.successor(node)
+        assert not successor or tree.predecessor(successor) is node
+
+    for node in nodes[::2]:
+        tree.delete(node)
+        check_red_black_tree(tree)
+    assert list(tree) == sorted(data[1::2])
+    assert tree.search(-1) is None
+
+    # A tree built from sorted keys is still balanced:
+    tree = RedBlackTree()
+    for key in xrange(2 ** 12):
+        tree.insert(RedBlackNode(key))
+    assert tree_height(tree.root) <= 2 * 13
+
+    # Bulk loaded and merged trees are valid red-black trees:
+    for n in xrange(41):
+        tree = RedBlackTree()
+        tree.load_sorted(xrange(n))
+        check_red_black_tree(tree)
+        assert list(tree) == range(n)
+    tree.merge(RedBlackTree(data))
+    check_red_black_tree(tree)
+    assert list(tree) == sorted(range(40) + data)
+    for key in data:
+        tree.delete(tree.search(key))
+    check_red_black_tree(tree)
+    tree.insert(RedBlackNode(-1))
+    check_red_black_tree(tree)
+
+    parser = argparse.ArgumentParser(description="Red-black trees")
+    parser.set_defaults(distributions=["sorted", "reversed", "random"])
+    test_red_black_tree(lib.get_benchmark_options(parser=parser))
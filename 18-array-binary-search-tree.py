@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+#
+## Array-backed binary search trees:
+#
+# A binary search tree in which the nodes are not objects, but
+# integer indices into four parallel arrays: 'key', 'left', 'right'
+# and 'p'. For a node x, key[x] is its key, and left[x], right[x] and
+# p[x] are the indices of its left child, right child and parent, or
+# NIL if there is no such node. This is the "multiple-array
+# representation of objects" from Introduction to Algorithms, also
+# known as a struct of arrays.
+#
+# The arrays are typed arrays (array.array), which store their values
+# inline rather than as references to Python objects. With 8-byte
+# keys and 4-byte indices, each node requires 20 bytes, compared to
+# well over 100 bytes for a Node object with a __dict__, or around 80
+# bytes for a SlotsNode (including the key object in both cases).
+#
+# When a node is deleted, its index is pushed onto a free list, which
+# is threaded through the 'left' array of the free nodes, and the next
+# insertion reuses it rather than growing the arrays. The operations
+# are the same as for BinarySearchTree, except that they accept and
+# return node indices rather than node objects.
+#
+## Performance:
+#
+# Worst case performance:       O(n)
+# Best case performance:        O(log n)
+# Average case performance:     O(log n)
+# Memory usage:                 O(n), 20 bytes per key
+#
+## Advantages:
+#
+# Several times less memory per key than a tree of objects.
+# No per-node object allocation, and the node storage does not need to
+#  be traced by the garbage collector.
+#
+## Disadvantages:
+#
+# Keys are limited to the types which an array.array can hold, i.e.
+#  integers or floats. Satellite data must be stored in a separate
+#  array, indexed by node.
+# Each access to a key or link converts it from its typed
+#  representation to a Python object, so operations are slightly
+#  slower than for a tree of objects.
+# Like any plain binary search tree, it becomes a linked list if the
+#  keys are inserted in order.
+#
+## References:
+#
+# Introduction to Algorithms, section 10.3, page 241.
+# http://en.wikipedia.org/wiki/AoS_and_SoA
+#
+## Code:
+#
+import argparse
+import sys
+from array import array
+
+import lib
+
+bst = lib.import_algorithm("04-binary-search-tree")
+
+# The index of a nonexistent node.
+NIL = -1
+
+# The parent index of a node on the free list.
+FREED = -2
+
+class ArrayBinarySearchTree:
+    # Create a tree from an optional sequence of keys. Keys are stored
+    # in an array of the given typecode, and node indices in arrays of
+    # C ints, which limits the tree to 2^31 - 1 nodes.
+    def __init__(self, keys=(), typecode="l"):
+        self.key = array(typecode)
+        self.left = array("i")
+        self.right = array("i")
+        self.p = array("i")
+        self.root = NIL
+        self.free = NIL
+        self.size = 0
+
+        for key in keys:
+            self.insert(key)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        key = self.key
+        x = self.minimum()
+        while x != NIL:
+            yield key[x]
+            x = self.successor(x)
+
+    # Return the index of a node for the given key, reusing a node from
+    # the free list if there is one.
+    def _allocate(self, key):
+        x = self.free
+        if x == NIL:
+            x = len(self.key)
+            self.key.append(key)
+            self.left.append(NIL)
+            self.right.append(NIL)
+            self.p.append(NIL)
+        else:
+            self.free = self.left[x]
+            self.key[x] = key
+            self.left[x] = NIL
+            self.right[x] = NIL
+            self.p[x] = NIL
+        return x
+
+    # Raise ValueError if x is not the index of a node in the tree,
+    # e.g. if it is NIL, or a node which has been deleted. Since -1 is
+    # a valid list index, NIL would otherwise refer to the last node of
+    # the arrays.
+    def _check(self, x):
+        if not 0 <= x < len(self.key) or self.p[x] == FREED:
+            raise ValueError("invalid node index %d" % x)
+
+    # Push the node x onto the free list, and mark it as freed.
+    def _release(self, x):
+        self.left[x] = self.free
+        self.right[x] = NIL
+        self.p[x] = FREED
+        self.free = x
+
+    # Return the node with the given key, or NIL if there is no such
+    # node.
+    def search(self, k):
+        key = self.key
+        left = self.left
+        right = self.right
+        x = self.root
+        while x != NIL and k != key[x]:
+            if k < key[x]:
+                x = left[x]
+            else:
+                x = right[x]
+        return x
+
+    # Return the node with the smallest key in the subtree rooted at
+    # x, or in the whole tree if x is not given.
+    def minimum(self, x=NIL):
+        left = self.left
+        if x == NIL:
+            x = self.root
+        while x != NIL and left[x] != NIL:
+            x = left[x]
+        return x
+
+    # Return the node with the largest key in the subtree rooted at x,
+    # or in the whole tree if x is not given.
+    def maximum(self, x=NIL):
+        right = self.right
+        if x == NIL:
+            x = self.root
+        while x != NIL and right[x] != NIL:
+            x = right[x]
+        return x
+
+    # Return the node with the smallest key greater than x's, or NIL
+    # if x has the largest key.
+    def successor(self, x):
+        self._check(x)
+        if self.right[x] != NIL:
+            return self.minimum(self.right[x])
+        p = self.p
+        right = self.right
+        y = p[x]
+        while y != NIL and x == right[y]:
+            x = y
+            y = p[y]
+        return y
+
+    # Return the node with the largest key smaller than x's, or NIL if
+    # x has the smallest key.
+    def predecessor(self, x):
+        self._check(x)
+        if self.left[x] != NIL:
+            return self.maximum(self.left[x])
+        p = self.p
+        left = self.left
+        y = p[x]
+        while y != NIL and x == left[y]:
+            x = y
+            y = p[y]
+        return y
+
+    # Insert a key, and return its node.
+    def insert(self, k):
+        key = self.key
+        left = self.left
+        right = self.right
+        y = NIL
+        x = self.root
+        while x != NIL:
+            y = x
+            if k < key[x]:
+                x = left[x]
+            else:
+                x = right[x]
+
+        z = self._allocate(k)
+        self.p[z] = y
+        if y == NIL:
+            self.root = z
+        elif k < key[y]:
+            left[y] = z
+        else:
+            right[y] = z
+
+        self.size += 1
+        return z
+
+    # Replace the subtree rooted at u with the subtree rooted at v.
+    def _transplant(self, u, v):
+        p = self.p
+        if p[u] == NIL:
+            self.root = v
+        elif u == self.left[p[u]]:
+            self.left[p[u]] = v
+        else:
+            self.right[p[u]] = v
+
+        if v != NIL:
+            p[v] = p[u]
+
+    # Remove the node z from the tree, and add it to the free list.
+    # Raises ValueError if z is NIL or has already been deleted.
+    def delete(self, z):
+        self._check(z)
+        left = self.left
+        right = self.right
+        p = self.p
+        if left[z] == NIL:
+            self._transplant(z, right[z])
+        elif right[z] == NIL:
+            self._transplant(z, left[z])
+        else:
+            y = self.minimum(right[z])
+            if p[y] != z:
+                self._transplant(y, right[y])
+                right[y] = right[z]
+                p[right[y]] = y
+            self._transplant(z, y)
+            left[y] = left[z]
+            p[left[y]] = y
+
+        self._release(z)
+        self.size -= 1
+
+# Return the number of bytes used by a tree, either an
+# ArrayBinarySearchTree, or a BinarySearchTree of node objects. The
+# size of a node object includes its key object and instance
+# dictionary, if it has one.
+def get_tree_bytes(tree):
+    if isinstance(tree, ArrayBinarySearchTree):
+        return sum(sys.getsizeof(a)
+                   for a in (tree.key, tree.left, tree.right, tree.p))
+
+    total = 0
+    for node in bst.tree_walk(tree.root):
+        total += sys.getsizeof(node) + sys.getsizeof(node.key)
+        if hasattr(node, "__dict__"):
+            total += sys.getsizeof(node.__dict__)
+    return total
+
+# Time inserting, searching for and deleting keys, using a tree of
+# Node objects, of SlotsNode objects, and an array-backed tree, and
+# report the operations per second and the memory used per key.
+def test_array_binary_search_tree(options):
+    sizes = options.sizes or [10 ** 4, 10 ** 5, 10 ** 6]
+    report = lib.BenchmarkReport("array_binary_search_tree", options)
+
+    backends = (
+        ("node", lambda keys: bst.BinarySearchTree(keys, bst.Node)),
+        ("slots_node",
+         lambda keys: bst.BinarySearchTree(keys, bst.SlotsNode)),
+        ("array", ArrayBinarySearchTree)
+    )
+
+    def search(args):
+        tree, keys = args
+        for key in keys:
+            assert tree.search(key) not in (None, NIL)
+        return tree
+
+    # Delete the nodes of the keys, and then re-insert them:
+    def delete_insert(args):
+        tree, keys = args
+        for key in keys:
+            tree.delete(tree.search(key))
+        for key in keys:
+            tree.insert(key if isinstance(tree, ArrayBinarySearchTree)
+                        else tree.node_class(key))
+        return tree
+
+    for distribution in options.distributions:
+        for test_size in sizes:
+            keys = lib.get_int_array(test_size, distribution, options.seed)
+            half = keys[::2]
+
+            for name, build in backends:
+                times, tree = lib.benchmark(build, lambda: keys,
+                                            options.repeat, options.warmup)
+                assert list(tree) == sorted(keys)
+                median = lib.get_stats(times)["median"]
+                measures = {
+                    "ops_per_second": test_size / median,
+                    "bytes_per_key": get_tree_bytes(tree) / float(test_size)
+                }
+                report.add(times, unit="keys", size=test_size,
+                           distribution=distribution, backend=name,
+                           operation="insert", measures=measures)
+
+                times, tree = lib.benchmark(search, lambda: (tree, keys),
+                                            options.repeat, options.warmup)
+                median = lib.get_stats(times)["median"]
+                report.add(times, unit="keys", size=test_size,
+                           distribution=distribution, backend=name,
+                           operation="search",
+                           measures={"ops_per_second": test_size / median})
+
+                times, tree = lib.benchmark(delete_insert,
+                                            lambda: (tree, half),
+                                            options.repeat, options.warmup)
+                assert list(tree) == sorted(keys)
+                median = lib.get_stats(times)["median"]
+                report.add(times, unit="keys", size=test_size,
+                           distribution=distribution, backend=name,
+                           operation="delete_insert",
+                           measures={"ops_per_second":
+                                     2 * len(half) / median})
+
+    report.finish()
+
+if __name__ == "__main__":
+    data = lib.get_random_int_array(1000)
+    tree = ArrayBinarySearchTree(data)
+    assert len(tree) == len(data)
+    assert list(tree) == sorted(data)
+    assert tree.key[tree.minimum()] == min(data)
+    assert tree.key[tree.maximum()] == max(data)
+    assert tree.search(-1) == NIL
+
+    x = tree.minimum()
+    while tree.successor(x) != NIL:
+        assert tree.predecessor(tree.successor(x)) == x
+        x = tree.successor(x)
+
+    # Deleted nodes are reused, so the arrays do not grow:
+    for key in data[::2]:
+        tree.delete(tree.search(key))
+    assert list(tree) == sorted(data[1::2])
+    for key in data[::2]:
+        tree.insert(key)
+    assert list(tree) == sorted(data)
+    assert len(tree.key) == len(data)
+
+    # NIL is not a node, even though it is a valid list index:
+    for method in tree.delete, tree.successor, tree.predecessor:
+        try:
+            method(tree.search(-1))
+            assert False
+        except ValueError:
+            pass
+    assert list(tree) == sorted(data)
+
+    # A deleted node cannot be deleted again:
+    tree = ArrayBinarySearchTree([5, 3, 8])
+    b = tree.search(3)
+    tree.delete(b)
+    try:
+        tree.delete(b)
+        assert False
+    except ValueError:
+        pass
+    assert list(tree) == [5, 8] and len(tree) == 2
+    tree.insert(1)
+    tree.insert(9)
+    assert list(tree) == [1, 5, 8, 9]
+
+    parser = argparse.ArgumentParser(description="Array-backed BST")
+    parser.set_defaults(distributions=["random"])
+    test_array_binary_search_tree(lib.get_benchmark_options(parser=parser))
@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+#
+## Order-statistic trees:
+#
+# An order-statistic tree is a red-black tree in which each node x has
+# one extra attribute, x.size, the number of nodes in the subtree
+# rooted at x (including x itself):
+#
+#   x.size = x.left.size + x.right.size + 1
+#
+# where the size of a nil leaf is 0. With the subtree sizes, the
+# position of a key in the sorted order of the tree can be found by
+# following a single path from the root, rather than walking every
+# node before it:
+#
+#   SELECT(i) returns the node with the i'th smallest key (counting
+#   from 0). If the left subtree of x has i nodes, then x is the node,
+#   otherwise the search continues into the left subtree, or into the
+#   right subtree with i reduced by the size of the left subtree + 1.
+#
+#   RANK(k) returns the number of keys less than k. Each time the
+#   search for k moves to a right child, the node and its left subtree
+#   are counted.
+#
+#   COUNT_RANGE(a, b) returns the number of keys in the range [a, b),
+#   which is RANK(b) - RANK(a).
+#
+#   RANGE(a, b) generates the keys in the range [a, b) in order, by
+#   searching for the first key which is not less than a, and then
+#   following the successors until a key which is not less than b.
+#
+# The sizes are maintained by every operation which changes the shape
+# of the tree. An insertion increments the size of each node on the
+# path from the root to the new node, and a deletion decrements the
+# size of each node above the node which is removed from the tree. A
+# rotation changes the sizes of the two rotated nodes only, which are
+# recomputed from their children.
+#
+## Operations:
+#
+# SEARCH, MINIMUM, MAXIMUM, PREDECESSOR, SUCCESSOR, INSERT, DELETE,
+# SELECT, RANK, COUNT_RANGE, RANGE
+#
+## Performance:
+#
+#                   Worst case
+# SELECT:           O(log n)
+# RANK:             O(log n)
+# COUNT_RANGE:      O(log n)
+# RANGE:            O(log n + m), for m keys in the range
+# Memory usage:     O(n)
+#
+## Advantages:
+#
+# Order statistics and range counts in O(log n), rather than the O(n)
+#  of walking the tree.
+# Insertion and deletion remain O(log n).
+#
+## Disadvantages:
+#
+# One more attribute per node, which must be updated on every
+#  insertion, deletion and rotation.
+#
+## References:
+#
+# Introduction to Algorithms, section 14.1, page 339.
+# http://en.wikipedia.org/wiki/Order_statistic_tree
+#
+## Code:
+#
+import argparse
+from itertools import islice
+
+import lib
+
+rbt = lib.import_algorithm("17-red-black-tree")
+
+class OrderStatisticNode(rbt.RedBlackNode):
+    def __init__(self, key):
+        rbt.RedBlackNode.__init__(self, key)
+        self.size = 1
+
+def size(x):
+    return x.size if x else 0
+
+class OrderStatisticTree(rbt.RedBlackTree):
+    def __init__(self, keys=()):
+        rbt.bst.BinarySearchTree.__init__(self, keys, OrderStatisticNode)
+
+    def _left_rotate(self, x):
+        rbt.RedBlackTree._left_rotate(self, x)
+        x.p.size = x.size
+        x.size = size(x.left) + size(x.right) + 1
+
+    def _right_rotate(self, y):
+        rbt.RedBlackTree._right_rotate(self, y)
+        y.p.size = y.size
+        y.size = size(y.left) + size(y.right) + 1
+
+    # Insert the node z, and return it. The new node will be a leaf
+    # at the end of the search path for its key, so every node on
+    # that path gains one descendant. The sizes are updated before
+    # the red-black fixup, whose rotations depend on them.
+    def insert(self, z):
+        z.size = 1
+        x = self.root
+        while x:
+            x.size += 1
+            if z.key < x.key:
+                x = x.left
+            else:
+                x = x.right
+        return rbt.RedBlackTree.insert(self, z)
+
+    # Remove the node z from the tree. The node which leaves its
+    # position in the tree is z if it has fewer than two children,
+    # otherwise its successor y, which takes the place (and the size)
+    # of z. Each node above that position loses one descendant.
+    def delete(self, z):
+        if z.left and z.right:
+            y = self.minimum(z.right)
+        else:
+            y = z
+
+        x = y.p
+        while x:
+            x.size -= 1
+            x = x.p
+        if y is not z:
+            y.size = z.size
+
+        rbt.RedBlackTree.delete(self, z)
+        z.size = 1
+
+    def load_sorted(self, keys, n=None):
+        rbt.RedBlackTree.load_sorted(self, keys, n)
+        for x in rbt.bst.tree_walk(self.root, rbt.bst.POSTORDER):
+            x.size = size(x.left) + size(x.right) + 1
+
+    # Return the node with the i'th smallest key, counting from 0.
+    # Negative indices count from the largest key, as for lists.
+    def select(self, i):
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError("select index out of range")
+
+        x = self.root
+        while True:
+            r = size(x.left)
+            if i == r:
+                return x
+            elif i < r:
+                x = x.left
+            else:
+                i -= r + 1
+                x = x.right
+
+    # Return the number of keys in the tree which are less than k.
+    def rank(self, k):
+        r = 0
+        x = self.root
+        while x:
+            if x.key < k:
+                r += size(x.left) + 1
+                x = x.right
+            else:
+                x = x.left
+        return r
+
+    # Return the number of keys in the range [a, b).
+    def count_range(self, a, b):
+        return max(self.rank(b) - self.rank(a), 0)
+
+    # Return the node with the smallest key which is not less than k,
+    # or None if there is no such node.
+    def lower_bound(self, k):
+        y = None
+        x = self.root
+        while x:
+            if x.key < k:
+                x = x.right
+            else:
+                y = x
+                x = x.left
+        return y
+
+    # Generate the keys in the range [a, b), in order. The tree must
+    # not be modified while the range is being generated.
+    def range(self, a, b):
+        x = self.lower_bound(a)
+        while x and x.key < b:
+            yield x.key
+            x = self.successor(x)
+
+# Check that the size of every node in the tree is correct, as well as
+# the red-black properties.
+def check_order_statistic_tree(tree):
+    rbt.check_red_black_tree(tree)
+    for x in rbt.bst.tree_walk(tree.root, rbt.bst.POSTORDER):
+        assert x.size == size(x.left) + size(x.right) + 1
+    assert size(tree.root) == len(tree)
+
+# Time finding order statistics and range counts using the subtree
+# sizes, and by walking the tree in order, as a tree without sizes
+# would have to.
+def test_order_statistic_tree(options, walk_limit=10 ** 4):
+    sizes = options.sizes or [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+    report = lib.BenchmarkReport("order_statistic_tree", options)
+
+    queries = 100
+
+    def select(args):
+        tree, indices, ranges = args
+        return [tree.select(i).key for i in indices]
+
+    def walk_select(args):
+        tree, indices, ranges = args
+        return [next(islice(tree, i, None)) for i in indices]
+
+    def count_range(args):
+        tree, indices, ranges = args
+        return [tree.count_range(a, b) for a, b in ranges]
+
+    def walk_count_range(args):
+        tree, indices, ranges = args
+        return [sum(1 for key in tree if a <= key < b) for a, b in ranges]
+
+    operations = (
+        ("select", select, walk_select),
+        ("count_range", count_range, walk_count_range)
+    )
+
+    for distribution in options.distributions:
+        for test_size in sizes:
+            keys = lib.get_int_array(test_size, distribution, options.seed)
+            tree = OrderStatisticTree()
+            tree.load_sorted(sorted(keys))
+
+            bounds = lib.get_random_int_array(2 * queries, options.seed)
+            indices = [x % test_size for x in bounds[:queries]]
+            ranges = [tuple(sorted((bounds[i], bounds[i + queries])))
+                      for i in xrange(queries)]
+            args = (tree, indices, ranges)
+
+            for operation, fast, walk in operations:
+                times, expected = lib.benchmark(
+                    fast, lambda: args, options.repeat, options.warmup)
+                report.add(times, unit="keys", size=test_size,
+                           distribution=distribution, method="size",
+                           operation=operation)
+
+                if test_size > walk_limit:
+                    continue
+
+                times, result = lib.benchmark(
+                    walk, lambda: args, options.repeat, options.warmup)
+                assert result == expected
+                report.add(times, unit="keys", size=test_size,
+                           distribution=distribution, method="walk",
+                           operation=operation)
+
+    report.finish()
+
+if __name__ == "__main__":
+    data = lib.get_random_int_array(1000)
+    data += data[:100]
+    expected = sorted(data)
+
+    tree = OrderStatisticTree()
+    nodes = [tree.insert(OrderStatisticNode(key)) for key in data]
+    check_order_statistic_tree(tree)
+
+    for i in xrange(len(data)):
+        assert tree.select(i).key == expected[i]
+    assert tree.select(-1).key == expected[-1]
+    for k in expected[::7] + [-1, 10 ** 9]:
+        assert tree.rank(k) == sum(1 for x in data if x < k)
+
+    for a, b in zip(expected[::13], expected[::-11]) + [(5, 5), (9, 1)]:
+        keys = [x for x in expected if a <= x < b]
+        assert list(tree.range(a, b)) == keys
+        assert tree.count_range(a, b) == len(keys)
+
+    for node in nodes[::2]:
+        tree.delete(node)
+        check_order_statistic_tree(tree)
+    remaining = sorted(data[1::2])
+    assert [tree.select(i).key for i in xrange(len(tree))] == remaining
+
+    tree.merge(OrderStatisticTree(data))
+    check_order_statistic_tree(tree)
+    assert tree.select(len(tree) // 2).key == \
+        sorted(remaining + data)[len(tree) // 2]
+
+    try:
+        tree.select(len(tree))
+        assert False
+    except IndexError:
+        pass
+
+    parser = argparse.ArgumentParser(description="Order-statistic trees")
+    parser.set_defaults(distributions=["random"])
+    test_order_statistic_tree(lib.get_benchmark_options(parser=parser))
@@ -0,0 +1,904 @@
+#!/usr/bin/env python
+#
+## B+ trees:
+#
+# A B+ tree is a balanced search tree in which each node holds many
+# keys, rather than the one key of a binary search tree node. Every
+# leaf is at the same depth. The leaves hold the keys, in order, with
+# a value for each key, and each leaf has a pointer to the next leaf,
+# so that a range of keys can be read without returning to the
+# internal nodes. An internal node with c children holds c - 1
+# separator keys, where keys[i] is no greater than any key in
+# children[i + 1], and greater than every key in children[i].
+#
+# The maximum number of children of a node (and keys of a leaf) is the
+# order, or fan-out, of the tree. Every node except the root is kept
+# at least half full: when an insertion overfills a node, it is split
+# into two, adding a key and a child to its parent, and when a deletion
+# leaves a node less than half full, it takes a key from a sibling, or
+# is merged with it. A tree with fan-out b holding n keys has height
+# O(log_b n), so with a fan-out in the hundreds, even a very large tree
+# is only a few levels deep.
+#
+# Since each node is a contiguous block of keys, a search touches only
+# a few blocks of memory, rather than a node per level of a binary
+# tree. This is why B+ trees are used to index data on disk: each node
+# is stored as a fixed-size page of a file, and a search reads one
+# page per level. BPlusTree is an in-memory tree, and write_b_tree()
+# writes a sorted sequence of integer keys and values to a file of
+# pages, which MappedBPlusTree opens with mmap. Only the pages touched
+# by a query are read from disk, so the file may be much larger than
+# the available memory.
+#
+# The page file format is little-endian. Page 0 is the header:
+#
+#   magic       4 bytes, "BPT1"
+#   page_size   uint32
+#   root        int64, the page number of the root node
+#   first_leaf  int64, the page number of the leftmost leaf
+#   size        int64, the number of keys
+#
+# Every other page is a node:
+#
+#   type        uint8, 0 for a leaf, 1 for an internal node
+#   (padding)   3 bytes
+#   count       uint32, the number of keys
+#   next        int64, the page number of the next leaf, or 0
+#   keys        int64 * capacity
+#   values      int64 * capacity, the values of a leaf, or the page
+#               numbers of the children of an internal node
+#
+# where capacity = (page_size - 16) / 16, which is 255 for 4 KB pages.
+#
+## Operations:
+#
+# SEARCH, MINIMUM, MAXIMUM, SUCCESSOR, INSERT, DELETE, RANGE
+#
+## Performance:
+#
+# Worst case performance:       O(log n)
+# Best case performance:        O(log n)
+# Average case performance:     O(log n)
+# Range of m keys:              O(log n + m)
+# Memory usage:                 O(n)
+#
+## Advantages:
+#
+# Guaranteed O(log n) operations, with a height of only log_b n.
+# Range scans follow the leaf pointers, rather than walking the tree.
+# Nodes are contiguous, so they can be stored as pages on disk.
+#
+## Disadvantages:
+#
+# Inserting into or deleting from a node moves up to b keys.
+# More complex than a binary search tree.
+#
+## References:
+#
+# Introduction to Algorithms, chapter 18, page 484.
+# Douglas Comer, "The Ubiquitous B-Tree", ACM Computing Surveys, 1979.
+# http://en.wikipedia.org/wiki/B%2B_tree
+#
+## Code:
+#
+import argparse
+import ctypes
+import mmap
+import os
+import random
+import shutil
+import struct
+import tempfile
+from bisect import bisect_left, bisect_right
+from multiprocessing import Pipe, Process
+
+import lib
+
+bst = lib.import_algorithm("04-binary-search-tree")
+
+class Leaf:
+    def __init__(self):
+        self.keys = []
+        self.values = []
+        self.next = None
+
+class Internal:
+    def __init__(self):
+        self.keys = []
+        self.children = []
+
+class BPlusTree:
+    # Create a tree in which each node has at most 'order' children,
+    # and each leaf at most 'order' keys.
+    def __init__(self, order=64):
+        if order < 3:
+            raise ValueError("B+ tree order must be at least 3")
+        self.order = order
+        self.root = Leaf()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for key, value in self.range():
+            yield key
+
+    # Return the leaf which contains, or would contain, the key.
+    def _find_leaf(self, key):
+        node = self.root
+        while isinstance(node, Internal):
+            node = node.children[bisect_right(node.keys, key)]
+        return node
+
+    # Return the value for the key, or None if there is no such key.
+    def search(self, key):
+        leaf = self._find_leaf(key)
+        i = bisect_left(leaf.keys, key)
+        if i < len(leaf.keys) and leaf.keys[i] == key:
+            return leaf.values[i]
+        return None
+
+    def __contains__(self, key):
+        leaf = self._find_leaf(key)
+        i = bisect_left(leaf.keys, key)
+        return i < len(leaf.keys) and leaf.keys[i] == key
+
+    def minimum(self):
+        node = self.root
+        while isinstance(node, Internal):
+            node = node.children[0]
+        return node.keys[0] if node.keys else None
+
+    def maximum(self):
+        node = self.root
+        while isinstance(node, Internal):
+            node = node.children[-1]
+        return node.keys[-1] if node.keys else None
+
+    # Return the smallest key greater than the given key, or None if
+    # there is no such key.
+    def successor(self, key):
+        leaf = self._find_leaf(key)
+        i = bisect_right(leaf.keys, key)
+        if i == len(leaf.keys):
+            leaf = leaf.next
+            i = 0
+        return leaf.keys[i] if leaf else None
+
+    # Generate the (key, value) pairs with keys in the range [a, b),
+    # in order. If a or b is None, the range is unbounded on that side.
+    # The tree must not be modified while the range is generated.
+    def range(self, a=None, b=None):
+        if a is None:
+            leaf = self.root
+            while isinstance(leaf, Internal):
+                leaf = leaf.children[0]
+            i = 0
+        else:
+            leaf = self._find_leaf(a)
+            i = bisect_left(leaf.keys, a)
+
+        while leaf:
+            keys = leaf.keys
+            values = leaf.values
+            while i < len(keys):
+                if b is not None and not keys[i] < b:
+                    return
+                yield keys[i], values[i]
+                i += 1
+            leaf = leaf.next
+            i = 0
+
+    # Insert a key and value, replacing the value if the key is already
+    # in the tree.
+    def insert(self, key, value=None):
+        split = self._insert(self.root, key, value)
+        if split:
+            root = Internal()
+            root.keys = [split[0]]
+            root.children = [self.root, split[1]]
+            self.root = root
+
+    # Insert into the subtree rooted at node. If the node overflows, it
+    # is split, and the separator key and new right node are returned.
+    def _insert(self, node, key, value):
+        if isinstance(node, Leaf):
+            keys = node.keys
+            i = bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                node.values[i] = value
+                return None
+            keys.insert(i, key)
+            node.values.insert(i, value)
+            self.size += 1
+
+            if len(keys) <= self.order:
+                return None
+            mid = len(keys) // 2
+            right = Leaf()
+            right.keys = keys[mid:]
+            right.values = node.values[mid:]
+            del keys[mid:]
+            del node.values[mid:]
+            right.next = node.next
+            node.next = right
+            return right.keys[0], right
+
+        i = bisect_right(node.keys, key)
+        split = self._insert(node.children[i], key, value)
+        if not split:
+            return None
+
+        node.keys.insert(i, split[0])
+        node.children.insert(i + 1, split[1])
+        if len(node.children) <= self.order:
+            return None
+        mid = len(node.keys) // 2
+        right = Internal()
+        up = node.keys[mid]
+        right.keys = node.keys[mid + 1:]
+        right.children = node.children[mid + 1:]
+        del node.keys[mid:]
+        del node.children[mid + 1:]
+        return up, right
+
+    # Remove a key from the tree. Raises KeyError if there is no such
+    # key.
+    def delete(self, key):
+        self._delete(self.root, key)
+        if isinstance(self.root, Internal) and len(self.root.children) == 1:
+            self.root = self.root.children[0]
+
+    def _delete(self, node, key):
+        if isinstance(node, Leaf):
+            i = bisect_left(node.keys, key)
+            if i == len(node.keys) or node.keys[i] != key:
+                raise KeyError(key)
+            del node.keys[i]
+            del node.values[i]
+            self.size -= 1
+            return
+
+        # Separator keys are left in place when the key they were
+        # copied from is deleted, since they still divide the children
+        # correctly.
+        i = bisect_right(node.keys, key)
+        child = node.children[i]
+        self._delete(child, key)
+        if isinstance(child, Leaf):
+            if len(child.keys) < self.order // 2:
+                self._rebalance_leaf(node, i)
+        elif len(child.children) < (self.order + 1) // 2:
+            self._rebalance_internal(node, i)
+
+    # Refill the leaf parent.children[i] by taking a key from a sibling
+    # which has one to spare, or merge it with a sibling.
+    def _rebalance_leaf(self, parent, i):
+        child = parent.children[i]
+        left = parent.children[i - 1] if i > 0 else None
+        right = parent.children[i + 1] if i + 1 < len(parent.children) \
+            else None
+        minimum = self.order // 2
+
+        if left and len(left.keys) > minimum:
+            child.keys.insert(0, left.keys.pop())
+            child.values.insert(0, left.values.pop())
+            parent.keys[i - 1] = child.keys[0]
+        elif right and len(right.keys) > minimum:
+            child.keys.append(right.keys.pop(0))
+            child.values.append(right.values.pop(0))
+            parent.keys[i] = right.keys[0]
+        else:
+            if left:
+                i -= 1
+                child, right = left, child
+            child.keys += right.keys
+            child.values += right.values
+            child.next = right.next
+            del parent.keys[i]
+            del parent.children[i + 1]
+
+    # As _rebalance_leaf(), for an internal node. The separator key in
+    # the parent moves down into the node, and is replaced by a key
+    # from the sibling.
+    def _rebalance_internal(self, parent, i):
+        child = parent.children[i]
+        left = parent.children[i - 1] if i > 0 else None
+        right = parent.children[i + 1] if i + 1 < len(parent.children) \
+            else None
+        minimum = (self.order + 1) // 2
+
+        if left and len(left.children) > minimum:
+            child.keys.insert(0, parent.keys[i - 1])
+            child.children.insert(0, left.children.pop())
+            parent.keys[i - 1] = left.keys.pop()
+        elif right and len(right.children) > minimum:
+            child.keys.append(parent.keys[i])
+            child.children.append(right.children.pop(0))
+            parent.keys[i] = right.keys.pop(0)
+        else:
+            if left:
+                i -= 1
+                child, right = left, child
+            child.keys.append(parent.keys[i])
+            child.keys += right.keys
+            child.children += right.children
+            del parent.keys[i]
+            del parent.children[i + 1]
+
+    # Replace the contents of the tree with (key, value) pairs in
+    # sorted order of unique keys, in O(n). The leaves are built first,
+    # and then each level of internal nodes, from the first key and
+    # node of each node of the level below.
+    def load_sorted(self, items):
+        items = list(items)
+        for (a, x), (b, y) in zip(items, items[1:]):
+            if not a < b:
+                raise ValueError("load_sorted() keys are not sorted")
+
+        level = []
+        last = None
+        for group in split_evenly(items, self.order):
+            leaf = Leaf()
+            leaf.keys = [key for key, value in group]
+            leaf.values = [value for key, value in group]
+            if last:
+                last.next = leaf
+            last = leaf
+            level.append((leaf.keys[0], leaf))
+
+        while len(level) > 1:
+            parents = []
+            for group in split_evenly(level, self.order):
+                node = Internal()
+                node.keys = [key for key, child in group[1:]]
+                node.children = [child for key, child in group]
+                parents.append((group[0][0], node))
+            level = parents
+
+        self.root = level[0][1] if level else Leaf()
+        self.size = len(items)
+
+# Split a list into the fewest groups of at most 'order' elements, with
+# sizes that differ by at most one. Every group of a list of more than
+# 'order' elements is then at least half full, as a B+ tree node must
+# be.
+def split_evenly(elements, order):
+    groups = -(-len(elements) // order)
+    start = 0
+    for i in xrange(groups):
+        end = start + (len(elements) - start) // (groups - i)
+        yield elements[start:end]
+        start = end
+
+## Page files:
+
+MAGIC = "BPT1"
+PAGE_SIZE = 4096
+HEADER = struct.Struct("<4sIqqq")
+NODE_HEADER = struct.Struct("<BxxxIq")
+LEAF, INTERNAL = 0, 1
+
+# Return the number of keys which fit into a page.
+def page_capacity(page_size):
+    return (page_size - NODE_HEADER.size) // 16
+
+# Write a B+ tree of (key, value) pairs of 64-bit integers to a page
+# file, from an iterable of pairs in sorted order of unique keys. The
+# pairs are read once, and each page is written as soon as it is full,
+# so only the first key and page number of each node is held in
+# memory. The fan-out of the tree is the capacity of a page.
+def write_b_tree(path, items, page_size=PAGE_SIZE):
+    capacity = page_capacity(page_size)
+    if capacity < 3:
+        raise ValueError("page size too small")
+
+    def write_node(outfile, kind, keys, values, next_page):
+        page = bytearray(page_size)
+        NODE_HEADER.pack_into(page, 0, kind, len(keys), next_page)
+        struct.pack_into("<%dq" % len(keys), page, NODE_HEADER.size, *keys)
+        struct.pack_into("<%dq" % len(values), page,
+                         NODE_HEADER.size + 8 * capacity, *values)
+        outfile.write(page)
+
+    with open(path, "wb") as outfile:
+        outfile.write(bytearray(page_size))
+        pages = 1
+        size = 0
+
+        # Write the leaves. Each leaf is written once the next one is
+        # started, so that it can point to it.
+        level = []
+        keys = []
+        values = []
+        for key, value in items:
+            if keys and not keys[-1] < key:
+                raise ValueError("write_b_tree() keys are not sorted")
+            if len(keys) == capacity:
+                write_node(outfile, LEAF, keys, values, pages + 1)
+                level.append((keys[0], pages))
+                pages += 1
+                keys = []
+                values = []
+            keys.append(key)
+            values.append(value)
+            size += 1
+        write_node(outfile, LEAF, keys, values, 0)
+        level.append((keys[0] if keys else 0, pages))
+        pages += 1
+
+        # Write each level of internal nodes:
+        while len(level) > 1:
+            parents = []
+            for i in xrange(0, len(level), capacity):
+                group = level[i:i + capacity]
+                write_node(outfile, INTERNAL,
+                           [key for key, page in group[1:]],
+                           [page for key, page in group], 0)
+                parents.append((group[0][0], pages))
+                pages += 1
+            level = parents
+
+        outfile.seek(0)
+        outfile.write(HEADER.pack(MAGIC, page_size, level[0][1], 1, size))
+
+# A read-only B+ tree stored in a page file, which is mapped into
+# memory rather than read. Searches decode only the keys which they
+# compare, directly from the mapped pages.
+class MappedBPlusTree:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.page_size, self.root, self.first_leaf, self.size = \
+            HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("%s is not a B+ tree page file" % path)
+        self.capacity = page_capacity(self.page_size)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for key, value in self.range():
+            yield key
+
+    # Return the first index of a key in a page which is greater than
+    # (or, if 'right' is false, not less than) the given key.
+    def _bisect(self, offset, count, key, right):
+        data = self.map
+        keys = offset + NODE_HEADER.size
+        lo = 0
+        hi = count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            x = struct.unpack_from("<q", data, keys + 8 * mid)[0]
+            if x < key or (right and x == key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _key(self, offset, i):
+        return struct.unpack_from("<q", self.map,
+                                  offset + NODE_HEADER.size + 8 * i)[0]
+
+    # Return the i'th value of a leaf, or child of an internal node.
+    def _value(self, offset, i):
+        return self._key(offset, self.capacity + i)
+
+    # Return the byte offset of the leaf which contains, or would
+    # contain, the key.
+    def _find_leaf(self, key):
+        offset = self.root * self.page_size
+        while True:
+            kind, count, next_page = NODE_HEADER.unpack_from(self.map, offset)
+            if kind == LEAF:
+                return offset, count
+            i = self._bisect(offset, count, key, True)
+            offset = self._value(offset, i) * self.page_size
+
+    # Return the value for the key, or None if there is no such key.
+    def search(self, key):
+        offset, count = self._find_leaf(key)
+        i = self._bisect(offset, count, key, False)
+        if i < count and self._key(offset, i) == key:
+            return self._value(offset, i)
+        return None
+
+    def __contains__(self, key):
+        return self.search(key) is not None
+
+    # Return the smallest key greater than the given key, or None if
+    # there is no such key.
+    def successor(self, key):
+        for x, value in self.range(key):
+            if key < x:
+                return x
+        return None
+
+    # Generate the (key, value) pairs with keys in the range [a, b), as
+    # for BPlusTree.range(). Each leaf is decoded in one call.
+    def range(self, a=None, b=None):
+        if a is None:
+            offset = self.first_leaf * self.page_size
+            count = NODE_HEADER.unpack_from(self.map, offset)[1]
+            i = 0
+        else:
+            offset, count = self._find_leaf(a)
+            i = self._bisect(offset, count, a, False)
+
+        while True:
+            next_page = NODE_HEADER.unpack_from(self.map, offset)[2]
+            start = offset + NODE_HEADER.size
+            keys = struct.unpack_from("<%dq" % count, self.map, start)
+            values = struct.unpack_from("<%dq" % count, self.map,
+                                        start + 8 * self.capacity)
+            while i < count:
+                if b is not None and not keys[i] < b:
+                    return
+                yield keys[i], values[i]
+                i += 1
+            if not next_page:
+                return
+            offset = next_page * self.page_size
+            count = NODE_HEADER.unpack_from(self.map, offset)[1]
+            i = 0
+
+    def minimum(self):
+        for key in self:
+            return key
+        return None
+
+    def maximum(self):
+        offset = self.root * self.page_size
+        while True:
+            kind, count, next_page = NODE_HEADER.unpack_from(self.map, offset)
+            if kind == LEAF:
+                return self._key(offset, count - 1) if count else None
+            offset = self._value(offset, count) * self.page_size
+
+# Check that a BPlusTree is ordered and balanced, that every node
+# except the root is at least half full, and that the leaf pointers
+# link every leaf in order.
+def check_b_plus_tree(tree):
+    leaves = []
+
+    def check(node, lo, hi, depth):
+        assert all(a < b for a, b in zip(node.keys, node.keys[1:]))
+        assert lo is None or not node.keys or not node.keys[0] < lo
+        assert hi is None or not node.keys or node.keys[-1] < hi
+        if isinstance(node, Leaf):
+            assert len(node.keys) == len(node.values)
+            assert len(node.keys) <= tree.order
+            if node is not tree.root:
+                assert len(node.keys) >= tree.order // 2
+            leaves.append(node)
+            return depth
+
+        assert len(node.children) == len(node.keys) + 1
+        assert len(node.children) <= tree.order
+        if node is not tree.root:
+            assert len(node.children) >= (tree.order + 1) // 2
+        bounds = [lo] + node.keys + [hi]
+        depths = set(check(child, bounds[i], bounds[i + 1], depth + 1)
+                     for i, child in enumerate(node.children))
+        assert len(depths) == 1
+        return depths.pop()
+
+    check(tree.root, None, None, 0)
+    for leaf, next_leaf in zip(leaves, leaves[1:] + [None]):
+        assert leaf.next is next_leaf
+    assert sum(len(leaf.keys) for leaf in leaves) == len(tree)
+
+# The value of the Linux POSIX_FADV_DONTNEED advice for
+# posix_fadvise(), which Python 2's os module does not provide.
+POSIX_FADV_DONTNEED = 4
+
+# Write a file's dirty pages to disk, and then evict all of its pages
+# from the page cache, so that the next reads of the file come from
+# the disk. Raises OSError if this is not supported.
+def evict_file(path):
+    try:
+        fadvise = ctypes.CDLL(None).posix_fadvise
+    except AttributeError:
+        raise OSError("posix_fadvise() is not available")
+    fadvise.argtypes = (ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong,
+                        ctypes.c_int)
+
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        error = fadvise(fd, 0, 0, POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    if error:
+        raise OSError(error, os.strerror(error))
+
+# Return the result of calling func() in a child process. The result
+# must be picklable.
+def run_in_child(func):
+    def child(connection):
+        connection.send(func())
+        connection.close()
+
+    parent_connection, child_connection = Pipe()
+    process = Process(target=child, args=(child_connection,))
+    process.start()
+    child_connection.close()
+    try:
+        result = parent_connection.recv()
+    except EOFError:
+        raise RuntimeError("child process exited without a result")
+    finally:
+        parent_connection.close()
+        process.join()
+    return result
+
+# The key of the i'th item of the benchmark's page file. Keys are
+# spaced 10 apart on average, and can be computed from their index, so
+# a file larger than memory can be written, and queried, without ever
+# holding its keys in memory.
+def benchmark_key(i, seed=0):
+    return 10 * i + lib.element_hash(i ^ seed) % 10
+
+# Generate the first n (key, index) items of the benchmark's page file.
+def benchmark_items(n, seed=0):
+    for i in xrange(n):
+        yield benchmark_key(i, seed), i
+
+# Time point lookups and range scans of a BPlusTree, of a page file
+# opened with MappedBPlusTree, and of a balanced binary search tree.
+#
+# The page file is written from a generator, so its size is limited
+# only by the disk. The in-memory trees are built from a sample of at
+# most options.sample of its first items, and are queried within the
+# sample, while the mapped tree is queried over the whole file. The
+# mapped tree is timed "warm", just after the file has been written,
+# when it is likely to be in the page cache, and with --cold, also
+# "cold": in a fresh process, with the file evicted from the page
+# cache before each run, so that every page touched is read from disk.
+def test_b_plus_tree(options):
+    sizes = options.sizes or [10 ** 4, 10 ** 5, 10 ** 6]
+    report = lib.BenchmarkReport("b_plus_tree", options)
+    workdir = tempfile.mkdtemp(prefix="b-plus-tree-", dir=options.tmpdir)
+    seed = options.seed
+    queries = 1000
+    span = 100
+
+    class ValueNode(bst.SlotsNode):
+        __slots__ = ("value",)
+
+    def bst_search(tree, key):
+        node = tree.search(key)
+        return node.value if node else None
+
+    # A range scan of a binary search tree is a search for the first
+    # key in the range, followed by successors:
+    def bst_range(tree, a, b):
+        y = None
+        x = tree.root
+        while x:
+            if x.key < a:
+                x = x.right
+            else:
+                y = x
+                x = x.left
+        while y and y.key < b:
+            yield y.key, y.value
+            y = tree.successor(y)
+
+    def lookup(args):
+        tree, search, tree_range, keys, ranges = args
+        return [search(tree, key) for key in keys]
+
+    def scan(args):
+        tree, search, tree_range, keys, ranges = args
+        return [sum(value for key, value in tree_range(tree, a, b))
+                for a, b in ranges]
+
+    operations = (("lookup", lookup), ("scan", scan))
+
+    # Return lookups and ranges of keys among the first n items, and
+    # the expected results of each operation. Each range holds around
+    # 'span' keys.
+    def get_queries(rng, n):
+        indices = [rng.randrange(n) for i in xrange(queries)]
+        lookups = [benchmark_key(i, seed) for i in indices]
+        ranges = [(a, a + 10 * span) for a in
+                  (rng.randrange(10 * n) for i in xrange(queries))]
+        sums = [sum(i for i in xrange(max(a // 10 - 1, 0),
+                                      min(b // 10 + 1, n))
+                    if a <= benchmark_key(i, seed) < b)
+                for a, b in ranges]
+        return lookups, ranges, {"lookup": indices, "scan": sums}
+
+    def add(times, size, name, cache, operation):
+        median = lib.get_stats(times)["median"]
+        report.add(times, unit="keys", size=size, tree=name, cache=cache,
+                   operation=operation,
+                   measures={"ops_per_second": queries / median})
+
+    # Time the in-memory trees, built from the first n items:
+    def time_memory_trees(n, queries):
+        lookups, ranges, expected = queries
+        items = list(benchmark_items(n, seed))
+        tree = BPlusTree(options.order)
+        tree.load_sorted(items)
+        binary_tree = bst.BinarySearchTree(node_class=ValueNode)
+        binary_tree.load_sorted([key for key, value in items])
+        for node, (key, value) in zip(bst.tree_walk(binary_tree.root),
+                                      items):
+            node.value = value
+        del items
+
+        for name, tree, search, tree_range in (
+                ("b_plus_tree", tree, BPlusTree.search, BPlusTree.range),
+                ("binary_search_tree", binary_tree, bst_search,
+                 bst_range)):
+            for operation, func in operations:
+                times, result = lib.benchmark(
+                    func, lambda: (tree, search, tree_range, lookups,
+                                   ranges),
+                    options.repeat, options.warmup)
+                assert result == expected[operation]
+                add(times, n, name, "memory", operation)
+
+    # Time the mapped tree in a fresh process, evicting the file and
+    # opening a new mapping of it before each run:
+    def time_cold(path, func, lookups, ranges):
+        opened = []
+
+        def make_input():
+            for mapped in opened:
+                mapped.close()
+            evict_file(path)
+            opened[:] = [MappedBPlusTree(path)]
+            return (opened[0], MappedBPlusTree.search,
+                    MappedBPlusTree.range, lookups, ranges)
+
+        def run():
+            times, result = lib.benchmark(func, make_input,
+                                          options.repeat, 0)
+            opened[0].close()
+            return times, result
+
+        return run_in_child(run)
+
+    # The sizes of the samples which the in-memory trees have been
+    # timed with. Every size larger than the sample shares it.
+    sampled = set()
+
+    try:
+        for test_size in sizes:
+            rng = random.Random(seed)
+            sample_size = min(test_size, options.sample)
+            path = os.path.join(workdir, "tree")
+            write_b_tree(path, benchmark_items(test_size, seed),
+                         options.page_size)
+
+            memory_queries = get_queries(rng, sample_size)
+            if sample_size not in sampled:
+                sampled.add(sample_size)
+                time_memory_trees(sample_size, memory_queries)
+
+            lookups, ranges, expected = get_queries(rng, test_size)
+            with MappedBPlusTree(path) as mapped:
+                for operation, func in operations:
+                    times, result = lib.benchmark(
+                        func, lambda: (mapped, MappedBPlusTree.search,
+                                       MappedBPlusTree.range, lookups,
+                                       ranges),
+                        options.repeat, options.warmup)
+                    assert result == expected[operation]
+                    add(times, test_size, "mapped_b_plus_tree", "warm",
+                        operation)
+
+            if options.cold:
+                for operation, func in operations:
+                    times, result = time_cold(path, func, lookups, ranges)
+                    assert result == expected[operation]
+                    add(times, test_size, "mapped_b_plus_tree", "cold",
+                        operation)
+    finally:
+        shutil.rmtree(workdir)
+
+    report.finish()
+
+if __name__ == "__main__":
+    # Check the tree against a dictionary, with orders small enough
+    # that nodes are frequently split, refilled and merged:
+    for order in (3, 4, 5, 16):
+        rng = random.Random(order)
+        tree = BPlusTree(order)
+        expected = {}
+        for i in xrange(3000):
+            key = rng.randrange(500)
+            if key in expected and rng.random() < 0.6:
+                tree.delete(key)
+                del expected[key]
+            else:
+                tree.insert(key, i)
+                expected[key] = i
+            if i % 100 == 0:
+                check_b_plus_tree(tree)
+        check_b_plus_tree(tree)
+        keys = sorted(expected)
+        assert list(tree) == keys
+        assert all(tree.search(key) == expected[key] for key in keys)
+        assert tree.search(-1) is None and -1 not in tree
+        assert tree.minimum() == keys[0] and tree.maximum() == keys[-1]
+        assert tree.successor(keys[5]) == keys[6]
+        assert tree.successor(keys[-1]) is None
+        assert [key for key, value in tree.range(100, 200)] == \
+            [key for key in keys if 100 <= key < 200]
+        for key in keys:
+            tree.delete(key)
+        check_b_plus_tree(tree)
+        assert len(tree) == 0 and list(tree) == []
+
+    try:
+        tree.delete(1)
+        assert False
+    except KeyError:
+        pass
+
+    # Check bulk loading, and the page file format:
+    items = [(key, -key) for key in xrange(0, 30000, 3)]
+    for order in (3, 4, 8, 64):
+        for n in (0, 1, order, order + 1, len(items)):
+            tree = BPlusTree(order)
+            tree.load_sorted(items[:n])
+            check_b_plus_tree(tree)
+            assert list(tree.range()) == items[:n]
+        for key, value in items[::2]:
+            tree.delete(key)
+        check_b_plus_tree(tree)
+        assert list(tree.range()) == items[1::2]
+    workdir = tempfile.mkdtemp(prefix="b-plus-tree-")
+    try:
+        path = os.path.join(workdir, "tree")
+        for page_size in (64, 256, PAGE_SIZE):
+            write_b_tree(path, items, page_size)
+            with MappedBPlusTree(path) as mapped:
+                assert len(mapped) == len(items)
+                assert list(mapped.range()) == items
+                assert mapped.search(300) == -300
+                assert mapped.search(301) is None
+                assert list(mapped.range(10, 20)) == [(12, -12), (15, -15),
+                                                      (18, -18)]
+                assert mapped.successor(299) == 300
+                assert mapped.minimum() == 0 and mapped.maximum() == 29997
+        write_b_tree(path, [])
+        with MappedBPlusTree(path) as mapped:
+            assert list(mapped) == [] and mapped.search(0) is None
+    finally:
+        shutil.rmtree(workdir)
+
+    parser = argparse.ArgumentParser(description="B+ trees")
+    parser.add_argument("--order", type=int, default=64,
+                        help="maximum children per in-memory node "
+                        "(default: 64)")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE,
+                        help="bytes per page of the page file "
+                        "(default: %d)" % PAGE_SIZE)
+    parser.add_argument("--tmpdir", default=None,
+                        help="directory for the page file")
+    parser.add_argument("--sample", type=int, default=10 ** 6,
+                        help="maximum keys in the in-memory trees "
+                        "(default: 10^6)")
+    parser.add_argument("--cold", action="store_true",
+                        help="also time the page file after evicting it "
+                        "from the page cache, using posix_fadvise()")
+    test_b_plus_tree(lib.get_benchmark_options(parser=parser))
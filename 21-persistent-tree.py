@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+#
+## Persistent binary search trees:
+#
+# A persistent data structure preserves its previous versions when it
+# is modified. A binary search tree can be made persistent by "path
+# copying": nodes are never modified once they are created, so an
+# insertion or deletion instead copies every node on the path from the
+# root to the node which changes, and returns the root of the copy.
+# Every subtree off the path is shared between the old and new
+# versions:
+#
+#        old root             new root
+#           |                    |
+#           8                    8'
+#          / \                  / \
+#         4   12     --->      4   12'
+#            /  \                 /  \
+#           10  14               10   14'
+#                                       \
+#                                        15
+#
+# Inserting 15 copies 8, 12 and 14, and shares the subtrees rooted at
+# 4 and 10. Only O(log n) nodes are created by each update, if the
+# tree is balanced, so the tree is kept balanced using the AVL rules:
+# the heights of the two subtrees of every node differ by at most one,
+# and each copied node on the path is rebalanced with one or two
+# rotations (which also create new nodes rather than changing links).
+#
+# Since a version of the tree can never change, any number of threads
+# can read it without locking. The PersistentTree container holds a
+# reference to the current root. A writer builds the next version
+# beside the current one, and publishes it by replacing the reference,
+# which is a single atomic assignment. Readers which fetched the old
+# root before the update continue to see a consistent snapshot of it,
+# and the old nodes are freed once no reader refers to them. Only
+# writers need to be serialized with respect to each other.
+#
+## Operations:
+#
+# SEARCH, MINIMUM, MAXIMUM, INSERT, DELETE
+#
+## Performance:
+#
+# Worst case performance:       O(log n)
+# Best case performance:        O(log n)
+# Average case performance:     O(log n)
+# Memory usage:                 O(n), plus O(log n) per retained
+#                                version
+#
+## Advantages:
+#
+# Readers never wait for writers, or for each other.
+# Any version of the tree can be kept as a snapshot in O(1).
+#
+## Disadvantages:
+#
+# Each update allocates O(log n) nodes, rather than O(1).
+# Nodes have no parent pointers, so SUCCESSOR and PREDECESSOR need a
+#  search from the root.
+#
+## References:
+#
+# Driscoll, Sarnak, Sleator and Tarjan, "Making Data Structures
+#  Persistent", Journal of Computer and System Sciences, 1989.
+# http://en.wikipedia.org/wiki/Persistent_data_structure
+# http://en.wikipedia.org/wiki/AVL_tree
+#
+## Code:
+#
+import argparse
+import random
+import threading
+
+import lib
+
+rbt = lib.import_algorithm("17-red-black-tree")
+
+# An immutable tree node. The attributes must not be changed once the
+# node has been created.
+class PersistentNode(object):
+    __slots__ = ("key", "value", "left", "right", "height")
+
+    def __init__(self, key, value, left, right):
+        self.key = key
+        self.value = value
+        self.left = left
+        self.right = right
+        self.height = max(height(left), height(right)) + 1
+
+def height(node):
+    return node.height if node else 0
+
+# Return a new node for the key and value with the given subtrees,
+# which are themselves balanced, rotating it if the heights of the
+# subtrees differ by two.
+def balance(key, value, left, right):
+    if height(left) > height(right) + 1:
+        if height(left.left) >= height(left.right):
+            return PersistentNode(left.key, left.value, left.left,
+                                  PersistentNode(key, value, left.right,
+                                                 right))
+        x = left.right
+        return PersistentNode(x.key, x.value,
+                              PersistentNode(left.key, left.value,
+                                             left.left, x.left),
+                              PersistentNode(key, value, x.right, right))
+
+    if height(right) > height(left) + 1:
+        if height(right.right) >= height(right.left):
+            return PersistentNode(right.key, right.value,
+                                  PersistentNode(key, value, left,
+                                                 right.left),
+                                  right.right)
+        x = right.left
+        return PersistentNode(x.key, x.value,
+                              PersistentNode(key, value, left, x.left),
+                              PersistentNode(right.key, right.value,
+                                             x.right, right.right))
+
+    return PersistentNode(key, value, left, right)
+
+# Return the node with the given key in the tree rooted at node, or
+# None if there is no such node.
+def persistent_search(node, key):
+    while node and key != node.key:
+        if key < node.key:
+            node = node.left
+        else:
+            node = node.right
+    return node
+
+# Return the root of a tree which contains the key and value, as well
+# as every node of the tree rooted at node. If the key is already in
+# the tree, its value is replaced.
+def persistent_insert(node, key, value=None):
+    if not node:
+        return PersistentNode(key, value, None, None)
+    if key < node.key:
+        return balance(node.key, node.value,
+                       persistent_insert(node.left, key, value), node.right)
+    if node.key < key:
+        return balance(node.key, node.value, node.left,
+                       persistent_insert(node.right, key, value))
+    return PersistentNode(key, value, node.left, node.right)
+
+# Return the node with the smallest key in the tree rooted at node, and
+# the root of a tree without it.
+def persistent_delete_minimum(node):
+    if not node.left:
+        return node, node.right
+    minimum, left = persistent_delete_minimum(node.left)
+    return minimum, balance(node.key, node.value, left, node.right)
+
+# Return the root of a tree which contains every node of the tree
+# rooted at node, except the one with the given key. Raises KeyError
+# if there is no such key.
+def persistent_delete(node, key):
+    if not node:
+        raise KeyError(key)
+    if key < node.key:
+        return balance(node.key, node.value,
+                       persistent_delete(node.left, key), node.right)
+    if node.key < key:
+        return balance(node.key, node.value, node.left,
+                       persistent_delete(node.right, key))
+
+    if not node.left:
+        return node.right
+    if not node.right:
+        return node.left
+    successor, right = persistent_delete_minimum(node.right)
+    return balance(successor.key, successor.value, node.left, right)
+
+# Generate the nodes of the tree rooted at node, in order.
+def persistent_walk(node):
+    stack = []
+    while stack or node:
+        if node:
+            stack.append(node)
+            node = node.left
+        else:
+            node = stack.pop()
+            yield node
+            node = node.right
+
+## Container:
+#
+# A tree which holds a reference to the root of its current version.
+# Every method reads the root once, so it operates on a consistent
+# version even if a writer replaces it concurrently. Updates from more
+# than one thread must be serialized by the caller.
+class PersistentTree:
+    def __init__(self, keys=(), root=None, size=0):
+        self.root = root
+        self.size = size
+        for key in keys:
+            self.insert(key)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for node in persistent_walk(self.root):
+            yield node.key
+
+    # Return a tree of the current version, which is unaffected by
+    # later updates of this tree, in O(1).
+    def snapshot(self):
+        return PersistentTree(root=self.root, size=self.size)
+
+    def search(self, key):
+        return persistent_search(self.root, key)
+
+    def minimum(self):
+        node = self.root
+        while node and node.left:
+            node = node.left
+        return node
+
+    def maximum(self):
+        node = self.root
+        while node and node.right:
+            node = node.right
+        return node
+
+    def insert(self, key, value=None):
+        root = self.root
+        added = not persistent_search(root, key)
+        self.root = persistent_insert(root, key, value)
+        self.size += added
+
+    def delete(self, key):
+        self.root = persistent_delete(self.root, key)
+        self.size -= 1
+
+# Check that a persistent tree is ordered, and that every node is
+# AVL-balanced with the correct height.
+def check_persistent_tree(tree):
+    def check(node, lo, hi):
+        if not node:
+            return 0
+        assert lo is None or lo < node.key
+        assert hi is None or node.key < hi
+        left = check(node.left, lo, node.key)
+        right = check(node.right, node.key, hi)
+        assert abs(left - right) <= 1
+        assert node.height == max(left, right) + 1
+        return node.height
+
+    check(tree.root, None, None)
+    assert sum(1 for node in persistent_walk(tree.root)) == len(tree)
+
+# Time lookups from a pool of reader threads, while a writer thread
+# continuously inserts and deletes keys. The persistent tree is read
+# without locking, and is compared against a red-black tree which
+# readers and the writer share under a lock.
+def test_persistent_tree(options):
+    sizes = options.sizes or [10 ** 4, 10 ** 5]
+    report = lib.BenchmarkReport("persistent_tree", options)
+    reads = options.reads
+
+    def persistent_reader(tree, keys, lock):
+        for key in keys:
+            assert tree.search(key)
+
+    def persistent_writer(tree, keys, lock, stop):
+        while not stop.is_set():
+            for key in keys:
+                if tree.search(key):
+                    tree.delete(key)
+                else:
+                    tree.insert(key)
+
+    def locked_reader(tree, keys, lock):
+        for key in keys:
+            with lock:
+                assert tree.search(key)
+
+    def locked_writer(tree, keys, lock, stop):
+        while not stop.is_set():
+            for key in keys:
+                with lock:
+                    node = tree.search(key)
+                    if node:
+                        tree.delete(node)
+                    else:
+                        tree.insert(rbt.RedBlackNode(key))
+
+    # Run the readers and the writer, and return once every reader has
+    # finished:
+    def run(args):
+        tree, reader, writer, lookups, updates, threads = args
+        lock = threading.Lock()
+        stop = threading.Event()
+        writer_thread = threading.Thread(
+            target=writer, args=(tree, updates, lock, stop))
+        readers = [threading.Thread(target=reader,
+                                    args=(tree, lookups[i::threads], lock))
+                   for i in xrange(threads)]
+
+        writer_thread.start()
+        for thread in readers:
+            thread.start()
+        for thread in readers:
+            thread.join()
+        stop.set()
+        writer_thread.join()
+        return tree
+
+    for test_size in sizes:
+        rng = random.Random(options.seed)
+        keys = rng.sample(xrange(10 * test_size), test_size)
+        # The readers look up keys which are always present, and the
+        # writer toggles keys which are never looked up:
+        lookups = [rng.choice(keys) for i in xrange(reads)]
+        updates = [rng.randrange(10 * test_size) * 10 + 1
+                   for i in xrange(100)]
+        keys = [key * 10 for key in keys]
+        lookups = [key * 10 for key in lookups]
+
+        trees = (
+            ("persistent", lambda: PersistentTree(keys),
+             persistent_reader, persistent_writer),
+            ("locked", lambda: rbt.RedBlackTree(keys),
+             locked_reader, locked_writer)
+        )
+
+        for threads in options.threads:
+            for name, make_tree, reader, writer in trees:
+                tree = make_tree()
+                times, tree = lib.benchmark(
+                    run, lambda: (tree, reader, writer, lookups, updates,
+                                  threads),
+                    options.repeat, options.warmup)
+                median = lib.get_stats(times)["median"]
+                report.add(times, unit="keys", size=test_size,
+                           tree=name, threads=threads,
+                           measures={"ops_per_second": reads / median})
+
+    report.finish()
+
+if __name__ == "__main__":
+    data = lib.get_random_int_array(1000)
+    keys = sorted(set(data))
+
+    tree = PersistentTree(data)
+    check_persistent_tree(tree)
+    assert list(tree) == keys
+    assert tree.minimum().key == keys[0]
+    assert tree.maximum().key == keys[-1]
+    assert tree.search(-1) is None
+
+    # Snapshots are unaffected by later updates:
+    snapshot = tree.snapshot()
+    for key in keys[::2]:
+        tree.delete(key)
+        check_persistent_tree(tree)
+    tree.insert(-1, "value")
+    assert list(tree) == [-1] + keys[1::2]
+    assert tree.search(-1).value == "value"
+    assert list(snapshot) == keys
+    check_persistent_tree(snapshot)
+
+    # A tree of ordered keys is balanced:
+    tree = PersistentTree(xrange(2 ** 12))
+    assert tree.root.height <= 1.44 * 13
+    check_persistent_tree(tree)
+
+    try:
+        tree.delete(-1)
+        assert False
+    except KeyError:
+        pass
+
+    parser = argparse.ArgumentParser(description="Persistent trees")
+    parser.add_argument("--threads", type=lib.parse_sizes,
+                        default=[1, 2, 4, 8],
+                        help="comma separated list of numbers of reader "
+                        "threads (default: 1,2,4,8)")
+    parser.add_argument("--reads", type=int, default=10 ** 5,
+                        help="total lookups per run (default: 10^5)")
+    test_persistent_tree(lib.get_benchmark_options(parser=parser))
@@ -0,0 +1,483 @@
+#!/usr/bin/env python
+#
+## Caches:
+#
+# A cache is a bounded table of key-value pairs which holds the results
+# of expensive computations or slow lookups. When a new key is added to
+# a full cache, an existing entry is evicted to make room for it, and
+# the eviction policy decides which one:
+#
+#   LRU (least recently used) evicts the entry which has gone longest
+#   without being read or written. The entries are kept in a doubly
+#   linked list in order of use, with the most recently used at the
+#   head. Each access unlinks the entry and reinserts it at the head,
+#   and the entry at the tail is evicted.
+#
+#   LFU (least frequently used) evicts the entry which has been used
+#   the fewest times. The entries with the same use count are kept in a
+#   list of their own, and the lists are kept in a second linked list
+#   of "frequency nodes", in ascending order of count:
+#
+#     frequencies:  [1] <-> [2] <-> [5]
+#                    |       |       |
+#     entries:       d       a       b
+#                    e       c
+#
+#   An access moves the entry from the list of its count n to the list
+#   of n + 1, which is either the next frequency node, or a new node
+#   inserted after it, so no search is needed. The victim is the least
+#   recently used entry of the first frequency node.
+#
+# A hash table maps each key to its list entry, so a lookup, insertion
+# and eviction each take O(1) time for both policies.
+#
+# Entries may also be given a time to live (TTL), after which they
+# expire. Expiry is lazy: an expired entry is removed when it is next
+# looked up, or when a new key is added to a full cache, rather than
+# by a timer. The entries with a TTL are also kept in a priority queue
+# ordered by expiry time, so that a full cache removes every expired
+# entry before it evicts a live one. Without this, an expired entry
+# which the policy would not choose (such as an entry with a high use
+# count in an LFU cache) would hold its slot forever.
+#
+## Operations:
+#
+# GET, SET, DELETE
+#
+## Performance:
+#
+# Worst case performance:       O(n), if every key collides in the
+#                                hash table
+# Average case performance:     O(1), or O(log n) for entries with a
+#                                TTL
+# Memory usage:                 O(capacity)
+#
+## Advantages:
+#
+# Bounded memory usage, regardless of the number of distinct keys.
+# LRU adapts quickly to changes in which keys are popular.
+# LFU keeps keys which are popular in the long term, even if a burst of
+#  other keys is accessed once each.
+#
+## Disadvantages:
+#
+# Two or three pointers per entry of overhead, beside the hash table.
+# LFU is slow to forget keys which were popular and no longer are.
+# Expired entries occupy a slot until they are looked up, or until the
+#  cache is full.
+#
+## References:
+#
+# http://en.wikipedia.org/wiki/Cache_replacement_policies
+# Shah, Mitra and Matani, "An O(1) algorithm for implementing the LFU
+#  cache eviction scheme", 2010.
+#
+## Code:
+#
+import argparse
+import bisect
+import functools
+import random
+import time
+
+import lib
+
+ht = lib.import_algorithm("05-hash-table")
+ll = lib.import_algorithm("06-linked-list")
+pq = lib.import_algorithm("13-priority-queue")
+
+# A cache entry. 'expiry' is its entry in the cache's expiry queue, or
+# None if it does not expire.
+class CacheEntry(ll.Element):
+    def __init__(self, key, value):
+        ll.Element.__init__(self, key)
+        self.value = value
+        self.expires = None
+        self.expiry = None
+        self.frequency = None
+
+# The base of the caches, which implements the table of entries,
+# expiry, and the counters. Subclasses implement the eviction policy
+# with four methods: _add() an entry, _touch() an entry which has been
+# used, _unlink() an entry which is removed, and return the _victim()
+# to evict.
+#
+# The clock is a function returning the current time, in the same
+# units as the TTLs.
+class Cache(object):
+    def __init__(self, capacity, ttl=None, clock=time.time):
+        if capacity < 1:
+            raise ValueError("cache capacity must be at least 1")
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.table = ht.ResizingHashTable()
+        self.expiry = pq.PriorityQueue()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return self.size
+
+    # Return the entry for a key, or None if there is no such entry or
+    # it has expired.
+    def _lookup(self, key):
+        entry = self.table.get(key)
+        if entry is not None and entry.expires is not None and \
+           entry.expires <= self.clock():
+            self._remove(entry)
+            self.expirations += 1
+            return None
+        return entry
+
+    def _remove(self, entry):
+        self.table.delete(entry.key)
+        self._unlink(entry)
+        self._set_expires(entry, None)
+        self.size -= 1
+
+    # Set the time at which an entry expires, or None if it does not,
+    # and move it in the expiry queue.
+    def _set_expires(self, entry, expires):
+        entry.expires = expires
+        if expires is None:
+            if entry.expiry is not None:
+                self.expiry.remove(entry.expiry)
+                entry.expiry = None
+        elif entry.expiry is None:
+            entry.expiry = self.expiry.push(expires, entry)
+        else:
+            self.expiry.update(entry.expiry, expires)
+
+    # Remove every entry which has expired.
+    def _expire(self):
+        expiry = self.expiry
+        now = self.clock()
+        while len(expiry) and expiry.peek().priority <= now:
+            self._remove(expiry.peek().item)
+            self.expirations += 1
+
+    def get(self, key, default=None):
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._touch(entry)
+        return entry.value
+
+    # Set the value of a key, which expires after ttl, or the cache's
+    # default TTL if it is not given. If the cache is full, the expired
+    # entries are removed first, and if there are none, the victim of
+    # the eviction policy.
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires = None if ttl is None else self.clock() + ttl
+
+        entry = self._lookup(key)
+        if entry is not None:
+            entry.value = value
+            self._set_expires(entry, expires)
+            self._touch(entry)
+            return
+
+        if self.size >= self.capacity:
+            self._expire()
+        if self.size >= self.capacity:
+            self._remove(self._victim())
+            self.evictions += 1
+
+        entry = CacheEntry(key, value)
+        self.table.set(key, entry)
+        self._add(entry)
+        self._set_expires(entry, expires)
+        self.size += 1
+
+    # Remove a key from the cache. Raises KeyError if there is no such
+    # key.
+    def delete(self, key):
+        entry = self.table.get(key)
+        if entry is None:
+            raise KeyError(key)
+        self._remove(entry)
+
+    # Return the fraction of lookups which were hits.
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / float(lookups) if lookups else 0.0
+
+class LRUCache(Cache):
+    def __init__(self, capacity, ttl=None, clock=time.time):
+        Cache.__init__(self, capacity, ttl, clock)
+        self.list = ll.DoublyLinkedList()
+
+    def _add(self, entry):
+        self.list.insert(entry)
+
+    def _touch(self, entry):
+        self.list.delete(entry)
+        self.list.insert(entry)
+
+    def _unlink(self, entry):
+        self.list.delete(entry)
+
+    def _victim(self):
+        return self.list.tail
+
+# A node of the LFU frequency list, whose key is the use count of the
+# entries in its list.
+class FrequencyNode(ll.Element):
+    def __init__(self, count):
+        ll.Element.__init__(self, count)
+        self.entries = ll.DoublyLinkedList()
+
+class LFUCache(Cache):
+    def __init__(self, capacity, ttl=None, clock=time.time):
+        Cache.__init__(self, capacity, ttl, clock)
+        self.frequencies = ll.DoublyLinkedList()
+
+    # Move an entry to the list of the given frequency node, and remove
+    # the node it was in if it is left empty.
+    def _move(self, entry, node):
+        old = entry.frequency
+        if old is not None:
+            old.entries.delete(entry)
+            if old.entries.head is None:
+                self.frequencies.delete(old)
+        entry.frequency = node
+        if node is not None:
+            node.entries.insert(entry)
+
+    def _add(self, entry):
+        node = self.frequencies.head
+        if node is None or node.key != 1:
+            node = FrequencyNode(1)
+            self.frequencies.insert(node)
+        self._move(entry, node)
+
+    def _touch(self, entry):
+        node = entry.frequency
+        next = node.next
+        if next is None or next.key != node.key + 1:
+            next = FrequencyNode(node.key + 1)
+            self.frequencies.insert_after(node, next)
+        self._move(entry, next)
+
+    def _unlink(self, entry):
+        self._move(entry, None)
+
+    def _victim(self):
+        return self.frequencies.head.entries.tail
+
+# A decorator which caches the results of a function, keyed by its
+# arguments, which must be hashable. The cache is available as the
+# 'cache' attribute of the decorated function.
+def memoize(capacity=128, cache_class=LRUCache, ttl=None):
+    missing = object()
+    kwargs_mark = object()
+
+    def decorator(func):
+        cache = cache_class(capacity, ttl)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = args
+            if kwargs:
+                key += (kwargs_mark,) + tuple(sorted(kwargs.items()))
+            value = cache.get(key, missing)
+            if value is missing:
+                value = func(*args, **kwargs)
+                cache.set(key, value)
+            return value
+
+        wrapper.cache = cache
+        return wrapper
+
+    return decorator
+
+# Generate a trace of keys in the range [0, universe), drawn from a
+# Zipf distribution with exponent s, in which key k is accessed with
+# probability proportional to 1 / (k + 1)^s. Keys are drawn by
+# searching the cumulative distribution.
+def get_zipf_ints(length, universe, s=1.0, seed=None):
+    cdf = []
+    total = 0.0
+    for rank in xrange(1, universe + 1):
+        total += rank ** -s
+        cdf.append(total)
+
+    rand = random.Random(seed).random
+    return [bisect.bisect(cdf, rand() * total) for i in xrange(length)]
+
+# Time a trace of Zipf-distributed keys through each cache, setting
+# every key which misses, and report the hit ratio and accesses per
+# second. The TTL variant uses a logical clock which advances by one
+# per access, and an entry lives for ten times the capacity.
+def test_cache(options):
+    sizes = options.sizes or [10 ** 4, 10 ** 5]
+    report = lib.BenchmarkReport("cache", options)
+
+    def run(args):
+        cache, trace, now = args
+        get = cache.get
+        for key in trace:
+            now[0] += 1
+            if get(key) is None:
+                cache.set(key, key)
+        return cache
+
+    policies = (
+        ("lru", LRUCache, None),
+        ("lfu", LFUCache, None),
+        ("lru_ttl", LRUCache, 10),
+        ("lfu_ttl", LFUCache, 10)
+    )
+
+    for universe in sizes:
+        trace = get_zipf_ints(options.accesses, universe, options.skew,
+                              options.seed)
+        for capacity in options.capacities:
+            if capacity > universe:
+                continue
+            for name, cache_class, ttl in policies:
+                def make_input():
+                    now = [0]
+                    cache = cache_class(capacity,
+                                        ttl and ttl * capacity,
+                                        lambda: now[0])
+                    return cache, trace, now
+
+                times, cache = lib.benchmark(run, make_input,
+                                             options.repeat, options.warmup)
+                median = lib.get_stats(times)["median"]
+                measures = {
+                    "hit_ratio": cache.hit_ratio(),
+                    "ops_per_second": len(trace) / median
+                }
+                report.add(times, unit="accesses", size=universe,
+                           capacity=capacity, policy=name,
+                           measures=measures)
+
+    report.finish()
+
+if __name__ == "__main__":
+    now = [0]
+    clock = lambda: now[0]
+
+    # LRU evicts the least recently used key:
+    cache = LRUCache(3, clock=clock)
+    for key in "abc":
+        cache.set(key, key.upper())
+    assert cache.get("a") == "A"
+    cache.set("d", "D")
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["A", "C", "D"]
+    assert len(cache) == 3 and cache.evictions == 1
+    assert cache.hits == 4 and cache.misses == 1
+
+    # LFU evicts the least frequently used key, and the least recently
+    # used of those with the same count:
+    cache = LFUCache(3, clock=clock)
+    for key in "abc":
+        cache.set(key, key.upper())
+    for key in "aab":
+        cache.get(key)
+    cache.set("d", "D")
+    assert cache.get("c") is None
+    cache.set("e", "E")
+    assert cache.get("d") is None
+    assert [cache.get(key) for key in "abe"] == ["A", "B", "E"]
+    counts = []
+    node = cache.frequencies.head
+    while node:
+        counts.append(node.key)
+        node = node.next
+    assert counts == sorted(counts) and len(counts) == len(set(counts))
+
+    # Both policies remove keys and expire entries, either with a
+    # default TTL or one per entry:
+    for cache_class in LRUCache, LFUCache:
+        cache = cache_class(10, ttl=5, clock=clock)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=20)
+        cache.set("c", 3)
+        cache.delete("c")
+        try:
+            cache.delete("c")
+            assert False
+        except KeyError:
+            pass
+        now[0] += 10
+        assert cache.get("a") is None and cache.get("b") == 2
+        assert cache.expirations == 1 and len(cache) == 1
+        now[0] += 10
+        assert cache.get("b") is None and len(cache) == 0
+        for i in xrange(100):
+            cache.set(i, i)
+        assert len(cache) == 10 and cache.evictions == 90
+        assert len(cache.expiry) == 10
+
+        # A full cache removes expired entries before evicting live
+        # ones, even if the policy would never choose them:
+        cache = cache_class(2, clock=clock)
+        cache.set("hot", 1, ttl=5)
+        for i in xrange(10):
+            cache.get("hot")
+        now[0] += 10
+        for i in xrange(50):
+            cache.set(i, i)
+        assert cache.table.get("hot") is None
+        assert cache.expirations == 1 and cache.evictions == 48
+
+    # A cache of random keys never exceeds its capacity, and agrees
+    # with a dictionary of the keys which it holds:
+    for cache_class in LRUCache, LFUCache:
+        cache = cache_class(50)
+        values = {}
+        for key in get_zipf_ints(10000, 200, seed=1):
+            value = cache.get(key)
+            if value is None:
+                cache.set(key, -key)
+            else:
+                assert value == -key
+            assert len(cache) <= 50
+        assert cache.hits + cache.misses == 10000
+        assert cache.misses == cache.evictions + len(cache)
+
+    try:
+        LRUCache(0)
+        assert False
+    except ValueError:
+        pass
+
+    calls = []
+
+    @memoize(capacity=3)
+    def square(x, offset=0):
+        calls.append(x)
+        return x * x + offset
+
+    assert [square(x) for x in (2, 3, 2, 3)] == [4, 9, 4, 9]
+    assert square(2, offset=1) == 5 and square(2) == 4
+    assert calls == [2, 3, 2] and square.cache.hits == 3
+
+    # A Zipf trace is skewed towards the smallest keys:
+    trace = get_zipf_ints(10000, 100, seed=1)
+    assert min(trace) == 0 and max(trace) < 100
+    assert trace.count(0) > trace.count(1) > trace.count(10)
+
+    parser = argparse.ArgumentParser(description="Caches")
+    parser.add_argument("--capacities", type=lib.parse_sizes,
+                        default=[100, 1000, 10000],
+                        help="comma separated list of cache capacities "
+                        "(default: 100,1000,10000)")
+    parser.add_argument("--accesses", type=int, default=10 ** 5,
+                        help="length of the key trace (default: 10^5)")
+    parser.add_argument("--skew", type=float, default=1.0,
+                        help="exponent of the Zipf distribution of keys "
+                        "(default: 1.0)")
+    test_cache(lib.get_benchmark_options(parser=parser))
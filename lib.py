@@ -1,76 +1,1001 @@
 ## lib.py - Helper functions for cstp
 
+import argparse
+import cProfile
+import csv
+import hashlib
+import importlib
+import json
+import math
+import mmap
+import operator
+import os
+import pstats
 import random
-from time import time
+import sys
+from array import array
+from itertools import imap, islice
+from StringIO import StringIO
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# tracemalloc is only available from Python 3.4.
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# NumPy is optional. When it is available it is used to generate large
+# input arrays in bulk.
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Use the highest resolution clock available. time.perf_counter() is
+# only available from Python 3.3, so fall back to timeit's choice of
+# clock for the current platform.
+try:
+    from time import perf_counter as clock
+except ImportError:
+    from timeit import default_timer as clock
+
+## Verification:
+#
+# Checking the output of a sort can take longer than the sort itself
+# for large arrays, so the checks below work on bounded-size chunks of
+# CHUNK_SIZE elements. NumPy arrays, array.array objects (which are
+# viewed as NumPy arrays without copying) and memory-mapped files are
+# compared a whole chunk at a time with NumPy, when it is available.
+# Lists are compared using operator.gt() mapped over each chunk and
+# the chunk offset by one, which runs in C rather than as a Python
+# loop. Either way, the check stops at the first chunk which is out of
+# order.
+#
+# A sorted array must also be a permutation of the input. This can be
+# checked in O(n) time, without sorting the input a second time, by
+# comparing a multiset hash of the input and output: each element is
+# hashed with the SplitMix64 finalizer, and the hashes are summed
+# modulo 2^64. Addition is commutative, so the result does not depend
+# on the order of the elements.
+
+CHUNK_SIZE = 2 ** 16
+
+# The typecodes of array.array which NumPy interprets identically.
+NUMPY_TYPECODES = "bBhHiIlLqQfd"
+
+# Return an iterator over consecutive chunks of an array, of up to
+# 'chunk_size' elements.
+def get_chunks(data, chunk_size=CHUNK_SIZE):
+    if (numpy is not None and isinstance(data, array) and
+        data.typecode in NUMPY_TYPECODES and len(data)):
+        data = numpy.frombuffer(data, data.typecode)
+
+    for i in xrange(0, len(data), chunk_size):
+        yield data[i:i + chunk_size]
+
+# Return an iterator over consecutive chunks of a binary file of
+# integers, which is memory-mapped rather than read into memory.
+def get_file_chunks(path, typecode="l", chunk_size=CHUNK_SIZE):
+    if not os.path.getsize(path):
+        return
+
+    if numpy is not None and typecode in NUMPY_TYPECODES:
+        data = numpy.memmap(path, dtype=typecode, mode="r")
+        for chunk in get_chunks(data, chunk_size):
+            yield chunk
+        return
+
+    step = chunk_size * array(typecode).itemsize
+    with open(path, "rb") as infile:
+        mapped = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for i in xrange(0, len(mapped), step):
+                yield array(typecode, mapped[i:i + step])
+        finally:
+            mapped.close()
+
+# Return true if every element of a sequence of chunks is of equal or
+# greater value than the previous element.
+def chunks_are_sorted(chunks):
+    previous = None
+    for chunk in chunks:
+        if not len(chunk):
+            continue
+        if previous is not None and previous > chunk[0]:
+            return False
+
+        if numpy is not None and isinstance(chunk, numpy.ndarray):
+            if (chunk[:-1] > chunk[1:]).any():
+                return False
+        elif any(imap(operator.gt, chunk, islice(chunk, 1, None))):
+            return False
+
+        previous = chunk[-1]
+
+    return True
 
 # Input an array and returns true or false depending on whether the
 # array was found to be sorted or not. A sorted array is an array
 # whereby every element is of equal or greater value than the
-# previous.
-def array_is_sorted(array):
-    for index in range(len(array)):
-        next = index + 1
-
-        if next == len(array):
-            return True
-        elif array[index] > array[next]:
-            return False
+# previous. If the multiset hash of the original array is given, the
+# array must also be a permutation of the original.
+def array_is_sorted(data, original_hash=None, chunk_size=CHUNK_SIZE):
+    if not chunks_are_sorted(get_chunks(data, chunk_size)):
+        return False
+    return (original_hash is None or
+            multiset_hash(data, chunk_size) == original_hash)
+
+# As array_is_sorted(), for a binary file of integers.
+def file_is_sorted(path, typecode="l", original_hash=None,
+                   chunk_size=CHUNK_SIZE):
+    if not chunks_are_sorted(get_file_chunks(path, typecode, chunk_size)):
+        return False
+    return (original_hash is None or
+            file_multiset_hash(path, typecode, chunk_size) == original_hash)
+
+MASK_64 = 2 ** 64 - 1
+
+# Hash a single element. Integers are hashed by value, and any other
+# element by its hash().
+def element_hash(x):
+    z = ((x if isinstance(x, (int, long)) else hash(x)) +
+         0x9E3779B97F4A7C15) & MASK_64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return z ^ (z >> 31)
+
+# Return the sum of the hashes of the elements of a chunk, modulo 2^64.
+# Integer chunks are hashed with NumPy, in which unsigned 64-bit
+# arithmetic wraps around, giving the same result as element_hash().
+def chunk_hash(chunk):
+    values = chunk
+    if numpy is not None and not isinstance(chunk, numpy.ndarray):
+        try:
+            values = numpy.array(chunk)
+        except (OverflowError, ValueError):
+            pass
+
+    if (numpy is not None and isinstance(values, numpy.ndarray) and
+        values.ndim == 1 and values.dtype.kind in "iu"):
+        z = values.astype(numpy.uint64) + numpy.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+        z ^= z >> numpy.uint64(31)
+        return int(z.sum(dtype=numpy.uint64))
+
+    return sum(imap(element_hash, chunk)) & MASK_64
+
+# Return a multiset hash of a sequence of chunks, as a tuple of the
+# number of elements and the sum of their hashes.
+def chunks_multiset_hash(chunks):
+    length = 0
+    total = 0
+    for chunk in chunks:
+        length += len(chunk)
+        total = (total + chunk_hash(chunk)) & MASK_64
+    return length, total
+
+# Return a multiset hash of an array. Two arrays have the same hash if
+# they contain the same elements, in any order.
+def multiset_hash(data, chunk_size=CHUNK_SIZE):
+    return chunks_multiset_hash(get_chunks(data, chunk_size))
+
+# As multiset_hash(), for a binary file of integers.
+def file_multiset_hash(path, typecode="l", chunk_size=CHUNK_SIZE):
+    return chunks_multiset_hash(get_file_chunks(path, typecode, chunk_size))
+
+## Input generation:
+#
+# Sorting algorithms behave very differently depending on the shape of
+# their input, so inputs can be generated from the following
+# distributions, where n is the length of the array:
+#
+#   random         Uniformly random integers in the range [0, 10n].
+#   sorted         Random integers in ascending order.
+#   reversed       Random integers in descending order.
+#   nearly-sorted  Sorted, then n/100 (at least one) random pairs of
+#                  elements are swapped.
+#   partially-sorted
+#                  The first 90% of the elements are sorted, and the
+#                  last 10% are random.
+#   sawtooth       Consecutive ascending runs of sqrt(n) elements.
+#   few-unique     Random integers drawn from only 8 distinct values.
+#   duplicates     Random integers in the range [0, n/10], so each
+#                  value appears around 10 times.
+#
+# Every distribution is derived from a single bulk draw of uniform
+# random integers, followed by C-level sorting and slicing, so that
+# multi-million element arrays can be generated quickly. Generation
+# is seeded, so the same seed always produces the same array.
+DISTRIBUTIONS = ("random", "sorted", "reversed", "nearly-sorted",
+                 "partially-sorted", "sawtooth", "few-unique", "duplicates")
+
+# Return a list of 'length' uniformly random integers in the range
+# [0, upper].
+def get_uniform_ints(length, upper, seed=None):
+    if numpy is not None:
+        rng = numpy.random.RandomState(seed)
+        return rng.randint(0, upper + 1, size=length).tolist()
+
+    # Scaling random() is several times faster than calling randint()
+    # once per element.
+    rand = random.Random(seed).random
+    bound = upper + 1
+    return [int(rand() * bound) for i in xrange(length)]
+
+# Generate an array of integers of a given length, drawn from one of
+# the named DISTRIBUTIONS.
+def get_int_array(length, distribution="random", seed=None):
+    if distribution == "few-unique":
+        return get_uniform_ints(length, 7, seed)
+    elif distribution == "duplicates":
+        return get_uniform_ints(length, length // 10, seed)
+
+    array = get_uniform_ints(length, 10 * length, seed)
+
+    if distribution == "random":
+        return array
+    elif distribution == "sorted":
+        array.sort()
+    elif distribution == "reversed":
+        array.sort(reverse=True)
+    elif distribution == "nearly-sorted":
+        array.sort()
+        rng = random.Random(seed)
+        for i in range(min(max(length // 100, 1), length)):
+            a = rng.randrange(length)
+            b = rng.randrange(length)
+            array[a], array[b] = array[b], array[a]
+    elif distribution == "partially-sorted":
+        prefix = length - length // 10
+        array[:prefix] = sorted(array[:prefix])
+    elif distribution == "sawtooth":
+        run = max(int(math.sqrt(length)), 1)
+        for i in range(0, length, run):
+            array[i:i + run] = sorted(array[i:i + run])
+    else:
+        raise ValueError("unknown distribution '%s'" % distribution)
+
+    return array
 
 # Generate an array of random integers of a given length. This method
-# guarantees that the return array will be unsorted.
-def get_random_int_array(length):
-    array = [random.randint(0, 10 * length) for r in xrange(length)]
+# guarantees that the return array will be unsorted, unless it
+# contains fewer than two elements.
+def get_random_int_array(length, seed=None):
+    array = get_int_array(length, "random", seed)
 
-    if array_is_sorted(array):
-        return get_random_int_array(length)
+    if length > 1 and array_is_sorted(array):
+        array.reverse()
+        # If every element is equal then the array is still sorted:
+        if array[0] == array[-1]:
+            if array[-1]:
+                array[-1] -= 1
+            else:
+                array[0] += 1
 
     return array
 
+# The algorithm scripts are named after their position in the
+# repository (e.g. "01-merge-sort.py"), which is not a valid Python
+# identifier, so they cannot be loaded with an import statement. This
+# returns the module for a script, given its name without the ".py"
+# extension.
+def import_algorithm(name):
+    return importlib.import_module(name)
+
+## Sort keys:
+#
+# All of the comparison sorts accept optional 'key' and 'reverse'
+# arguments, with the same meaning as for Python's sorted(). These are
+# implemented with the "decorate-sort-undecorate" idiom: each element
+# is decorated with its key, so that the key function is called
+# exactly once per element rather than once per comparison, and the
+# decorated elements are sorted. The decorations are (key, index)
+# pairs, where index is the element's position in the input, so that
+# no two decorations are equal. This means that the elements
+# themselves are never compared, and the result is stable even when
+# the underlying sort is not (e.g. heapsort).
+#
+# Sorting in reverse order is done by negating the indices in the
+# decorations, so that elements with equal keys are sorted in
+# descending order of position, and then reversing the sorted output.
+# This keeps elements with equal keys in their original order.
+
+# Return the permutation which sorts a sequence, i.e. a list of
+# indices such that [data[i] for i in argsort(...)] is sorted.
+def argsort(sort_algorithm, data, key=None, reverse=False):
+    sign = -1 if reverse else 1
+
+    if key:
+        decorated = [(key(x), sign * i) for i, x in enumerate(data)]
+    else:
+        decorated = [(x, sign * i) for i, x in enumerate(data)]
+
+    permutation = [sign * i for k, i in sort_algorithm(decorated)]
+
+    if reverse:
+        permutation.reverse()
+
+    return permutation
+
+# Sort data in place using the given sorting algorithm, comparing the
+# keys of the elements rather than the elements themselves. Returns
+# data.
+def sort_with_key(sort_algorithm, data, key=None, reverse=False):
+    permutation = argsort(sort_algorithm, data, key, reverse)
+    data[:] = [data[i] for i in permutation]
+    return data
+
+# Sort a sequence of keys, and permute any number of "parallel"
+# payload sequences in the same way, where payload[i] belongs to
+# keys[i]. The sorting permutation is computed once, and each sequence
+# is then rearranged in a single pass. All of the sequences are sorted
+# in place, and the keys are returned.
+def sort_parallel(sort_algorithm, keys, *payloads, **kwargs):
+    key = kwargs.pop("key", None)
+    reverse = kwargs.pop("reverse", False)
+    if kwargs:
+        raise TypeError("unexpected keyword argument '%s'"
+                        % list(kwargs)[0])
+
+    permutation = argsort(sort_algorithm, keys, key, reverse)
+    for data in (keys,) + payloads:
+        data[:] = [data[i] for i in permutation]
+
+    return keys
+
+## Instrumentation:
+#
+# Wall time alone does not show why an algorithm is slow. The
+# following classes wrap an algorithm's input so that the operations
+# it performs can be counted, without modifying the algorithm:
+#
+#   comparisons  Comparisons between elements. Each element is wrapped
+#                in a CountedKey, which counts every comparison
+#                against it.
+#   moves        Elements written into an array, either directly, or
+#                by being shifted along by insert(), pop() or del, or
+#                copied by slicing or concatenation.
+#   allocations  New arrays created by slicing, copying or
+#                concatenating an array.
+#
+# Moves and allocations are counted by InstrumentedList, a subclass of
+# list, and every array derived from one is also instrumented. Arrays
+# which an algorithm creates itself (e.g. from a [] literal) are plain
+# lists, so the moves into them are not counted, though comparisons of
+# their elements still are. A cProfile report (see profile_call())
+# shows the calls made on those arrays, e.g. list.pop().
+#
+# Peak memory usage is measured with tracemalloc, where it is
+# available. Otherwise it is not reported: the peak resident set size
+# of the process only shows calls which grow the process beyond its
+# previous peak, and would report zero for the rest.
+
+class OperationCounts:
+    def __init__(self):
+        self.comparisons = 0
+        self.moves = 0
+        self.allocations = 0
+
+    # Return an instrumented copy of an array, with each element
+    # wrapped in a CountedKey.
+    def wrap(self, array):
+        return InstrumentedList((CountedKey(x, self) for x in array), self)
+
+    # Return a dictionary of the counts divided by n, e.g. the number of
+    # operations per element of the input.
+    def per_element(self, n):
+        n = float(max(n, 1))
+        return {
+            "comparisons": self.comparisons / n,
+            "moves": self.moves / n,
+            "allocations": self.allocations / n
+        }
+
+# Undo OperationCounts.wrap(), returning a list of the original
+# elements.
+def unwrap(array):
+    return [x.value for x in array]
+
+# A wrapper around a value which counts its comparisons against other
+# values.
+class CountedKey(object):
+    __slots__ = ("value", "counts")
+
+    def __init__(self, value, counts):
+        self.value = value
+        self.counts = counts
+
+    def __lt__(self, other):
+        self.counts.comparisons += 1
+        return self.value < getattr(other, "value", other)
+
+    def __le__(self, other):
+        self.counts.comparisons += 1
+        return self.value <= getattr(other, "value", other)
+
+    def __gt__(self, other):
+        self.counts.comparisons += 1
+        return self.value > getattr(other, "value", other)
+
+    def __ge__(self, other):
+        self.counts.comparisons += 1
+        return self.value >= getattr(other, "value", other)
+
+    def __eq__(self, other):
+        self.counts.comparisons += 1
+        return self.value == getattr(other, "value", other)
+
+    def __ne__(self, other):
+        self.counts.comparisons += 1
+        return self.value != getattr(other, "value", other)
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __str__(self):
+        return str(self.value)
+
+    def __repr__(self):
+        return "CountedKey(%r)" % (self.value,)
+
+# A list which counts the moves and allocations made through it. Python
+# 2 passes simple slices to __getslice__(), __setslice__() and
+# __delslice__() rather than __getitem__() etc., so both are handled.
+class InstrumentedList(list):
+    def __init__(self, iterable=(), counts=None):
+        list.__init__(self, iterable)
+        self.counts = counts or OperationCounts()
+
+    # Return a new instrumented array of the given elements.
+    def _allocate(self, elements):
+        array = InstrumentedList(elements, self.counts)
+        self.counts.allocations += 1
+        self.counts.moves += len(array)
+        return array
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._allocate(list.__getitem__(self, index))
+        return list.__getitem__(self, index)
+
+    def __getslice__(self, i, j):
+        return self.__getitem__(slice(i, j))
+
+    def __setitem__(self, index, value):
+        if isinstance(index, slice):
+            value = list(value)
+            start, stop, step = index.indices(len(self))
+            self.counts.moves += len(value)
+            # Replacing a range with one of a different length shifts
+            # every element after it:
+            if step == 1 and len(value) != max(stop - start, 0):
+                self.counts.moves += len(self) - max(stop, start)
+        else:
+            self.counts.moves += 1
+        list.__setitem__(self, index, value)
+
+    def __setslice__(self, i, j, value):
+        self.__setitem__(slice(i, j), value)
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                self.counts.moves += len(self) - max(stop, start)
+        else:
+            self.counts.moves += len(self) - index % len(self) - 1
+        list.__delitem__(self, index)
+
+    def __delslice__(self, i, j):
+        self.__delitem__(slice(i, j))
+
+    def __add__(self, other):
+        return self._allocate(list(self) + list(other))
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def append(self, x):
+        self.counts.moves += 1
+        list.append(self, x)
+
+    def extend(self, iterable):
+        values = list(iterable)
+        self.counts.moves += len(values)
+        list.extend(self, values)
+
+    def insert(self, index, x):
+        index = max(min(index if index >= 0 else len(self) + index,
+                        len(self)), 0)
+        self.counts.moves += len(self) - index + 1
+        list.insert(self, index, x)
+
+    def pop(self, index=-1):
+        if self:
+            self.counts.moves += len(self) - index % len(self) - 1
+        return list.pop(self, index)
+
+    def reverse(self):
+        self.counts.moves += len(self)
+        list.reverse(self)
+
+# Call func(*args), and return its result and the peak memory
+# allocated during the call, in MB, or None if it cannot be measured
+# because tracemalloc is unavailable or already tracing.
+def measure_peak_memory(func, *args):
+    if tracemalloc is None or tracemalloc.is_tracing():
+        return func(*args), None
+
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak / float(2 ** 20)
+
+# Return the peak resident set size of the current process, in MB, or
+# zero if it cannot be measured.
+def get_peak_rss():
+    if resource is None:
+        return 0.0
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, OS X reports bytes:
+    if sys.platform == "darwin":
+        return peak / float(2 ** 20)
+    return peak / float(2 ** 10)
+
+# Call func(*args) using cProfile, and return its result and a report
+# of the 'limit' functions with the highest cumulative time.
+def profile_call(func, *args, **kwargs):
+    limit = kwargs.pop("limit", 15)
+    if kwargs:
+        raise TypeError("unexpected keyword argument '%s'"
+                        % list(kwargs)[0])
+
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args)
+
+    stream = StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return result, stream.getvalue()
+
+# Run a sorting algorithm once with each of the instrumentation options
+# which are enabled. Returns a dictionary of the operations counted
+# per element and the peak memory usage, which is empty unless
+# counting is enabled. The profile report is printed to stderr, so
+# that it does not mix with results written to stdout.
+def instrument_sort(sort_algorithm, data, options, title):
+    measures = {}
+
+    if options.count_ops:
+        counts = OperationCounts()
+        result, peak = measure_peak_memory(sort_algorithm, counts.wrap(data))
+        assert array_is_sorted(unwrap(result))
+        measures = counts.per_element(len(data))
+        if peak is not None:
+            measures["peak_memory"] = peak
+
+    if options.profile:
+        result, report = profile_call(sort_algorithm, list(data))
+        sys.stderr.write("%s:\n%s" % (title, report))
+
+    return measures
+
+## Benchmarking:
+#
+# All of the benchmark harnesses share a common set of command line
+# options, so that any of the algorithm scripts can be run as e.g.:
+#
+#   ./01-merge-sort.py --repeat 10 --format json --output results.json
+#   ./01-merge-sort.py --save-baseline baseline.json
+#   ./01-merge-sort.py --baseline baseline.json --threshold 0.2
+#
+# Each input size is timed with a number of untimed warm-up runs
+# followed by a number of timed repetitions, and the median, 95th
+# percentile and standard deviation of the repetitions are
+# reported. When a baseline file is given, the median of each result
+# is compared against the stored median and the script exits with a
+# non-zero status if any result is slower by more than the threshold.
+
+# The fields of a benchmark record which hold measurements. All of the
+# other fields of a record (e.g. the name and input size) identify it.
+# Operation counts are per element (see "Instrumentation" below).
+STAT_FIELDS = ("repeat", "min", "median", "p95", "mean", "stddev",
+               "speedup", "throughput", "peak_rss", "ops_per_second",
+               "key_calls", "comparisons", "moves", "allocations",
+               "peak_memory", "height", "bytes_per_key", "collisions",
+               "max_bucket", "chi_squared", "p99", "max", "hit_ratio")
+
+def parse_sizes(string):
+    return [int(float(size)) for size in string.split(",")]
+
+# Parse the benchmark options from the command line. Unrecognised
+# arguments are ignored. Scripts which accept additional options may
+# pass in their own parser, to which the common options are added. A
+# script may also change the default distributions by calling
+# parser.set_defaults(distributions=[...]).
+def get_benchmark_options(argv=None, parser=None):
+    if not parser:
+        parser = argparse.ArgumentParser(description="Benchmark options")
+    distributions = parser.get_default("distributions") or DISTRIBUTIONS
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="number of timed runs per input (default: 5)")
+    parser.add_argument("--warmup", type=int, default=1,
+                        help="number of untimed runs per input (default: 1)")
+    parser.add_argument("--sizes", type=parse_sizes, default=None,
+                        help="comma separated list of input sizes")
+    parser.add_argument("--distributions", type=lambda s: s.split(","),
+                        default=list(distributions),
+                        help="comma separated list of input distributions "
+                        "(default: %s)" % ",".join(distributions))
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for generating inputs (default: 0)")
+    parser.add_argument("--format", choices=("text", "json", "csv"),
+                        default="text", help="output format (default: text)")
+    parser.add_argument("--output", default=None,
+                        help="write results to file instead of stdout")
+    parser.add_argument("--baseline", default=None,
+                        help="compare results against a baseline file")
+    parser.add_argument("--save-baseline", default=None,
+                        help="store results in a baseline file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="allowed slowdown over baseline (default: 0.1)")
+    parser.add_argument("--min-time", type=float, default=1e-4,
+                        help="ignore baseline results faster than this, "
+                        "in seconds (default: 1e-4)")
+    parser.add_argument("--count-ops", action="store_true",
+                        help="count the operations performed per element, "
+                        "and the peak memory usage (with tracemalloc)")
+    parser.add_argument("--profile", action="store_true",
+                        help="print a cProfile report for each input to "
+                        "stderr")
+    options, _ = parser.parse_known_args(argv)
+    return options
+
+# Return the p'th percentile of a sorted list of values, interpolating
+# linearly between the two closest ranks.
+def percentile(values, p):
+    k = (len(values) - 1) * p / 100.0
+    lower = int(math.floor(k))
+    upper = int(math.ceil(k))
+    if lower == upper:
+        return values[lower]
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+# Input a list of run times and return a dictionary of summary
+# statistics.
+def get_stats(times):
+    times = sorted(times)
+    n = len(times)
+    mean = sum(times) / n
+
+    if n > 1:
+        stddev = math.sqrt(sum((t - mean) ** 2 for t in times) / (n - 1))
+    else:
+        stddev = 0.0
+
+    return {
+        "repeat": n,
+        "min": times[0],
+        "median": percentile(times, 50),
+        "p95": percentile(times, 95),
+        "mean": mean,
+        "stddev": stddev
+    }
+
+# Input a function and a function which generates inputs for it. The
+# function is run 'warmup' times without being timed, then 'repeat'
+# times with a fresh input for each run. Generating the input is not
+# included in the timings. Returns a list of run times and the result
+# of the final run.
+def benchmark(func, make_input, repeat=5, warmup=1):
+    for i in range(warmup):
+        func(make_input())
+
+    times = []
+    result = None
+    for i in range(repeat):
+        data = make_input()
+
+        t0 = clock()
+        result = func(data)
+        t1 = clock()
+
+        times.append(t1 - t0)
+
+    return times, result
+
+# Identify a benchmark record by all of its non-measurement fields.
+def record_key(record):
+    return tuple(sorted((field, value) for field, value in record.items()
+                        if field not in STAT_FIELDS))
+
+def load_baseline(path):
+    with open(path) as infile:
+        return dict((record_key(record), record)
+                    for record in json.load(infile))
+
+# Collects the results of a benchmark, prints them in the requested
+# format, and checks them against the baseline.
+class BenchmarkReport:
+    def __init__(self, name, options=None):
+        self.name = name
+        self.options = options or get_benchmark_options()
+        self.records = []
+
+        if self.options.format == "text":
+            print "%s:" % name
+
+    # Add the results of a benchmark. The keyword arguments identify
+    # the benchmark, and 'measures' is an optional dictionary of
+    # additional measurements (see STAT_FIELDS).
+    def add(self, times, unit="integers", measures=None, **fields):
+        record = dict(fields)
+        record["name"] = self.name
+        record.update(get_stats(times))
+        record.update(measures or {})
+        self.records.append(record)
+
+        if self.options.format == "text":
+            print ("%fs\t%fs p95\t%fs stddev\t%d %s%s%s"
+                   % (record["median"], record["p95"], record["stddev"],
+                      record["size"], unit,
+                      "".join("\t%s" % fields[field] for field
+                              in sorted(fields) if field != "size"),
+                      "".join("\t%g %s" % (value, measure) for measure, value
+                              in sorted((measures or {}).items()))))
+            sys.stdout.flush()
+
+        return record
+
+    def write(self):
+        if self.options.format == "text":
+            return
+
+        if self.options.output:
+            outfile = open(self.options.output, "w")
+        else:
+            outfile = sys.stdout
+
+        if self.options.format == "json":
+            json.dump(self.records, outfile, indent=2, sort_keys=True,
+                      separators=(",", ": "))
+            outfile.write("\n")
+        else:
+            fields = sorted(set(field for record in self.records
+                                for field in record
+                                if field not in STAT_FIELDS))
+            stats = [field for field in STAT_FIELDS
+                     if any(field in record for record in self.records)]
+            writer = csv.DictWriter(outfile, fields + stats)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+        if outfile is not sys.stdout:
+            outfile.close()
+
+    def save_baseline(self, path):
+        try:
+            baseline = load_baseline(path)
+        except IOError:
+            baseline = {}
+
+        for record in self.records:
+            baseline[record_key(record)] = record
+
+        with open(path, "w") as outfile:
+            json.dump(sorted(baseline.values(), key=record_key), outfile,
+                      indent=2, sort_keys=True, separators=(",", ": "))
+            outfile.write("\n")
+
+    # Return a list of (record, baseline record) pairs for each result
+    # that is slower than its baseline by more than the threshold.
+    # Results for which both times are below the minimum time are
+    # ignored, since they are dominated by noise.
+    def get_regressions(self, path):
+        baseline = load_baseline(path)
+        regressions = []
+
+        threshold = 1 + self.options.threshold
+
+        for record in self.records:
+            base = baseline.get(record_key(record))
+            if not base:
+                continue
+            if max(record["median"], base["median"]) < self.options.min_time:
+                continue
+            if record["median"] > base["median"] * threshold:
+                regressions.append((record, base))
+
+        return regressions
+
+    # Write the results, and exit with an error if there are any
+    # regressions against the baseline.
+    def finish(self):
+        self.write()
+
+        if self.options.save_baseline:
+            self.save_baseline(self.options.save_baseline)
+
+        if self.options.baseline:
+            regressions = self.get_regressions(self.options.baseline)
+            for record, base in regressions:
+                sys.stderr.write("REGRESSION: %s: %fs -> %fs (%+.1f%%)\n"
+                                 % (", ".join("%s=%s" % field for field
+                                              in record_key(record)),
+                                    base["median"], record["median"],
+                                    100 * (record["median"] / base["median"]
+                                           - 1)))
+            if regressions:
+                sys.exit(1)
+
 # Input a sorting algorithm which accepts an array of integers and
 # returns a sorted permutation of the array. This function times the
 # execution time of the given sorting algorithm across a range of
-# input sizes and asserts that the function operates correctly.
-def test_array_sort(sort_algorithm):
+# input sizes and input distributions, and asserts that the function
+# operates correctly. The results are reported under the function's
+# name, unless another name is given. With the --count-ops option, each
+# input is sorted once more, untimed, to count the operations per
+# element (see "Instrumentation").
+def test_array_sort(sort_algorithm, sizes=None, options=None, name=None):
+    options = options or get_benchmark_options()
+    sizes = sizes or options.sizes or [10 ** (i + 1) for i in range(6)]
+    report = BenchmarkReport(name or sort_algorithm.__name__, options)
 
-    for i in range(6):
-        test_size = 10 ** (i + 1)
+    for distribution in options.distributions:
+        for test_size in sizes:
+            data = get_int_array(test_size, distribution, options.seed)
 
-        data = get_random_int_array(test_size)
+            # Sort a copy of the data on each run, since some of the
+            # algorithms sort in place.
+            times, sorted_data = benchmark(sort_algorithm,
+                                           lambda: list(data),
+                                           options.repeat, options.warmup)
 
-        t0 = time()
-        sorted_data = sort_algorithm(data)
-        t1 = time()
+            # Confirm that the sort worked
+            assert array_is_sorted(sorted_data, multiset_hash(data))
 
-        elapsed_time = t1 - t0
+            measures = instrument_sort(
+                sort_algorithm, data, options,
+                "%s %d %s" % (report.name, test_size, distribution))
 
-        # Confirm that the sort worked
-        assert array_is_sorted(sorted_data)
+            report.add(times, size=test_size, distribution=distribution,
+                       measures=measures)
 
-        print "%fs\t%d integers" % (elapsed_time, test_size)
+    report.finish()
+    return report.records
 
-def test_hash_table(hash_table_class):
+# A sort key which is expensive to compute: the number of set bits in
+# the SHA-1 digest of the record's name.
+def costly_key(record):
+    digest = hashlib.sha1(record[1]).digest()
+    return sum(bin(ord(c)).count("1") for c in digest)
 
-    for i in range(4):
-        test_size = 10 ** (i + 1)
-        h = hash_table_class(test_size * 2)
+# Input a sorting algorithm which accepts 'key' and 'reverse'
+# arguments. This function times sorting records by an expensive key,
+# either using the algorithm's key argument, which evaluates each key
+# once, or by wrapping the records in objects which compare by
+# evaluating the key on every comparison.
+def test_key_sort(sort_algorithm, sizes=None, options=None, name=None):
+    options = options or get_benchmark_options()
+    sizes = sizes or options.sizes or [10 ** (i + 1) for i in range(4)]
+    report = BenchmarkReport(name or sort_algorithm.__name__, options)
+    calls = [0]
 
-        # Populate table
-        for i in range(test_size):
-            h.set(i, i * 10)
+    def key(record):
+        calls[0] += 1
+        return costly_key(record)
 
-        # Time the element retrieval
-        t0 = time()
-        for i in range(test_size):
-            assert h.get(i) == i * 10
-        t1 = time()
-        elapsed_time = t1 - t0
+    class KeyCompare:
+        def __init__(self, record):
+            self.record = record
+
+        def __lt__(self, other):
+            return key(self.record) < key(other.record)
+
+        def __gt__(self, other):
+            return key(self.record) > key(other.record)
 
-        print ("%f s\t%f s/entry\t%d entries"
-               % (elapsed_time, elapsed_time / test_size, test_size))
+    def sort_with_key(args):
+        records, reverse = args
+        return sort_algorithm(records, key=key, reverse=reverse)
+
+    def sort_repeated_key(args):
+        records, reverse = args
+        if reverse:
+            records.reverse()
+        wrapped = sort_algorithm([KeyCompare(r) for r in records])
+        if reverse:
+            wrapped.reverse()
+        return [w.record for w in wrapped]
+
+    for test_size in sizes:
+        numbers = get_random_int_array(test_size, options.seed)
+        records = [(number, "record-%d" % number) for number in numbers]
+
+        for reverse in (False, True):
+            expected = [costly_key(r) for r in
+                        sorted(records, key=costly_key, reverse=reverse)]
+
+            for method, func in (("key", sort_with_key),
+                                 ("repeated", sort_repeated_key)):
+                calls[0] = 0
+                times, sorted_records = benchmark(
+                    func, lambda: (list(records), reverse),
+                    options.repeat, options.warmup)
+                runs = options.repeat + options.warmup
+
+                # Confirm that the sort worked
+                assert [costly_key(r) for r in sorted_records] == expected
+
+                report.add(times, size=test_size, reverse=reverse,
+                           method=method, unit="records",
+                           measures={"key_calls": calls[0] / float(runs)})
+
+    report.finish()
+    return report.records
+
+# Accepts a hash table class, and times looking up every entry in
+# tables of a range of sizes. With the --count-ops option, a second
+# table is built using counted keys, and the number of key comparisons
+# per entry for inserting and then looking up every entry is reported,
+# along with the peak memory used by the table, where tracemalloc is
+# available.
+def test_hash_table(hash_table_class, sizes=None, options=None):
+    options = options or get_benchmark_options()
+    sizes = sizes or options.sizes or [10 ** (i + 1) for i in range(4)]
+    report = BenchmarkReport(hash_table_class.__name__, options)
+
+    def populate(keys):
+        h = hash_table_class(len(keys) * 2)
+        for i, key in enumerate(keys):
+            h.set(key, i * 10)
+        return h
+
+    def get_all(h, keys):
+        for i, key in enumerate(keys):
+            assert h.get(key) == i * 10
+        return h
+
+    for test_size in sizes:
+        keys = range(test_size)
+        h = populate(keys)
+
+        # Time the element retrieval
+        times, _ = benchmark(lambda keys: get_all(h, keys), lambda: keys,
+                             options.repeat, options.warmup)
 
         # Check that looking up an item which doesn't exist returns nothing
         assert h.get(-1) == None
 
+        measures = {"ops_per_second": test_size / get_stats(times)["median"]}
+        if options.count_ops:
+            counts = OperationCounts()
+            counted_keys = [CountedKey(key, counts) for key in keys]
+            h, peak = measure_peak_memory(populate, counted_keys)
+            get_all(h, counted_keys)
+            measures["comparisons"] = counts.comparisons / float(test_size)
+            if peak is not None:
+                measures["peak_memory"] = peak
+
+        if options.profile:
+            profile = profile_call(lambda: get_all(populate(keys), keys))[1]
+            sys.stderr.write("%s %d:\n%s" % (report.name, test_size, profile))
+
+        report.add(times, unit="entries", size=test_size, measures=measures)
+
+    report.finish()
+    return report.records
+
 # Accepts a linked list and element element class, and tests the
 # following linked list procedures:
 #
@@ -83,89 +1008,93 @@ def test_hash_table(hash_table_class):
 #   list.predecessor(element)
 #   list.delete(element)
 #
-def test_linked_list(list, element_class):
+# With the --count-ops option, the keys are wrapped in CountedKeys, and
+# the number of key comparisons per operation is reported for each
+# procedure. The times then include the overhead of counting.
+def test_linked_list(list, element_class, sizes=None, options=None):
+    options = options or get_benchmark_options()
+    sizes = sizes or options.sizes or [2 ** (i + 8) for i in range(4)]
+    report = BenchmarkReport(list.__class__.__name__, options)
+    counts = OperationCounts()
+
+    # Return the value of a key, without counting a comparison:
+    def value(key):
+        return getattr(key, "value", key)
+
+    # Start timing a procedure, and reset the count of comparisons:
+    def start():
+        counts.comparisons = 0
+        return clock()
+
+    # Report the time taken to perform a procedure 'operations' times:
+    def add(procedure, t0, operations):
+        elapsed_time = clock() - t0
+        measures = {}
+        if options.count_ops:
+            measures["comparisons"] = (counts.comparisons /
+                                       float(max(operations, 1)))
+        report.add([elapsed_time], unit="entries", size=test_size,
+                   procedure=procedure, measures=measures)
 
-    for i in range(4):
-        test_size = 2 ** (i + 8)
-        data = get_random_int_array(test_size)
+    for test_size in sizes:
+        data = get_random_int_array(test_size, options.seed)
+        if options.count_ops:
+            data = [CountedKey(x, counts) for x in data]
         data_sorted = sorted(data)
         data_min = min(data_sorted)
         data_max = max(data_sorted)
 
         # Test INSERT() routine:
-        t0 = time()
+        t0 = start()
         for i in data:
             list.insert(element_class(i))
-        t1 = time()
-        elapsed_time = t1 - t0
-        print ("%f s\t%f s/entry\tINSERT()\t%d entries"
-               % (elapsed_time, elapsed_time / test_size, test_size))
+        add("INSERT", t0, test_size)
 
         # Test SEARCH routine:
-        t0 = time()
+        t0 = start()
         for i in data[:test_size / 2]:
-            assert list.search(i).key == i
-        t1 = time()
-        elapsed_time = t1 - t0
-        print ("%f s\t%f s/entry\tSEARCH()\t%d entries"
-               % (elapsed_time, elapsed_time / test_size, test_size))
+            assert value(list.search(i).key) == value(i)
+        add("SEARCH", t0, test_size / 2)
 
         # Check that get operation works:
-        t0 = time()
+        t0 = start()
         for i in range(test_size - 1):
-            assert list.get(i).key == data[test_size - 1 - i]
-        t1 = time()
-        elapsed_time = t1 - t0
-        print ("%f s\t%f s/entry\tGET()    \t%d entries"
-               % (elapsed_time, elapsed_time / test_size, test_size))
+            assert list.get(i).key is data[test_size - 1 - i]
+        add("GET", t0, test_size - 1)
 
         # Check that MINIMUM() works:
-        t0 = time()
+        t0 = start()
         for i in range(1000):
-            assert list.minimum().key == data_min
-        t1 = time()
-        elapsed_time = t1 - t0
-        print ("%f s\t%f s/entry\tMINIMUM()\t%d times"
-               % (elapsed_time, elapsed_time / 1000, 1000))
+            assert value(list.minimum().key) == value(data_min)
+        add("MINIMUM", t0, 1000)
 
         # Check that MAXIMUM() operation works:
-        t0 = time()
+        t0 = start()
         for i in range(1000):
-            assert list.maximum().key == data_max
-        t1 = time()
-        elapsed_time = t1 - t0
-        print ("%f s\t%f s/entry\tMAXIMUM()\t%d times"
-               % (elapsed_time, elapsed_time / 1000, 1000))
+            assert value(list.maximum().key) == value(data_max)
+        add("MAXIMUM", t0, 1000)
 
         # Check that SUCCESSOR() operation works:
-        t0 = time()
+        t0 = start()
         for i in range(1, test_size - 2):
-            assert list.successor(list.get(i)).key == data[test_size - 2 - i]
-        t1 = time()
-        elapsed_time = t1 - t0
-        print ("%f s\t%f s/entry\tSUCCESSOR()\t%d entries"
-               % (elapsed_time, elapsed_time / (test_size - 2), test_size - 2))
+            assert list.successor(list.get(i)).key is data[test_size - 2 - i]
+        add("SUCCESSOR", t0, test_size - 3)
 
         # Check that PREDECESSOR() operation works:
-        t0 = time()
+        t0 = start()
         for i in range(1, test_size - 2):
-            assert list.predecessor(list.get(i)).key == data[test_size - i]
-        t1 = time()
-        elapsed_time = t1 - t0
-        print ("%f s\t%f s/entry\tPREDECESSOR()\t%d entries"
-               % (elapsed_time, elapsed_time / (test_size - 2), test_size - 2))
+            assert list.predecessor(list.get(i)).key is data[test_size - i]
+        add("PREDECESSOR", t0, test_size - 3)
 
         # Check that DELETE() operation works:
-        t0 = time()
+        t0 = start()
         for i in data[:test_size / 2]:
             list.delete(list.search(i))
-        t1 = time()
-        elapsed_time = t1 - t0
-        print ("%f s\t%f s/entry\tDELETE()\t%d entries"
-               % (elapsed_time, elapsed_time / (test_size / 2), test_size / 2))
+        add("DELETE", t0, test_size / 2)
 
         # Check that the remaining nodes still exist:
         for i in data[test_size / 2:]:
-            assert list.search(i).key == i
+            assert value(list.search(i).key) == value(i)
 
-        print
+    report.finish()
+    return report.records